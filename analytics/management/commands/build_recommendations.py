@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from analytics import recommender
+
+
+class Command(BaseCommand):
+    help = 'Precomputes the top book recommendations of every reader'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=recommender.TOP_K,
+                            help='Recommendations stored per reader')
+        parser.add_argument('--neighbours', type=int, default=recommender.NEIGHBOURS,
+                            help='Similar books kept per book')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.stdout.write('Building recommendations...')
+        totals = recommender.build(options['top_k'], options['neighbours'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {totals['recommendations']:,} recommendations for {totals['users']:,} readers "
+            f"over {totals['books']:,} books in {elapsed:.2f}s 🎯"
+        ))
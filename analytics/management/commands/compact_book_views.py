@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from analytics import rollup, timeseries
+
+
+class Command(BaseCommand):
+    help = 'Folds raw book views into the hourly/daily buckets and deletes the expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=7,
+                            help='Raw views younger than this many days are kept')
+        parser.add_argument('--hourly-days', type=int, default=90,
+                            help='Hourly buckets older than this many days are deleted (daily ones stay)')
+        parser.add_argument('--batch-size', type=int, default=timeseries.COMPACT_BATCH_SIZE,
+                            help='Raw views deleted per transaction')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        # Only views at or below the rollup mark are in the buckets: catch up first
+        totals = rollup.rollup()
+        self.stdout.write(f"Rolled up {totals['views']:,} new views")
+        deleted = timeseries.compact(options['keep_days'], options['batch_size'])
+        pruned = timeseries.prune_hourly(options['hourly_days'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted:,} raw views and {pruned:,} hourly buckets in {elapsed:.2f}s ⏱️'
+        ))
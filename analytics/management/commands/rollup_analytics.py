@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from analytics import rollup
+
+
+class Command(BaseCommand):
+    help = 'Folds new book views and reviews into the category and author analytics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Discard the analytics rows and roll up the whole history again')
+        parser.add_argument('--batch-size', type=int, default=rollup.ROLLUP_BATCH_SIZE,
+                            help='Events aggregated per transaction')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running, rolling up every this many seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            if options['full']:
+                self.stdout.write('Rebuilding analytics from the full history...')
+                totals = rollup.rebuild(options['batch_size'])
+                options['full'] = False
+            else:
+                totals = rollup.rollup(options['batch_size'])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"Rolled up {totals['views']:,} views and {totals['reviews']:,} reviews in {elapsed:.2f}s 📈"
+            ))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
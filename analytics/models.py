@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from library.models import Book, Author, Category, Publisher
 from users.models import LibraryUser
 
@@ -6,11 +7,51 @@ class BookView(models.Model):
     """Model to track book page views"""
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='views')
     user = models.ForeignKey(LibraryUser, on_delete=models.SET_NULL, null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the view happens, not when the buffered row is written 👀
+    timestamp = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            # Per-book time ranges over the raw views not yet compacted ⏱️
+            models.Index(fields=['book', 'timestamp'], name='bookview_book_time_idx'),
+        ]
     
     def __str__(self):
         return f"View of {self.book.title}"
 
+class HourlyBookViews(models.Model):
+    """Views of a book per hour (UTC), kept current by the analytics rollup"""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='hourly_views')
+    hour = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name_plural = "hourly book views"
+        unique_together = ('book', 'hour')
+        indexes = [
+            # Trends across all books over a time range 📈
+            models.Index(fields=['hour', 'book'], name='hourly_views_hour_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.views} views of {self.book.title} at {self.hour:%Y-%m-%d %H}h"
+
+class DailyBookViews(models.Model):
+    """Views of a book per day (UTC), kept current by the analytics rollup"""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='daily_views')
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name_plural = "daily book views"
+        unique_together = ('book', 'day')
+        indexes = [
+            models.Index(fields=['day', 'book'], name='daily_views_day_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.views} views of {self.book.title} on {self.day}"
+
 class CategoryAnalytics(models.Model):
     """Model to store aggregated category analytics"""
     category = models.OneToOneField(Category, on_delete=models.CASCADE, related_name='analytics')
@@ -42,4 +83,14 @@ class RecommendationLog(models.Model):
     clicked = models.BooleanField(default=False)
     
     def __str__(self):
-        return f"Recommendation of {self.book.title} to {self.user.username}"
\ No newline at end of file
+        return f"Recommendation of {self.book.title} to {self.user.username}"
+
+class RollupState(models.Model):
+    """High-water mark of an incremental analytics rollup"""
+    name = models.CharField(max_length=50, unique=True)
+    # Largest event id already folded into the analytics rows 📈
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} rolled up to #{self.last_id}"
@@ -0,0 +1,223 @@
+"""Offline item-to-item book recommendations 🎯
+
+build() runs as a batch job. It collects every reader's books from reading
+lists and reviews, turns the shared readers of each pair of books into a
+sparse cosine similarity (dicts keyed by book id; only pairs that actually
+co-occur are stored), and keeps the NEIGHBOURS most similar books of each.
+A reader's candidates are scored from the neighbours of their books plus a
+category affinity term, which also covers readers who only picked favorite
+categories. Books a reader already listed, reviewed (at any rating) or
+clicked are never candidates. The TOP_K best per reader are written to
+RecommendationLog in bulk and cached, so recommendations_for() never computes
+anything per request.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from library.models import Book, Category
+from users.models import BookReview, LibraryUser, ReadingList
+
+from .models import RecommendationLog
+
+TOP_K = 20
+NEIGHBOURS = 50
+# Readers with more books only contribute their heaviest ones to the pairs
+MAX_BOOKS_PER_READER = 200
+# Weight of the category affinity term against the co-occurrence score
+CATEGORY_WEIGHT = 0.3
+POPULAR_PER_CATEGORY = 50
+USER_CHUNK_SIZE = 1000
+
+# Interest carried by a book on a reading list, and by a review of each rating
+READING_LIST_WEIGHT = 1.0
+RATING_WEIGHTS = {1: -0.5, 2: 0.0, 3: 0.5, 4: 1.0, 5: 1.5}
+
+CACHE_KEY = 'analytics:recommendations:{}'
+
+
+def _cache():
+    return caches[getattr(settings, 'ANALYTICS_RECOMMENDATION_CACHE', 'default')]
+
+
+def _interactions():
+    """({user_id: {book_id: weight}} of positive interest, {user_id: {book_id}} listed or reviewed)"""
+    weights = defaultdict(Counter)
+    links = ReadingList.books.through.objects.values_list('readinglist__user_id', 'book_id')
+    for user_id, book_id in links.iterator(chunk_size=10000):
+        weights[user_id][book_id] = max(weights[user_id][book_id], READING_LIST_WEIGHT)
+    for user_id, book_id, rating in BookReview.objects.values_list('user_id', 'book_id', 'rating').iterator(chunk_size=10000):
+        weights[user_id][book_id] += RATING_WEIGHTS[rating]
+    positive = {
+        user_id: {book_id: weight for book_id, weight in books.items() if weight > 0}
+        for user_id, books in weights.items()
+    }
+    return positive, {user_id: set(books) for user_id, books in weights.items()}
+
+
+def _neighbours(interactions, size):
+    """{book_id: [(similarity, other_id)]} from readers shared by both books"""
+    degree = Counter()
+    pairs = defaultdict(Counter)
+    for books in interactions.values():
+        heaviest = heapq.nlargest(MAX_BOOKS_PER_READER, books, key=books.get)
+        degree.update(heaviest)
+        for i, a in enumerate(heaviest):
+            for b in heaviest[i + 1:]:
+                pairs[a][b] += 1
+                pairs[b][a] += 1
+    neighbours = {}
+    for a, others in pairs.items():
+        scored = ((count / math.sqrt(degree[a] * degree[b]), b) for b, count in others.items())
+        neighbours[a] = heapq.nlargest(size, scored)
+    return neighbours, degree
+
+
+def _book_categories(book_ids):
+    """{book_id: [category_id]} for the given books, loaded in chunks"""
+    links = Book.categories.through.objects
+    book_ids = list(book_ids)
+    categories = defaultdict(list)
+    for start in range(0, len(book_ids), 10000):
+        chunk = links.filter(book_id__in=book_ids[start:start + 10000]).values_list('book_id', 'category_id')
+        for book_id, category_id in chunk:
+            categories[book_id].append(category_id)
+    return categories
+
+
+def _affinity(books, favorites, book_categories):
+    """{category_id: 0..1} from the reader's books and favorite categories"""
+    affinity = Counter()
+    for book_id, weight in books.items():
+        for category_id in book_categories.get(book_id, ()):
+            affinity[category_id] += weight
+    top = max(affinity.values(), default=0) or 1
+    affinity = Counter({category_id: value / top for category_id, value in affinity.items()})
+    for category_id in favorites:
+        affinity[category_id] = max(affinity[category_id], 1.0)
+    return affinity
+
+
+def _recommend(books, seen, favorites, neighbours, popular, popularity, book_categories, top_k):
+    """[(score, book_id, reason_book_id, reason_category_id)] best first, none of them in `seen`"""
+    scores = Counter()
+    because = {}
+    for book_id, weight in books.items():
+        for similarity, other in neighbours.get(book_id, ()):
+            if other in seen:
+                continue
+            contribution = weight * similarity
+            scores[other] += contribution
+            if contribution > because.get(other, (0, None))[0]:
+                because[other] = (contribution, book_id)
+    affinity = _affinity(books, favorites, book_categories)
+    # Popular books of the reader's strongest categories are candidates too
+    for category_id, _ in affinity.most_common(3):
+        for other in popular.get(category_id, ()):
+            if other not in seen:
+                scores.setdefault(other, 0.0)
+    # Affinity is at most 1: visit candidates by their best possible score and
+    # stop once the top_k found so far beat every remaining bound
+    bounds = sorted(((score + CATEGORY_WEIGHT * popularity.get(other, 0), score, other)
+                     for other, score in scores.items()), reverse=True)
+    best = []
+    for bound, score, other in bounds:
+        if len(best) == top_k and bound <= best[0][0]:
+            break
+        liked = max(((affinity.get(category_id, 0), category_id) for category_id in book_categories.get(other, ())),
+                    default=(0, None))
+        category_score = CATEGORY_WEIGHT * liked[0] * popularity.get(other, 0)
+        reason_book = because[other][1] if other in because and because[other][0] >= category_score else None
+        entry = (score + category_score, other, reason_book, liked[1])
+        if len(best) < top_k:
+            heapq.heappush(best, entry)
+        else:
+            heapq.heappushpop(best, entry)
+    return sorted(best, reverse=True)
+
+
+def _reason(recommendation, titles, category_names):
+    _, _, reason_book, reason_category = recommendation
+    if reason_book is not None:
+        return f'Readers of {titles[reason_book]}'[:100]
+    return f'Popular in {category_names.get(reason_category, "your categories")}'[:100]
+
+
+def build(top_k=TOP_K, neighbours_per_book=NEIGHBOURS):
+    """Recompute and store the recommendations of every reader; returns counts"""
+    interactions, seen = _interactions()
+    # Clicked recommendations stay as history: never log the same book again
+    clicked = RecommendationLog.objects.filter(clicked=True).values_list('user_id', 'book_id')
+    for user_id, book_id in clicked.iterator(chunk_size=10000):
+        seen.setdefault(user_id, set()).add(book_id)
+    favorites = defaultdict(set)
+    links = LibraryUser.favorite_categories.through.objects.values_list('libraryuser_id', 'category_id')
+    for user_id, category_id in links.iterator(chunk_size=10000):
+        favorites[user_id].add(category_id)
+
+    neighbours, degree = _neighbours(interactions, neighbours_per_book)
+    book_categories = _book_categories(degree)
+    top_degree = max(degree.values(), default=0) or 1
+    popularity = {book_id: count / top_degree for book_id, count in degree.items()}
+    by_category = defaultdict(list)
+    for book_id in degree:
+        for category_id in book_categories.get(book_id, ()):
+            by_category[category_id].append(book_id)
+    popular = {
+        category_id: heapq.nlargest(POPULAR_PER_CATEGORY, book_ids, key=degree.get)
+        for category_id, book_ids in by_category.items()
+    }
+    category_names = dict(Category.objects.values_list('pk', 'name'))
+
+    user_ids = sorted(set(interactions) | set(favorites))
+    written = 0
+    for start in range(0, len(user_ids), USER_CHUNK_SIZE):
+        chunk = user_ids[start:start + USER_CHUNK_SIZE]
+        results = {
+            user_id: _recommend(interactions.get(user_id, {}), seen.get(user_id, set()), favorites.get(user_id, ()),
+                                neighbours, popular, popularity, book_categories, top_k)
+            for user_id in chunk
+        }
+        reason_books = {rec[2] for recs in results.values() for rec in recs if rec[2] is not None}
+        titles = dict(Book.objects.filter(pk__in=reason_books).values_list('pk', 'title'))
+        rows = [
+            RecommendationLog(user_id=user_id, book_id=rec[1], reason=_reason(rec, titles, category_names))
+            for user_id, recs in results.items() for rec in recs
+        ]
+        with transaction.atomic():
+            # Clicked rows stay as history; the unclicked ones are superseded
+            RecommendationLog.objects.filter(user_id__in=chunk, clicked=False).delete()
+            RecommendationLog.objects.bulk_create(rows, batch_size=1000)
+        _cache().set_many({
+            CACHE_KEY.format(user_id): [rec[1] for rec in recs] for user_id, recs in results.items()
+        }, timeout=None)
+        written += len(rows)
+    return {'users': len(user_ids), 'books': len(degree), 'recommendations': written}
+
+
+def recommendations_for(user_id, limit=10):
+    """Precomputed book ids for a user, best first"""
+    key = CACHE_KEY.format(user_id)
+    book_ids = _cache().get(key)
+    if book_ids is None:
+        # Written in rank order by build()
+        book_ids = list(RecommendationLog.objects.filter(user_id=user_id, clicked=False)
+                        .order_by('pk').values_list('book_id', flat=True)[:TOP_K])
+        _cache().set(key, book_ids, timeout=None)
+    return book_ids[:limit]
+
+
+def recommended_books(user_id, limit=10):
+    """The books of recommendations_for(), ready for the book cards"""
+    book_ids = recommendations_for(user_id, limit)
+    found = Book.objects.for_card().in_bulk(book_ids)
+    return [found[pk] for pk in book_ids if pk in found]
+
+
+def mark_clicked(user_id, book_id):
+    RecommendationLog.objects.filter(user_id=user_id, book_id=book_id, clicked=False).update(clicked=True)
+    _cache().delete(CACHE_KEY.format(user_id))
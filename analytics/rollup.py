@@ -0,0 +1,146 @@
+"""Incremental rollup of BookView and BookReview rows into the analytics tables 📈
+
+Each event table has a high-water mark in RollupState: the largest id already
+folded into CategoryAnalytics and AuthorAnalytics. A rollup only reads the
+events above it, a window of at most `batch_size` ids at a time, aggregates
+them with GROUP BY queries and applies the deltas with one bulk_update per
+table, so its cost follows the number of new events rather than the history.
+
+New views are also counted into the hourly and daily buckets of
+timeseries.py. Deleted or edited reviews are not seen by the incremental
+path; rebuild() recomputes everything and repairs that. Raw views may have
+been compacted away, so it takes view totals from the daily buckets. The marks assume ids
+become visible in increasing order, which holds with SQLite's single writer.
+"""
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from library.models import Category
+from users.models import BookReview
+
+from . import timeseries
+from .models import AuthorAnalytics, BookView, CategoryAnalytics, DailyBookViews, RollupState
+
+ROLLUP_BATCH_SIZE = 50000
+
+VIEWS = 'book_views'
+REVIEWS = 'book_reviews'
+
+
+class ConcurrentRollup(Exception):
+    """Raised when another rollup advanced the same high-water mark first"""
+
+
+def _window(name, model, batch_size):
+    """Return (start, stop, count) of the next unprocessed ids of model"""
+    state, _ = RollupState.objects.get_or_create(name=name)
+    pending = model.objects.filter(pk__gt=state.last_id).order_by('pk')[:batch_size]
+    window = pending.aggregate(stop=Max('pk'), count=Count('pk'))
+    return state.last_id, window['stop'], window['count']
+
+
+def _advance(name, start, stop):
+    # Conditional update: only one of two concurrent rollups can move the mark
+    if not RollupState.objects.filter(name=name, last_id=start).update(last_id=stop, updated_at=timezone.now()):
+        raise ConcurrentRollup(name)
+
+
+def _apply(model, key, deltas, update, fields):
+    """Run update(row, delta) on the analytics row of every key and save them in bulk"""
+    if not deltas:
+        return
+    model.objects.bulk_create([model(**{key: pk}) for pk in deltas], ignore_conflicts=True)
+    rows = list(model.objects.filter(**{f'{key}__in': list(deltas)}))
+    now = timezone.now()
+    for row in rows:
+        update(row, deltas[getattr(row, key)])
+        # bulk_update does not run auto_now
+        row.last_updated = now
+    model.objects.bulk_update(rows, [*fields, 'last_updated'], batch_size=1000)
+
+
+def _grouped(events, key, **aggregates):
+    return {row.pop(key): row for row in events.values(key).annotate(**aggregates).order_by()}
+
+
+def _add_views(row, delta):
+    row.total_views += delta['views']
+
+
+def _category_views(book_counts):
+    def update(row, delta):
+        row.total_views += delta['views']
+        row.total_books = book_counts.get(row.category_id, 0)
+        row.popularity_score = popularity(row.total_views, row.total_books)
+    return update
+
+
+def _add_reviews(row, delta):
+    total = row.avg_rating * row.total_reviews + delta['rating_sum']
+    row.total_reviews += delta['reviews']
+    row.avg_rating = total / row.total_reviews
+
+
+def popularity(total_views, total_books):
+    """Views per book of a category"""
+    return total_views / total_books if total_books else 0.0
+
+
+def _rollup_views(batch_size):
+    start, stop, count = _window(VIEWS, BookView, batch_size)
+    if not count:
+        return 0
+    events = BookView.objects.filter(pk__gt=start, pk__lte=stop)
+    by_category = _grouped(events.filter(book__categories__isnull=False), 'book__categories', views=Count('pk'))
+    by_author = _grouped(events, 'book__author', views=Count('pk'))
+    book_counts = dict(Category.objects.filter(pk__in=list(by_category)).values_list('pk', 'book_count'))
+    _apply(CategoryAnalytics, 'category_id', by_category, _category_views(book_counts),
+           ['total_views', 'total_books', 'popularity_score'])
+    _apply(AuthorAnalytics, 'author_id', by_author, _add_views, ['total_views'])
+    timeseries.add_views(events)
+    _advance(VIEWS, start, stop)
+    return count
+
+
+def _rollup_reviews(batch_size):
+    start, stop, count = _window(REVIEWS, BookReview, batch_size)
+    if not count:
+        return 0
+    events = BookReview.objects.filter(pk__gt=start, pk__lte=stop)
+    by_author = _grouped(events, 'book__author', reviews=Count('pk'), rating_sum=Sum('rating'))
+    _apply(AuthorAnalytics, 'author_id', by_author, _add_reviews, ['avg_rating', 'total_reviews'])
+    _advance(REVIEWS, start, stop)
+    return count
+
+
+def rollup(batch_size=ROLLUP_BATCH_SIZE):
+    """Fold every new view and review into the analytics rows; returns the event counts"""
+    totals = {'views': 0, 'reviews': 0}
+    while True:
+        # One transaction per window: the deltas and the new mark commit together
+        with transaction.atomic():
+            views = _rollup_views(batch_size)
+        with transaction.atomic():
+            reviews = _rollup_reviews(batch_size)
+        totals['views'] += views
+        totals['reviews'] += reviews
+        if views < batch_size and reviews < batch_size:
+            return totals
+
+
+def rebuild(batch_size=ROLLUP_BATCH_SIZE):
+    """Recompute the analytics rows from the view buckets and every review"""
+    with transaction.atomic():
+        CategoryAnalytics.objects.all().delete()
+        AuthorAnalytics.objects.all().delete()
+        RollupState.objects.filter(name=REVIEWS).delete()
+        # The buckets hold every view up to the views mark, compacted or not
+        buckets = DailyBookViews.objects.all()
+        by_category = _grouped(buckets.filter(book__categories__isnull=False), 'book__categories', views=Sum('views'))
+        by_author = _grouped(buckets, 'book__author', views=Sum('views'))
+        book_counts = dict(Category.objects.filter(pk__in=list(by_category)).values_list('pk', 'book_count'))
+        _apply(CategoryAnalytics, 'category_id', by_category, _category_views(book_counts),
+               ['total_views', 'total_books', 'popularity_score'])
+        _apply(AuthorAnalytics, 'author_id', by_author, _add_views, ['total_views'])
+    return rollup(batch_size)
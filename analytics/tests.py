@@ -1,3 +1,122 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from library.models import Author, Book, Category
+from users.models import BookReview, LibraryUser, ReadingList
+
+from . import recommender, rollup, timeseries
+from .models import (
+    AuthorAnalytics, BookView, CategoryAnalytics, DailyBookViews, HourlyBookViews, RecommendationLog, RollupState,
+)
+from .tracking import ViewBuffer
+
+
+class AnalyticsTestCase(TestCase):
+    """Two books of one author, one of them in a category"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(name='An Author')
+        cls.category = Category.objects.create(name='Fiction', slug='fiction')
+        cls.books = [
+            Book.objects.create(title=f'Book {number}', author=cls.author, isbn=f'97800000000{number}')
+            for number in range(2)
+        ]
+        cls.books[0].categories.add(cls.category)
+        cls.reader = LibraryUser.objects.create(username='reader')
+
+    def view(self, book, count=1, ago=timedelta()):
+        BookView.objects.bulk_create([BookView(book=book, timestamp=timezone.now() - ago) for _ in range(count)])
+
+    def totals(self):
+        return (
+            CategoryAnalytics.objects.values_list('total_views', 'total_books').get(category=self.category),
+            AuthorAnalytics.objects.values_list('total_views', 'total_reviews', 'avg_rating').get(author=self.author),
+        )
+
+
+class RollupTests(AnalyticsTestCase):
+    def test_rollup_counts_new_events_once(self):
+        self.view(self.books[0], 3)
+        self.view(self.books[1], 2)
+        BookReview.objects.create(user=self.reader, book=self.books[0], rating=4, comment='Good')
+        self.assertEqual(rollup.rollup(batch_size=2), {'views': 5, 'reviews': 1})
+        self.assertEqual(self.totals(), ((3, 1), (5, 1, 4.0)))
+        # Nothing new: nothing changes
+        self.assertEqual(rollup.rollup(), {'views': 0, 'reviews': 0})
+        self.view(self.books[0])
+        rollup.rollup()
+        self.assertEqual(self.totals()[0], (4, 1))
+        self.assertEqual(RollupState.objects.get(name=rollup.VIEWS).last_id, BookView.objects.latest('pk').pk)
+
+    def test_rebuild_matches_the_incremental_rollup(self):
+        self.view(self.books[0], 2)
+        BookReview.objects.create(user=self.reader, book=self.books[1], rating=2, comment='Meh')
+        rollup.rollup()
+        incremental = self.totals()
+        rollup.rebuild()
+        self.assertEqual(self.totals(), incremental)
+
+
+class TimeseriesTests(AnalyticsTestCase):
+    def test_views_are_bucketed(self):
+        self.view(self.books[0], 2)
+        self.view(self.books[0], ago=timedelta(days=2))
+        rollup.rollup()
+        self.assertEqual(sum(DailyBookViews.objects.values_list('views', flat=True)), 3)
+        self.assertEqual(sum(HourlyBookViews.objects.values_list('views', flat=True)), 3)
+        self.assertEqual(timeseries.top_books(days=7), [(self.books[0].pk, 3)])
+        self.assertEqual([views for _, views in timeseries.book_views_by_day(self.books[0].pk)], [1, 2])
+
+    def test_compact_keeps_recent_and_unrolled_views(self):
+        self.view(self.books[0], 2, ago=timedelta(days=10))
+        self.view(self.books[0])
+        rollup.rollup()
+        self.view(self.books[0], ago=timedelta(days=10))
+        self.assertEqual(timeseries.compact(keep_days=7), 2)
+        self.assertEqual(BookView.objects.count(), 2)
+        # The buckets still hold every rolled up view
+        self.assertEqual(sum(DailyBookViews.objects.values_list('views', flat=True)), 3)
+
+
+class RecommenderTests(AnalyticsTestCase):
+    """Another reader listed both books, so each one leads to the other"""
+
+    def setUp(self):
+        other = LibraryUser.objects.create(username='other')
+        ReadingList.objects.create(user=other, name='Both').books.add(*self.books)
+        ReadingList.objects.create(user=self.reader, name='First').books.add(self.books[0])
+
+    def test_neighbours_are_recommended(self):
+        recommender.build()
+        self.assertEqual(recommender.recommendations_for(self.reader.pk), [self.books[1].pk])
+
+    def test_known_books_are_not_recommended(self):
+        # A poor review carries no interest but still means the reader knows the book
+        BookReview.objects.create(user=self.reader, book=self.books[1], rating=1, comment='No')
+        recommender.build()
+        self.assertEqual(recommender.recommendations_for(self.reader.pk), [])
+
+    def test_clicked_books_are_not_recommended_again(self):
+        recommender.build()
+        recommender.mark_clicked(self.reader.pk, self.books[1].pk)
+        recommender.build()
+        self.assertEqual(recommender.recommendations_for(self.reader.pk), [])
+        self.assertEqual(RecommendationLog.objects.filter(user=self.reader).count(), 1)
+
+
+class ViewBufferTests(TransactionTestCase):
+    """The writer thread commits every batch: foreign keys are checked on insert"""
+
+    def test_write_keeps_the_views_of_existing_books(self):
+        author = Author.objects.create(name='An Author')
+        books = [Book.objects.create(title=f'Book {number}', author=author, isbn=f'97800000000{number}')
+                 for number in range(2)]
+        reader = LibraryUser.objects.create(username='reader')
+        buffer = ViewBuffer()
+        now = timezone.now()
+        buffer.write([(books[0].pk, reader.pk, now), (0, None, now), (books[1].pk, None, now)])
+        self.assertEqual(sorted(BookView.objects.values_list('book_id', flat=True)), sorted(book.pk for book in books))
+        self.assertEqual((buffer.written, buffer.failed), (2, 1))
@@ -0,0 +1,100 @@
+"""Hourly and daily view buckets, trend queries and raw view retention ⏱️
+
+The rollup adds every new BookView to HourlyBookViews and DailyBookViews, so
+trend queries read those small tables and never scan the raw views. Once a
+raw view is both rolled up and older than the retention window it carries
+no information the buckets lack, and compact() deletes it in id ranges:
+the raw table stays bounded, like dropping old partitions.
+"""
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from .models import BookView, DailyBookViews, HourlyBookViews, RollupState
+
+COMPACT_BATCH_SIZE = 10000
+
+
+def _increment(model, field, grouped):
+    """Add the (book_id, bucket, views) rows of a grouped queryset to a bucket table.
+
+    One INSERT ... SELECT with an ON CONFLICT increment (SQLite >= 3.24,
+    PostgreSQL): the counts never travel through Python.
+    """
+    sql, params = grouped.query.sql_with_params()
+    quote = connection.ops.quote_name
+    table, column = quote(model._meta.db_table), quote(model._meta.get_field(field).column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (book_id, {column}, views) {sql} '
+            f'ON CONFLICT (book_id, {column}) DO UPDATE SET views = {table}.views + excluded.views',
+            params,
+        )
+
+
+def add_views(events):
+    """Count a queryset of BookView rows into the hourly and daily buckets"""
+    for model, field, trunc in ((HourlyBookViews, 'hour', TruncHour), (DailyBookViews, 'day', TruncDate)):
+        grouped = (events.annotate(bucket=trunc('timestamp', tzinfo=dt_timezone.utc))
+                   .values('book_id', 'bucket').annotate(views=Count('pk')).order_by())
+        _increment(model, field, grouped)
+
+
+def book_views_by_day(book_id, days=30):
+    """[(day, views)] of the last `days` days with at least one view"""
+    since = timezone.now().date() - timedelta(days=days - 1)
+    return list(DailyBookViews.objects.filter(book_id=book_id, day__gte=since)
+                .order_by('day').values_list('day', 'views'))
+
+
+def book_views_by_hour(book_id, hours=48):
+    """[(hour, views)] of the last `hours` hours with at least one view"""
+    since = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=hours - 1)
+    return list(HourlyBookViews.objects.filter(book_id=book_id, hour__gte=since)
+                .order_by('hour').values_list('hour', 'views'))
+
+
+def top_books(days=7, limit=10):
+    """[(book_id, views)] of the most viewed books of the last `days` days"""
+    since = timezone.now().date() - timedelta(days=days - 1)
+    return list(DailyBookViews.objects.filter(day__gte=since).values('book_id')
+                .annotate(total=Sum('views')).order_by('-total', 'book_id')
+                .values_list('book_id', 'total')[:limit])
+
+
+def compact(keep_days=7, batch_size=COMPACT_BATCH_SIZE):
+    """Delete rolled-up raw views older than `keep_days`; returns how many"""
+    from .rollup import VIEWS
+
+    state = RollupState.objects.filter(name=VIEWS).first()
+    if state is None:
+        return 0
+    cutoff = timezone.now() - timedelta(days=keep_days)
+    deleted = 0
+    while True:
+        # Views arrive in (nearly) id order: walk the oldest ids and stop at
+        # the first one that is too recent; a late straggler simply waits
+        # until the views before it expire too
+        rows = list(BookView.objects.filter(pk__lte=state.last_id).order_by('pk')
+                    .values_list('pk', 'timestamp')[:batch_size])
+        expired = 0
+        for _, timestamp in rows:
+            if timestamp >= cutoff:
+                break
+            expired += 1
+        if expired:
+            with transaction.atomic():
+                BookView.objects.filter(pk__gte=rows[0][0], pk__lte=rows[expired - 1][0]).delete()
+            deleted += expired
+        if expired < batch_size:
+            return deleted
+
+
+def prune_hourly(keep_days=90):
+    """Delete hourly buckets older than `keep_days`; the daily ones remain"""
+    cutoff = timezone.now() - timedelta(days=keep_days)
+    deleted, _ = HourlyBookViews.objects.filter(hour__lt=cutoff).delete()
+    return deleted
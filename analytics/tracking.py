@@ -0,0 +1,231 @@
+"""Buffered BookView ingestion 👀
+
+Recording a page view only appends a tuple to a bounded in-process queue; a
+background thread drains it and writes the rows with bulk_create, one batch
+whenever BATCH_SIZE views are waiting or FLUSH_INTERVAL seconds have passed.
+When the queue is full (the database cannot keep up) views are dropped and
+counted instead of slowing requests down, unless BLOCK_SECONDS allows the
+request to wait a little for room. Whatever is still queued at interpreter
+exit is written by an atexit hook.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.db import DatabaseError, IntegrityError, close_old_connections, connection
+from django.utils import timezone
+
+logger = logging.getLogger('analytics.tracking')
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MAX_SIZE': 10000,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,
+    'BLOCK_SECONDS': 0,
+}
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, 'ANALYTICS_VIEW_TRACKING', {})}
+
+
+class ViewBuffer:
+    """Bounded queue of (book_id, user_id, timestamp) flushed by a writer thread"""
+
+    def __init__(self, max_size=10000, batch_size=500, flush_interval=1.0, block_seconds=0):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_seconds = block_seconds
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._queue = queue.Queue(maxsize=self.max_size)
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = os.getpid()
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+
+    def record(self, book_id, user_id=None, timestamp=None):
+        """Queue one view; returns False when it had to be dropped"""
+        if self._thread is None or self._pid != os.getpid():
+            self._start()
+        item = (book_id, user_id, timestamp or timezone.now())
+        try:
+            if self.block_seconds:
+                self._queue.put(item, timeout=self.block_seconds)
+            else:
+                self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.recorded += 1
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'recorded': self.recorded,
+                'dropped': self.dropped,
+                'written': self.written,
+                'failed': self.failed,
+                'pending': self._queue.qsize(),
+            }
+
+    def _start(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: the parent's thread and queue did not come along
+                self._reset()
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='bookview-writer', daemon=True)
+            self._thread.start()
+
+    def _take_batch(self):
+        """Block until a batch is full, the flush interval passed or we are stopping"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopping.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _run(self):
+        try:
+            while not self._stopping.is_set():
+                batch = self._take_batch()
+                if batch:
+                    self.write(batch)
+        finally:
+            connection.close()
+
+    def write(self, batch):
+        """Insert one batch of queued views"""
+        from .models import BookView
+        from library.models import Book
+
+        close_old_connections()
+        rows = [BookView(book_id=book_id, user_id=user_id, timestamp=timestamp)
+                for book_id, user_id, timestamp in batch]
+        try:
+            try:
+                BookView.objects.bulk_create(rows, batch_size=self.batch_size)
+            except IntegrityError:
+                # A book (or user) was deleted meanwhile: keep the views we still can
+                book_ids = set(Book.objects.filter(pk__in={row.book_id for row in rows}).values_list('pk', flat=True))
+                rows = [row for row in rows if row.book_id in book_ids]
+                for row in rows:
+                    row.user_id = None
+                BookView.objects.bulk_create(rows, batch_size=self.batch_size)
+        except DatabaseError:
+            logger.exception('Could not write %d book views', len(batch))
+            with self._lock:
+                self.failed += len(batch)
+            return
+        with self._lock:
+            self.written += len(rows)
+            self.failed += len(batch) - len(rows)
+
+    def close(self, timeout=5):
+        """Stop the writer thread and write everything still queued"""
+        if self._stopping.is_set() and self._queue.empty():
+            return
+        self._stopping.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        batch = self._drain()
+        for start in range(0, len(batch), self.batch_size):
+            self.write(batch[start:start + self.batch_size])
+        stats = self.stats()
+        if stats['dropped'] or stats['failed']:
+            logger.warning('Book view tracking lost views: %s', stats)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """Return the process-wide ViewBuffer, or None when tracking is disabled"""
+    global _buffer
+    config = _config()
+    if not config['ENABLED']:
+        return None
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = ViewBuffer(
+                    max_size=config['MAX_SIZE'],
+                    batch_size=config['BATCH_SIZE'],
+                    flush_interval=config['FLUSH_INTERVAL'],
+                    block_seconds=config['BLOCK_SECONDS'],
+                )
+                atexit.register(_buffer.close)
+    return _buffer
+
+
+def _record(book_id, user_id):
+    buffer = get_buffer()
+    if buffer is not None:
+        buffer.record(book_id, int(user_id) if user_id is not None else None)
+
+
+def record_view(request, book_id):
+    """Queue a view of book_id by the request's user, without writing to the database"""
+    # Read the user id from the session: resolving request.user costs a query
+    session = getattr(request, 'session', None)
+    _record(book_id, session.get(SESSION_KEY) if session is not None else None)
+
+
+async def arecord_view(request, book_id):
+    """Async version of record_view()"""
+    session = getattr(request, 'session', None)
+    _record(book_id, await session.aget(SESSION_KEY) if session is not None else None)
+
+
+def track_book_views(view):
+    """Record a BookView for every successful or revalidated (304) response of a view taking `pk`"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            response = await view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                await arecord_view(request, kwargs['pk'])
+            return response
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            record_view(request, kwargs['pk'])
+        return response
+    return wrapper
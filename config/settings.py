@@ -38,9 +38,16 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'library',
+    'users',
+    'analytics',
+    'management',
 ]
 
+AUTH_USER_MODEL = 'users.LibraryUser'
+
 MIDDLEWARE = [
+    'library.middleware.RequestProfilingMiddleware',
+    'library.middleware.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,7 +61,8 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django templates, timed for the request profiling middleware 🩺
+        'BACKEND': 'library.profiling.ProfilingDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -69,6 +77,38 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
+# Per-request SQL and timing instrumentation 🩺
+# A SAMPLE_RATE share of requests get a Server-Timing header and a JSON log
+# line on the 'library.profiling' logger; statements repeated at least
+# N_PLUS_ONE_THRESHOLD times in one request are logged as warnings.
+REQUEST_PROFILING = {
+    'SAMPLE_RATE': 1.0 if DEBUG else 0.01,
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'SERVER_TIMING': True,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'library.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'analytics.tracking': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -77,9 +117,128 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction starts: concurrent
+            # checkouts then wait their turn instead of failing with
+            # "database is locked" when upgrading a read lock 🔒
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # Keep connections open between requests (so the pragmas below run
+        # once per connection) and check them before reusing one. Set it to
+        # 0 under ASGI, where each request gets a fresh thread connection.
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+    },
+    # A read replica: any copy of 'default' kept up to date by the database's
+    # own replication, or locally a file refreshed with `sync_replicas`.
+    # List its alias in LIBRARY_READ_REPLICAS['ALIASES'] to route reads to it.
+    # 'replica1': {
+    #     'ENGINE': 'django.db.backends.sqlite3',
+    #     'NAME': f"file:{BASE_DIR / 'db-replica1.sqlite3'}?mode=ro",
+    #     'TEST': {'MIRROR': 'default'},
+    # },
+}
+
+DATABASE_ROUTERS = ['library.routers.ReplicaRouter']
+
+# Pragmas run on every new SQLite connection, in this order (library/sqlite.py) ⚙️.
+# WAL lets readers and the writer work concurrently; busy_timeout (ms) makes
+# a writer wait for the lock; cache_size is in KiB when negative.
+LIBRARY_SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+}
+
+# Reads of the APPS models go to a random healthy replica among ALIASES 🪞;
+# writes, reads inside transactions and everything a browser reads within
+# STICKY_SECONDS of its last write use 'default'. A replica that fails its
+# health check is skipped for CHECK_SECONDS. With no ALIASES every query
+# stays on 'default'.
+LIBRARY_READ_REPLICAS = {
+    'ALIASES': [],
+    'APPS': ['library'],
+    'STICKY_SECONDS': 5,
+    'CHECK_SECONDS': 10,
+}
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# Cache alias holding the home page statistics 📊. Point it at a shared
+# backend (Redis, Memcached) when running several processes so every worker
+# sees the same counters; a full reconciliation runs at least this often.
+LIBRARY_STATS_CACHE = 'default'
+LIBRARY_STATS_RECONCILE_SECONDS = 3600
+
+# Cache alias and lifetime (seconds) of the rendered book and author cards 🃏
+LIBRARY_FRAGMENT_CACHE = 'default'
+LIBRARY_FRAGMENT_CACHE_TIMEOUT = 86400
+
+# Conditional GET for the library pages 🏷️: validators come from per-table
+# change versions kept in this cache alias (a shared one with several
+# processes, like LIBRARY_STATS_CACHE), and every page carries this
+# Cache-Control. The default lets browsers and a CDN store pages but makes
+# them revalidate each time, which costs a 304 instead of a render.
+LIBRARY_VERSION_CACHE = 'default'
+LIBRARY_CACHE_CONTROL = {'public': True, 'max_age': 0, 'must_revalidate': True}
+
+# Cache alias of the distinct values the admin list filters offer 📋
+LIBRARY_ADMIN_CACHE = 'default'
+
+# Thumbnails of author photos and profile images 🖼️: every named size is
+# rendered in each format under MEDIA_ROOT/PREFIX, named after the image's
+# content. WORKERS processes render new uploads in the background (0 renders
+# on first request only); CACHE remembers which variants exist.
+LIBRARY_THUMBNAILS = {
+    'SIZES': {'small': (64, 64), 'medium': (256, 256), 'large': (512, 512)},
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': 80,
+    'WORKERS': 2,
+    'PREFIX': 'thumbnails',
+    'CACHE': 'default',
+}
+
+# Full-text search backend: 'auto' uses SQLite FTS5 when available and falls
+# back to an in-process index; 'fts5' or 'memory' force one of them 🔍
+LIBRARY_SEARCH_BACKEND = 'auto'
+
+# Route the library URLs to the async views (library/async_views.py) ⚡.
+# Worth enabling when served by an ASGI server (uvicorn/daphne config.asgi);
+# under WSGI each async view would run in its own event loop.
+LIBRARY_ASYNC_VIEWS = False
+
+# Book page views are queued in memory and written in batches by a background
+# thread 👀: a batch goes out when BATCH_SIZE views are waiting or every
+# FLUSH_INTERVAL seconds. Past MAX_SIZE queued views new ones are dropped
+# (and counted), or wait up to BLOCK_SECONDS for room when that is set.
+ANALYTICS_VIEW_TRACKING = {
+    'ENABLED': True,
+    'MAX_SIZE': 10000,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,
+    'BLOCK_SECONDS': 0,
+}
+
+
+# Prior of the Bayesian average rating (users/ratings.py) ⭐: every book
+# starts as if it had WEIGHT reviews of MEAN stars, so a handful of reviews
+# cannot outrank a long track record.
+USERS_RATING_PRIOR = {
+    'MEAN': 3.0,
+    'WEIGHT': 5,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -21,6 +21,7 @@ from django.conf.urls.static import static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/', include('library.api_urls')),  # 🔌 Read-only JSON API
     path('', include('library.urls')),  # 🔗 Include our app URLs
 ]
 
@@ -1,6 +1,11 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from . import search
+from .changelists import AutocompleteFilter, CachedValuesFilter, ScalableModelAdmin
 from .models import Author, AuthorProfile, Category, Publisher, Book, Publication
 
+# Maximum number of ranked matches an admin book search returns 🔍
+ADMIN_SEARCH_LIMIT = 1000
+
 class AuthorProfileInline(admin.StackedInline):
     """Inline admin for author profiles"""
     model = AuthorProfile
@@ -9,28 +14,60 @@ class AuthorProfileInline(admin.StackedInline):
 @admin.register(Author)
 class AuthorAdmin(admin.ModelAdmin):
     """Admin configuration for authors"""
-    list_display = ('name', 'birth_date')
+    list_display = ('name', 'birth_date', 'book_count')
     search_fields = ('name',)
+    ordering = ('name', 'id')
     inlines = [AuthorProfileInline]
 
 class PublicationInline(admin.TabularInline):
     """Inline admin for publications"""
     model = Publication
     extra = 1
+    autocomplete_fields = ('publisher',)
+
+class CategoryFilter(AutocompleteFilter):
+    title = 'category'
+    parameter_name = field_name = 'categories'
+
+class AuthorFilter(AutocompleteFilter):
+    title = 'author'
+    parameter_name = field_name = 'author'
 
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(ScalableModelAdmin):
     """Admin configuration for books"""
     list_display = ('title', 'author', 'isbn', 'publication_date')
-    list_filter = ('categories', 'author')
+    list_filter = (CategoryFilter, AuthorFilter)
+    list_select_related = ('author',)
+    ordering = ('title', 'id')
     search_fields = ('title', 'author__name', 'isbn')
     inlines = [PublicationInline]
-    filter_horizontal = ('categories',)
+    # Select boxes listing every author or category would not load at scale 📋
+    autocomplete_fields = ('author', 'categories')
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Answer searches from the full-text index instead of LIKE scans"""
+        if not search_term.strip():
+            return queryset, False
+        # One more than the limit tells whether matches were left out
+        book_ids = search.get_backend().search(search_term, limit=ADMIN_SEARCH_LIMIT + 1)
+        request._search_capped = len(book_ids) > ADMIN_SEARCH_LIMIT
+        return queryset.filter(pk__in=book_ids[:ADMIN_SEARCH_LIMIT]), False
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        if getattr(request, '_search_capped', False):
+            # The response renders later, so the message still shows on this page
+            messages.warning(request, f'Showing the first {ADMIN_SEARCH_LIMIT} matches only; '
+                                      'refine the search to see others.')
+        return response
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     """Admin configuration for categories"""
-    list_display = ('name', 'slug')
+    list_display = ('name', 'slug', 'book_count')
+    search_fields = ('name',)
+    ordering = ('name',)
     prepopulated_fields = {'slug': ('name',)}
 
 @admin.register(Publisher)
@@ -38,10 +75,21 @@ class PublisherAdmin(admin.ModelAdmin):
     """Admin configuration for publishers"""
     list_display = ('name', 'website')
     search_fields = ('name',)
+    ordering = ('name', 'id')
+
+class PublisherFilter(AutocompleteFilter):
+    title = 'publisher'
+    parameter_name = field_name = 'publisher'
+
+class CountryFilter(CachedValuesFilter):
+    title = 'country'
+    parameter_name = field_name = 'country'
 
 @admin.register(Publication)
-class PublicationAdmin(admin.ModelAdmin):
+class PublicationAdmin(ScalableModelAdmin):
     """Admin configuration for publications"""
     list_display = ('book', 'publisher', 'country', 'date_published')
-    list_filter = ('publisher', 'country')
+    list_filter = (PublisherFilter, CountryFilter)
+    list_select_related = ('book', 'publisher')
     search_fields = ('book__title', 'publisher__name', 'country')
+    autocomplete_fields = ('book', 'publisher')
@@ -0,0 +1,132 @@
+"""Read-only JSON API over the catalog 🔌
+
+List endpoints take up to MAX_KEYS keys as repeated or comma-separated
+query parameters (?isbn=978...,978...&id=12) and answer in request order,
+listing the keys they did not find under "missing"; without keys they
+stream the whole table. Responses are built from values() rows, with the
+relations of each chunk of API_CHUNK_SIZE rows fetched by CatalogLoaders in
+one query per relation, and streamed chunk by chunk. Every endpoint answers
+conditional GETs like the HTML pages.
+"""
+from django.http import JsonResponse
+from django.views.decorators.http import require_safe
+
+from .conditional import conditional_page
+from .converters import to_id
+from .loaders import AUTHOR_FIELDS, BOOK_FIELDS, CatalogLoaders
+from .models import Author, Book, Category
+from .streaming import chunked, stream_json
+from .versions import AUTHOR, BOOK, CATEGORY, PUBLICATION, PUBLISHER
+
+# Keys one request may look up
+MAX_KEYS = 1000
+# Rows serialized (and relations loaded) per streamed chunk
+API_CHUNK_SIZE = 500
+
+CATEGORY_FIELDS = ('id', 'name', 'slug', 'description', 'book_count')
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _isbn(value):
+    return value.replace('-', '').replace(' ', '')
+
+
+def _keys(request, name, convert):
+    """Distinct keys of a repeated or comma-separated query parameter, in order; raises ValueError"""
+    keys = {}
+    for value in request.GET.getlist(name):
+        for key in value.split(','):
+            if key.strip():
+                keys[convert(key.strip())] = None
+    return list(keys)
+
+
+def _lookup(lookups, missing):
+    """Yield the rows found for each (name, loader, keys), a chunk at a time, noting missing keys"""
+    for name, loader, keys in lookups:
+        for chunk in chunked(keys, API_CHUNK_SIZE):
+            rows = []
+            for key, row in zip(chunk, loader.load_many(chunk)):
+                if row is None:
+                    missing[name].append(key)
+                else:
+                    rows.append(row)
+            yield rows
+
+
+@require_safe
+@conditional_page((BOOK, AUTHOR, CATEGORY, PUBLICATION, PUBLISHER))
+def books(request):
+    """Books by ISBN and/or id with their author, categories and publications, or all of them"""
+    try:
+        isbns = _keys(request, 'isbn', _isbn)
+        ids = _keys(request, 'id', to_id)
+    except ValueError:
+        return _error('Book ids must be 64-bit integers')
+    if len(isbns) + len(ids) > MAX_KEYS:
+        return _error(f'At most {MAX_KEYS} books per request')
+    loaders = CatalogLoaders()
+    if not isbns and not ids:
+        rows = Book.objects.order_by('pk').values(*BOOK_FIELDS).iterator(chunk_size=API_CHUNK_SIZE)
+
+        def chunks():
+            for chunk in chunked(rows, API_CHUNK_SIZE):
+                yield loaders.books(chunk)
+                # Only one chunk of related rows is kept at a time
+                loaders.clear()
+        return stream_json('books', chunks())
+
+    missing = {'isbn': [], 'id': []}
+    lookups = (('isbn', loaders.books_by_isbn, isbns), ('id', loaders.books_by_id, ids))
+    return stream_json('books', (loaders.books(rows) for rows in _lookup(lookups, missing)),
+                       lambda: {'missing': missing})
+
+
+@require_safe
+@conditional_page((CATEGORY, PUBLICATION, PUBLISHER), model=Book)
+def book(request, pk):
+    """One book with its author, categories and publications"""
+    loaders = CatalogLoaders()
+    row = loaders.books_by_id.load(pk).get()
+    if row is None:
+        return _error('Book not found', status=404)
+    return JsonResponse(loaders.books([row])[0])
+
+
+@require_safe
+@conditional_page((AUTHOR, BOOK))
+def authors(request):
+    """Authors by id, or all of them"""
+    try:
+        ids = _keys(request, 'id', to_id)
+    except ValueError:
+        return _error('Author ids must be 64-bit integers')
+    if len(ids) > MAX_KEYS:
+        return _error(f'At most {MAX_KEYS} authors per request')
+    if not ids:
+        rows = Author.objects.order_by('pk').values(*AUTHOR_FIELDS).iterator(chunk_size=API_CHUNK_SIZE)
+        return stream_json('authors', chunked(rows, API_CHUNK_SIZE))
+    loaders = CatalogLoaders()
+    missing = {'id': []}
+    return stream_json('authors', _lookup((('id', loaders.authors, ids),), missing), lambda: {'missing': missing})
+
+
+@require_safe
+@conditional_page((AUTHOR, BOOK), model=Author)
+def author(request, pk):
+    """One author with the ids, ISBNs and titles of their books"""
+    row = CatalogLoaders().authors.load(pk).get()
+    if row is None:
+        return _error('Author not found', status=404)
+    row['books'] = list(Book.objects.filter(author_id=pk).order_by('title', 'id').values('id', 'isbn', 'title'))
+    return JsonResponse(row)
+
+
+@require_safe
+@conditional_page((CATEGORY, BOOK))
+def categories(request):
+    """Every category with its number of books"""
+    return JsonResponse({'categories': list(Category.objects.order_by('name').values(*CATEGORY_FIELDS))})
@@ -0,0 +1,12 @@
+from django.urls import path
+from . import api
+from . import converters  # noqa: F401
+
+# Read-only JSON API, mounted under /api/ 🔌
+urlpatterns = [
+    path('books/', api.books, name='api_books'),  # 📚 Books by ISBN or id, or all of them
+    path('books/<id:pk>/', api.book, name='api_book'),  # 📖 One book
+    path('authors/', api.authors, name='api_authors'),  # 👨‍🎨 Authors by id, or all of them
+    path('authors/<id:pk>/', api.author, name='api_author'),  # 👨‍🎨 One author
+    path('categories/', api.categories, name='api_categories'),  # 🏷️ Every category
+]
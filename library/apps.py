@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class LibraryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'library'
+
+    def ready(self):
+        # Connect the model signal receivers 📡
+        from . import signals  # noqa: F401
+        from .search import create_index
+        from .sqlite import configure_connection
+
+        # Tune every new SQLite connection ⚙️
+        connection_created.connect(configure_connection, dispatch_uid='library.sqlite.configure_connection')
+
+        # Create the search index with the schema, never inside a request's transaction 🔍
+        post_migrate.connect(create_index, sender=self, dispatch_uid='library.search.create_index')
@@ -0,0 +1,133 @@
+"""Async versions of the library views for ASGI deployments ⚡
+
+They use the async ORM and async cache calls and start independent queries
+together with asyncio.gather, so a detail page waits for its slowest query
+rather than the sum of all of them. Every view mirrors the sync view of the
+same name in views.py, and all related objects a template touches are loaded
+up front, since lazy relation access is not allowed in async code. Enable
+them with LIBRARY_ASYNC_VIEWS = True.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render
+
+from analytics.tracking import track_book_views
+
+from . import search as catalog_search, stats
+from .conditional import conditional_page
+from .fragments import arender_author_cards, arender_book_cards
+from .models import Author, Book, Category, Publication
+from .pagination import apaginate_keyset
+from .streaming import astream_rows
+from .versions import AUTHOR, BOOK, CATEGORY, PUBLICATION, PUBLISHER, RATING
+from .views import LIST_PAGE_SIZE, SEARCH_RESULTS_LIMIT
+
+
+async def _list(queryset):
+    return [obj async for obj in queryset]
+
+
+@conditional_page((BOOK, AUTHOR, CATEGORY, PUBLISHER))
+async def home(request):
+    """View for home page with library statistics"""
+    return render(request, 'library/home.html', await stats.aget_home_stats())
+
+
+@conditional_page((AUTHOR, BOOK))
+async def author_list(request):
+    """View for listing authors a page at a time, or streaming all of them"""
+    authors = Author.objects.for_card()
+    if request.GET.get('stream'):
+        return astream_rows(request, 'library/author_list.html', authors.order_by('name', 'id'),
+                            arender_author_cards)
+    ordering = ('-book_count', 'name', 'id') if request.GET.get('sort') == 'popular' else ('name', 'id')
+    page = await apaginate_keyset(request, authors, ordering, per_page=LIST_PAGE_SIZE)
+    return render(request, 'library/author_list.html', {'cards': await arender_author_cards(page), 'page': page})
+
+
+@conditional_page((AUTHOR, BOOK), model=Author)
+async def author_detail(request, pk):
+    """View for author details with books"""
+    # The author (with its profile) and the books only share the key: fetch both at once 🔀
+    author, books = await asyncio.gather(
+        aget_object_or_404(Author.objects.select_related('profile'), pk=pk),
+        _list(Book.objects.for_card().filter(author_id=pk)),
+    )
+    return render(request, 'library/author_detail.html', {'author': author, 'cards': await arender_book_cards(books)})
+
+
+@conditional_page((BOOK, AUTHOR))
+async def book_list(request):
+    """View for listing books a page at a time, or streaming all of them"""
+    books = Book.objects.for_card()
+    if request.GET.get('stream'):
+        return astream_rows(request, 'library/book_list.html', books.order_by('title', 'id'),
+                            arender_book_cards)
+    page = await apaginate_keyset(request, books, ('title', 'id'), per_page=LIST_PAGE_SIZE)
+    return render(request, 'library/book_list.html', {'cards': await arender_book_cards(page), 'page': page})
+
+
+@track_book_views
+@conditional_page((CATEGORY, PUBLICATION, PUBLISHER), model=Book)
+async def book_detail(request, pk):
+    """View for book details"""
+    # The three queries of Book.objects.for_detail(), issued together 🔀
+    book, categories, publications = await asyncio.gather(
+        aget_object_or_404(Book.objects.select_related('author').defer('author__biography'), pk=pk),
+        _list(Category.objects.filter(books=pk).only('id', 'name', 'slug')),
+        _list(Publication.objects.filter(book_id=pk).select_related('publisher').only(
+            'id', 'book_id', 'date_published', 'country', 'publisher__id', 'publisher__name'
+        )),
+    )
+    context = {
+        'book': book,
+        'categories': categories,
+        'publications': publications
+    }
+    return render(request, 'library/book_detail.html', context)
+
+
+@conditional_page((CATEGORY, BOOK))
+async def category_list(request):
+    """View for listing all categories, alphabetically or by number of books"""
+    ordering = ('-book_count', 'name') if request.GET.get('sort') == 'popular' else ('name',)
+    categories = await _list(Category.objects.order_by(*ordering))
+    return render(request, 'library/category_list.html', {'categories': categories})
+
+
+@conditional_page((BOOK, AUTHOR), model=Category, lookup='slug')
+async def category_detail(request, slug):
+    """View for category details with books"""
+    category, books = await asyncio.gather(
+        aget_object_or_404(Category, slug=slug),
+        _list(Book.objects.for_card().filter(categories__slug=slug)),
+    )
+    return render(request, 'library/category_detail.html', {'category': category, 'cards': await arender_book_cards(books)})
+
+
+@conditional_page((BOOK, AUTHOR, RATING), model=Category, lookup='slug')
+async def category_top_rated(request, slug):
+    """View for the best rated books of a category, a page at a time"""
+    books = Book.objects.for_card().top_rated().filter(categories__slug=slug)
+    category, page = await asyncio.gather(
+        aget_object_or_404(Category, slug=slug),
+        apaginate_keyset(request, books, ('-rating', 'id'), per_page=LIST_PAGE_SIZE),
+    )
+    context = {'category': category, 'cards': await arender_book_cards(page), 'page': page}
+    return render(request, 'library/category_top_rated.html', context)
+
+
+@conditional_page((BOOK, AUTHOR, CATEGORY))
+async def search(request):
+    """View for full-text catalog search ranked by relevance"""
+    query = request.GET.get('q', '').strip()
+    books = []
+    if query:
+        # Picking the backend may probe the database: keep it off the event loop too
+        book_ids = await sync_to_async(
+            lambda: catalog_search.get_backend().search(query, limit=SEARCH_RESULTS_LIMIT)
+        )()
+        found = await Book.objects.for_card().ain_bulk(book_ids)
+        books = [found[pk] for pk in book_ids if pk in found]
+    return render(request, 'library/search.html', {'query': query, 'cards': await arender_book_cards(books)})
@@ -0,0 +1,360 @@
+"""Streaming catalog import and export in CSV and JSONL 📦
+
+Both directions work a batch of rows at a time, so memory stays flat
+whatever the size of the file. An import resolves author, publisher and
+category names through NameCache (a bounded name -> id map that creates
+missing rows in bulk), upserts the books on their unique ISBN with one
+bulk_create(update_conflicts=True) per batch and writes the category links
+and publications in bulk as well. Bulk writes skip the model signals, so the
+caller rebuilds the derived data once the whole file is in.
+
+A record has the Book fields plus the names it refers to:
+
+    isbn, title, author, publication_date, summary,
+    categories: [name, ...],
+    publications: [(publisher, country, date_published), ...]
+
+In CSV, categories are separated by "|" and so are publications, whose
+fields are separated by ";". Dates are ISO 8601.
+"""
+import csv
+import gzip
+import json
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.text import slugify
+
+from .models import Author, AuthorProfile, Book, Category, Publication, Publisher
+from .streaming import chunked
+
+IMPORT_BATCH_SIZE = 2000
+EXPORT_CHUNK_SIZE = 2000
+# Names kept per NameCache; the least recently used are forgotten first
+NAME_CACHE_SIZE = 100000
+
+FIELDS = ['isbn', 'title', 'author', 'publication_date', 'summary', 'categories', 'publications']
+FORMATS = ('csv', 'jsonl')
+LIST_SEPARATOR = '|'
+PUBLICATION_SEPARATOR = ';'
+
+
+class CatalogError(ValueError):
+    """Raised for a catalog record that cannot be imported"""
+
+
+def detect_format(path):
+    """'jsonl' for .jsonl/.ndjson files (optionally gzipped), otherwise 'csv'"""
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'jsonl' if name.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def open_text(path, mode):
+    """Open a catalog file for text reading ('r') or writing ('w'), gzipped when it ends in .gz"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def _names(value):
+    return [name.strip() for name in value.split(LIST_SEPARATOR) if name.strip()] if value else []
+
+
+def _csv_record(row):
+    publications = []
+    for entry in _names(row.get('publications')):
+        publisher, country, date_published = (entry.split(PUBLICATION_SEPARATOR) + ['', ''])[:3]
+        publications.append((publisher, country, date_published))
+    return dict(row, categories=_names(row.get('categories')), publications=publications)
+
+
+def _jsonl_record(line):
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise CatalogError('Expected a JSON object')
+    publications = record.get('publications') or []
+    if not isinstance(publications, list):
+        raise CatalogError('publications must be a list')
+    # Other shapes are left for clean_record() to reject
+    record['publications'] = [
+        (entry.get('publisher'), entry.get('country'), entry.get('date_published'))
+        if isinstance(entry, dict) else entry
+        for entry in publications
+    ]
+    return record
+
+
+def read_records(stream, fmt):
+    """Yield (line number, raw record) from a CSV or JSONL stream, one at a time"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, _csv_record(row)
+        return
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield number, _jsonl_record(line)
+            except ValueError as error:
+                yield number, error
+
+
+def _date(value, field):
+    if not value:
+        return None
+    if not isinstance(value, str):
+        raise CatalogError(f'{field} must be an ISO date string')
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        # Well formed but impossible, like 2001-13-45
+        parsed = None
+    if parsed is None:
+        raise CatalogError(f'{field} is not a valid date: {value!r}')
+    return parsed
+
+
+def _text(value, field):
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise CatalogError(f'{field} must be a string')
+    return value.strip()
+
+
+def clean_record(record):
+    """Validate and normalize a raw record; raises CatalogError"""
+    if isinstance(record, Exception):
+        raise CatalogError(str(record))
+    isbn = str(record.get('isbn') or '').replace('-', '').replace(' ', '')
+    title = _text(record.get('title'), 'title')
+    author = _text(record.get('author'), 'author')
+    if not isbn or len(isbn) > 13:
+        raise CatalogError(f'Invalid ISBN: {record.get("isbn")!r}')
+    if not title or not author:
+        raise CatalogError('A book needs a title and an author')
+    summary = record.get('summary') or ''
+    if not isinstance(summary, str):
+        raise CatalogError('summary must be a string')
+    publication_date = _date(record.get('publication_date'), 'publication_date')
+    categories = record.get('categories') or []
+    if not isinstance(categories, list):
+        raise CatalogError('categories must be a list of names')
+    categories = [_text(name, 'A category') for name in categories]
+    publications = []
+    for entry in record.get('publications') or []:
+        if not isinstance(entry, (list, tuple)) or len(entry) != 3:
+            raise CatalogError('A publication needs a publisher, a country and a date')
+        publisher, country, date_published = entry
+        publisher, country = _text(publisher, 'publisher'), _text(country, 'country')
+        if not publisher or not country:
+            raise CatalogError('A publication needs a publisher and a country')
+        date_published = _date(date_published, 'date_published') or publication_date
+        if date_published is None:
+            raise CatalogError(f'Publication by {publisher} has no date')
+        publications.append((publisher[:100], country[:50], date_published))
+    return {
+        'isbn': isbn,
+        'title': title[:200],
+        'author': author[:100],
+        'publication_date': publication_date,
+        'summary': summary,
+        'categories': [name[:50] for name in categories if name],
+        'publications': publications,
+    }
+
+
+class NameCache:
+    """name -> id of a model with a `name` field, creating missing rows in bulk.
+
+    Several rows may share a name (authors, publishers): the oldest one is
+    used. At most `size` names are remembered, so the cache stays bounded
+    however many distinct names a feed contains.
+    """
+
+    def __init__(self, model, size=NAME_CACHE_SIZE):
+        self.model = model
+        self.size = size
+        self.ids = OrderedDict()
+        self.created = 0
+
+    def build(self, name):
+        return self.model(name=name)
+
+    def fetch(self, names):
+        found = {}
+        rows = self.model.objects.filter(name__in=names).order_by('pk').values_list('name', 'pk')
+        for name, pk in rows:
+            found.setdefault(name, pk)
+        return found
+
+    def after_create(self, pks):
+        """Hook run with the ids of newly created rows"""
+
+    def resolve(self, names):
+        """{name: id} for the given names, creating the missing rows"""
+        names = set(names)
+        result = {}
+        for name in names:
+            if name in self.ids:
+                self.ids.move_to_end(name)
+                result[name] = self.ids[name]
+        missing = names - set(result)
+        if missing:
+            found = self.fetch(missing)
+            new = [self.build(name) for name in sorted(missing - set(found))]
+            if new:
+                self.model.objects.bulk_create(new, ignore_conflicts=True)
+                found.update(self.fetch(missing - set(found)))
+                # Names sharing a slug may have landed on the same new row
+                pks = {found[obj.name] for obj in new if obj.name in found}
+                self.after_create(sorted(pks))
+                self.created += len(pks)
+            result.update(found)
+            for name, pk in found.items():
+                self.ids[name] = pk
+            while len(self.ids) > self.size:
+                self.ids.popitem(last=False)
+        return result
+
+
+class AuthorCache(NameCache):
+    def after_create(self, pks):
+        # Every author has a profile (the detail page selects it)
+        AuthorProfile.objects.bulk_create([AuthorProfile(author_id=pk) for pk in pks], ignore_conflicts=True)
+
+
+class CategoryCache(NameCache):
+    def build(self, name):
+        return Category(name=name, slug=slugify(name)[:50] or 'category')
+
+    def fetch(self, names):
+        # A name whose slug is already taken maps to the category holding it
+        found = super().fetch(names)
+        by_slug = {}
+        for name in names:
+            if name not in found:
+                by_slug.setdefault(slugify(name)[:50] or 'category', []).append(name)
+        if by_slug:
+            for slug, pk in Category.objects.filter(slug__in=by_slug).values_list('slug', 'pk'):
+                for name in by_slug[slug]:
+                    found[name] = pk
+        return found
+
+
+class CatalogImporter:
+    """Upserts batches of cleaned records; keeps running totals"""
+
+    def __init__(self):
+        self.authors = AuthorCache(Author)
+        self.publishers = NameCache(Publisher)
+        self.categories = CategoryCache(Category)
+        self.books = 0
+
+    def import_batch(self, records):
+        """Write a batch of cleaned records in one transaction; returns how many books"""
+        # A later row for the same ISBN wins, as it would row by row
+        records = list({record['isbn']: record for record in records}.values())
+        with transaction.atomic():
+            author_ids = self.authors.resolve(record['author'] for record in records)
+            publisher_ids = self.publishers.resolve(
+                publisher for record in records for publisher, _, _ in record['publications']
+            )
+            category_ids = self.categories.resolve(name for record in records for name in record['categories'])
+
+            books = Book.objects.bulk_create(
+                [Book(isbn=record['isbn'], title=record['title'], author_id=author_ids[record['author']],
+                      publication_date=record['publication_date'], summary=record['summary'])
+                 for record in records],
+                update_conflicts=True, unique_fields=['isbn'],
+                update_fields=['title', 'author', 'publication_date', 'summary'],
+            )
+            book_ids = {record['isbn']: book.pk for record, book in zip(records, books)}
+            if None in book_ids.values():
+                # Backends that cannot return ids from an upsert
+                book_ids = dict(Book.objects.filter(isbn__in=book_ids).values_list('isbn', 'pk'))
+            # Invalidate the cached cards of every book the batch touched 🃏
+            Book.objects.filter(pk__in=book_ids.values()).update(
+                card_version=F('card_version') + 1, updated_at=timezone.now()
+            )
+
+            # The feed's categories replace a book's links; rows without any leave them alone
+            categorized = [record for record in records if record['categories']]
+            BookCategory = Book.categories.through
+            BookCategory.objects.filter(book_id__in=[book_ids[record['isbn']] for record in categorized]).delete()
+            BookCategory.objects.bulk_create(
+                [BookCategory(book_id=book_ids[record['isbn']], category_id=category_ids[name])
+                 for record in categorized for name in set(record['categories'])],
+                ignore_conflicts=True,
+            )
+            Publication.objects.bulk_create(
+                list({
+                    (book_ids[record['isbn']], publisher_ids[publisher], country): Publication(
+                        book_id=book_ids[record['isbn']], publisher_id=publisher_ids[publisher],
+                        country=country, date_published=date_published,
+                    )
+                    for record in records for publisher, country, date_published in record['publications']
+                }.values()),
+                update_conflicts=True, unique_fields=['book', 'publisher', 'country'],
+                update_fields=['date_published'],
+            )
+        self.books += len(records)
+        return len(records)
+
+
+def export_rows(queryset=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield one record per book, reading the books and their links a chunk at a time"""
+    queryset = queryset if queryset is not None else Book.objects.all()
+    books = queryset.select_related('author').only(
+        'id', 'isbn', 'title', 'publication_date', 'summary', 'author__name'
+    ).order_by('pk')
+    for chunk in chunked(books.iterator(chunk_size=chunk_size), chunk_size):
+        ids = [book.pk for book in chunk]
+        categories = {}
+        links = Book.categories.through.objects.filter(book_id__in=ids).order_by('category__name')
+        for book_id, name in links.values_list('book_id', 'category__name'):
+            categories.setdefault(book_id, []).append(name)
+        publications = {}
+        rows = Publication.objects.filter(book_id__in=ids).order_by('pk').values_list(
+            'book_id', 'publisher__name', 'country', 'date_published'
+        )
+        for book_id, publisher, country, date_published in rows:
+            publications.setdefault(book_id, []).append((publisher, country, date_published.isoformat()))
+        for book in chunk:
+            yield {
+                'isbn': book.isbn,
+                'title': book.title,
+                'author': book.author.name,
+                'publication_date': book.publication_date.isoformat() if book.publication_date else None,
+                'summary': book.summary,
+                'categories': categories.get(book.pk, []),
+                'publications': publications.get(book.pk, []),
+            }
+
+
+class RecordWriter:
+    """Writes export records to a text stream as CSV or JSONL"""
+
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == 'csv':
+            self.csv = csv.writer(stream)
+            self.csv.writerow(FIELDS)
+
+    def write(self, record):
+        if self.fmt == 'jsonl':
+            record = dict(record, publications=[
+                {'publisher': publisher, 'country': country, 'date_published': date_published}
+                for publisher, country, date_published in record['publications']
+            ])
+            self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+            return
+        self.csv.writerow([
+            record['isbn'], record['title'], record['author'], record['publication_date'] or '',
+            record['summary'], LIST_SEPARATOR.join(record['categories']),
+            LIST_SEPARATOR.join(PUBLICATION_SEPARATOR.join(entry) for entry in record['publications']),
+        ])
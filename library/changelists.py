@@ -0,0 +1,270 @@
+"""Admin changelists that stay fast on tables of millions of rows 📋
+
+ScalableModelAdmin swaps the pieces of a changelist that grow with the
+table:
+
+- EstimatedCountPaginator never runs an exact COUNT(*) over a big table: an
+  unfiltered list takes the planner's row estimate, a filtered one counts at
+  most COUNT_LIMIT rows. A page is fetched with a deferred join, reading the
+  ids of the page from the ordering index first and only those rows in full,
+  so OFFSET skips index entries instead of joined rows.
+- ScalableChangeList adds a "next" cursor link (keyset pagination) that
+  seeks past the last row shown, so paging on beyond the numbered pages
+  costs the same at any depth.
+- AutocompleteFilter filters on a relation through the admin's autocomplete
+  view instead of listing every related row in the sidebar, and
+  CachedValuesFilter lists the distinct values of a low-cardinality column
+  from the LIBRARY_ADMIN_CACHE cache.
+"""
+from django import forms
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.cache import caches
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+from .pagination import InvalidCursor, KeysetPaginator, encode_cursor
+
+# Filtered changelists count at most this many rows; beyond it the "next" link pages on
+COUNT_LIMIT = 10000
+CURSOR_VAR = 'after'
+# How long CachedValuesFilter keeps a column's distinct values
+CHOICES_CACHE_SECONDS = 600
+
+
+def _cache():
+    return caches[getattr(settings, 'LIBRARY_ADMIN_CACHE', 'default')]
+
+
+def estimated_count(model, using):
+    """The database's cheap estimate of a table's rows, or None without one"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            # -1 until the table is first analyzed
+            return int(row[0]) if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone():
+                # ANALYZE statistics: the first number is the table's row count
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s AND idx IS NULL', [table])
+                row = cursor.fetchone()
+                if row:
+                    return int(row[0].split()[0])
+            # An upper bound read from the end of the primary key index
+            column = connection.ops.quote_name(model._meta.pk.column)
+            cursor.execute(f'SELECT MAX({column}) FROM {connection.ops.quote_name(table)}')
+            return cursor.fetchone()[0] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator with an estimated or capped count and deferred-join pages"""
+
+    # Set when the count stopped at COUNT_LIMIT
+    capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where and not queryset.query.distinct:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > COUNT_LIMIT:
+                return estimate
+        count = queryset.order_by()[:COUNT_LIMIT + 1].count()
+        if count > COUNT_LIMIT:
+            self.capped = True
+            return COUNT_LIMIT
+        return count
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        ids = list(self.object_list.values_list('pk', flat=True)[bottom:bottom + self.per_page])
+        # Same ordering, so the rows come back in the order of the ids
+        return self._get_page(self.object_list.filter(pk__in=ids), number, self)
+
+
+class ScalableChangeList(ChangeList):
+    """ChangeList that follows a keyset cursor past the numbered pages"""
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Sorting, filtering and numbered pages start over from the first row
+        return super().get_query_string(new_params, [*(remove or []), CURSOR_VAR])
+
+    @cached_property
+    def keyset_ordering(self):
+        """The changelist ordering if a cursor can seek on it: non-null local fields ending in a unique one"""
+        ordering = tuple(self.queryset.query.order_by)
+        for item in ordering:
+            if not isinstance(item, str):
+                return None
+            name = item.lstrip('-')
+            if name == 'pk':
+                continue
+            try:
+                field = self.lookup_opts.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if field.is_relation or field.null:
+                return None
+        last = ordering[-1].lstrip('-') if ordering else None
+        if last is None or not (last == 'pk' or self.lookup_opts.get_field(last).unique):
+            return None
+        return ordering
+
+    def get_results(self, request):
+        if self.cursor is None:
+            super().get_results(request)
+            return
+        if self.keyset_ordering is None:
+            raise IncorrectLookupParameters('This ordering cannot be paged with a cursor')
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        keyset = KeysetPaginator(self.queryset, self.keyset_ordering, per_page=self.list_per_page)
+        try:
+            page = keyset.page(after=self.cursor)
+        except InvalidCursor:
+            raise IncorrectLookupParameters('Invalid page cursor')
+        self.result_count = paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.result_list = page.object_list
+        self.can_show_all = False
+        self.multi_page = True
+        self.paginator = paginator
+        self.next_cursor = page.next_cursor
+
+    def next_page_url(self):
+        """Query string of the rows after this page, or '' on the last page"""
+        if self.keyset_ordering is None or not self.multi_page:
+            return ''
+        if self.cursor is not None:
+            cursor = self.next_cursor
+        else:
+            rows = list(self.result_list)
+            if len(rows) < self.list_per_page:
+                return ''
+            fields = [name.lstrip('-') for name in self.keyset_ordering]
+            cursor = encode_cursor(getattr(rows[-1], name) for name in fields)
+        return self.get_query_string({CURSOR_VAR: cursor}) if cursor else ''
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    """ModelAdmin whose changelist cost does not grow with the table"""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # Facet counts are a COUNT per filter option over the whole table
+    show_facets = admin.ShowFacets.NEVER
+
+    def get_changelist(self, request, **kwargs):
+        return ScalableChangeList
+
+    @property
+    def media(self):
+        media = super().media
+        for list_filter in self.list_filter:
+            if isinstance(list_filter, type) and issubclass(list_filter, AutocompleteFilter):
+                media += list_filter.widget(self.model, self).media
+        return media
+
+
+class AutocompleteFilter(admin.SimpleListFilter):
+    """Filter on the relation `field_name`, picked with the admin's autocomplete widget.
+
+    The related model's admin needs search_fields. Only the selected row is
+    read, however many rows the related table has.
+    """
+
+    template = 'admin/library/autocomplete_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        self.field = model._meta.get_field(self.field_name)
+        self.model_admin = model_admin
+        super().__init__(request, params, model, model_admin)
+
+    @classmethod
+    def widget(cls, model, model_admin):
+        field = model._meta.get_field(cls.field_name)
+        return AutocompleteSelect(field, model_admin.admin_site, attrs={
+            'onchange': 'this.form.submit()', 'data-width': '100%',
+        })
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return None
+        try:
+            value = self.field.target_field.to_python(self.value())
+        except ValidationError as error:
+            raise IncorrectLookupParameters(error)
+        # One related row: a many-to-many join cannot duplicate results here
+        return queryset.filter(**{self.field_name: value})
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'display': _('All'),
+        }
+        form_field = forms.ModelChoiceField(
+            self.field.remote_field.model._default_manager.all(), required=False,
+            widget=self.widget(self.model_admin.model, self.model_admin),
+        )
+        yield {
+            'selected': self.value() is not None,
+            'hidden': [
+                (name, value)
+                for name, values in changelist.filter_params.items()
+                if name not in (self.parameter_name, CURSOR_VAR)
+                for value in values
+            ],
+            'widget': form_field.widget.render(self.parameter_name, self.value()),
+        }
+
+
+class CachedValuesFilter(admin.SimpleListFilter):
+    """Filter on the distinct values of a low-cardinality column, listed from the cache"""
+
+    field_name = None
+
+    def lookups(self, request, model_admin):
+        key = f'library:admin:values:{model_admin.model._meta.label_lower}:{self.field_name}'
+        values = _cache().get(key)
+        if values is None:
+            values = list(
+                model_admin.model._default_manager.order_by(self.field_name)
+                .values_list(self.field_name, flat=True).distinct()
+            )
+            _cache().set(key, values, CHOICES_CACHE_SECONDS)
+        return [(value, value) for value in values]
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return None
+        return queryset.filter(**{self.field_name: self.value()})
@@ -0,0 +1,89 @@
+"""Conditional GET and Cache-Control for the library pages 🏷️
+
+conditional_page() computes a page's validators before the view runs: an
+ETag and a Last-Modified from the versions of the tables the page reads
+(versions.py) and, for a detail page, the updated_at of its own row, one
+indexed lookup. The ETag also covers the path and the query string, so the
+pages and orderings of one view never validate each other. A request whose
+If-None-Match or If-Modified-Since still matches gets a 304 without the view
+querying or rendering anything; other responses carry the validators and
+LIBRARY_CACHE_CONTROL, so browsers and a CDN can revalidate cheaply.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, urlencode
+
+from . import versions
+from .fragments import CARD_MARKUP_VERSION
+
+# Bump when the page templates change so revalidation never keeps old markup
+PAGE_MARKUP_VERSION = 2
+
+
+def _cache_control():
+    return getattr(settings, 'LIBRARY_CACHE_CONTROL', {'public': True, 'max_age': 0, 'must_revalidate': True})
+
+
+def _query(request):
+    """The query string with its parameters sorted by name; repeated values keep their order"""
+    return urlencode(sorted(request.GET.lists()), doseq=True)
+
+
+def validators(request, tables, model=None, lookup='pk', value=None):
+    """(ETag, Last-Modified timestamp) of a page, or (None, None) when its row is missing"""
+    table_versions = versions.get(*tables)
+    # Pages, cursors and sort orders of one view share its versions: the URL tells them apart
+    parts = [PAGE_MARKUP_VERSION, CARD_MARKUP_VERSION, request.path, _query(request), *table_versions]
+    changed = max(table_versions, default=0) / 1e9
+    if model is not None:
+        updated_at = model.objects.filter(**{lookup: value}).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            # Let the view answer (with its 404)
+            return None, None
+        parts.append(updated_at.timestamp())
+        changed = max(changed, updated_at.timestamp())
+    etag = '"%s"' % hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+    return etag, int(changed)
+
+
+def _finish(request, response, etag, last_modified):
+    if response.status_code in (200, 304):
+        if etag is not None:
+            response.headers.setdefault('ETag', etag)
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+        patch_cache_control(response, **_cache_control())
+    return response
+
+
+def conditional_page(tables, model=None, lookup='pk'):
+    """Decorate a GET view with validators from `tables` (and the `lookup` row of `model`)"""
+    def decorator(view):
+        def check(request, kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return None, None, None
+            etag, last_modified = validators(request, tables, model, lookup, kwargs.get(lookup))
+            if etag is None:
+                return None, None, None
+            return get_conditional_response(request, etag=etag, last_modified=last_modified), etag, last_modified
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                response, etag, last_modified = await sync_to_async(check)(request, kwargs)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _finish(request, response, etag, last_modified)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response, etag, last_modified = check(request, kwargs)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return _finish(request, response, etag, last_modified)
+        return wrapper
+    return decorator
@@ -0,0 +1,27 @@
+"""Path converters of the library URLs 🔗"""
+from django.urls import register_converter
+
+# SQLite stores integers, primary keys included, as signed 64-bit values
+MAX_ID = 2 ** 63 - 1
+
+
+def to_id(value):
+    """An integer id; raises ValueError for anything a database integer cannot hold"""
+    value = int(value)
+    if not -MAX_ID - 1 <= value <= MAX_ID:
+        raise ValueError(f'Id out of range: {value}')
+    return value
+
+
+class IdConverter:
+    """Like <int:...>, but an id too large for the database does not match (a 404, not a 500)"""
+    regex = '[0-9]+'
+
+    def to_python(self, value):
+        return to_id(value)
+
+    def to_url(self, value):
+        return str(value)
+
+
+register_converter(IdConverter, 'id')
@@ -0,0 +1,51 @@
+"""Denormalized book counts on Category and Author 🔢
+
+The receivers in signals.py keep Category.book_count and Author.book_count
+exact with atomic F() updates; rebuild() recomputes them in bulk after writes
+that bypass signals.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Author, Book, Category
+
+REBUILD_CHUNK_SIZE = 10000
+
+
+def adjust_category_counts(deltas):
+    """Apply {category_id: delta} with one UPDATE per distinct delta"""
+    by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(pk)
+    for delta, pks in by_delta.items():
+        Category.objects.filter(pk__in=pks).update(book_count=F('book_count') + delta)
+
+
+def adjust_author_count(author_id, delta):
+    Author.objects.filter(pk=author_id).update(book_count=F('book_count') + delta)
+
+
+def _rebuild(model, counted):
+    """Set model.book_count from a correlated COUNT over `counted`, a chunk of ids at a time"""
+    last_pk = 0
+    while True:
+        pks = list(model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:REBUILD_CHUNK_SIZE])
+        if not pks:
+            return
+        with transaction.atomic():
+            model.objects.filter(pk__gte=pks[0], pk__lte=pks[-1]).update(
+                book_count=Coalesce(Subquery(counted), 0)
+            )
+        last_pk = pks[-1]
+
+
+def rebuild():
+    """Recompute every category and author book count from the link tables"""
+    links = Book.categories.through.objects.filter(category_id=OuterRef('pk')).order_by()
+    _rebuild(Category, links.values('category_id').annotate(total=Count('*')).values('total'))
+    books = Book.objects.filter(author_id=OuterRef('pk')).order_by()
+    _rebuild(Author, books.values('author_id').annotate(total=Count('*')).values('total'))
@@ -0,0 +1,13 @@
+from . import counters, search, stats, versions
+
+
+def rebuild_derived_data():
+    """Rebuild every structure kept current by model signals.
+
+    Bulk writes (bulk_create, queryset.update, raw deletes) skip the signal
+    receivers, so commands that use them call this once they are done.
+    """
+    counters.rebuild()
+    search.get_backend().rebuild()
+    stats.reconcile()
+    versions.touch()
@@ -0,0 +1,85 @@
+"""Versioned render cache for book and author cards 🃏
+
+Each card is cached under the object's primary key and its card_version
+column, which the model signals bump whenever something shown on the card
+changes. Since the version arrives with the row itself, a list page looks up
+all of its cards with a single get_many and never serves a stale card.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+BOOK_CARD = 'library/includes/book_card.html'
+AUTHOR_CARD = 'library/includes/author_card.html'
+
+# Bump when the card templates change so old markup is never served
+CARD_MARKUP_VERSION = 1
+
+
+def _cache():
+    return caches[getattr(settings, 'LIBRARY_FRAGMENT_CACHE', 'default')]
+
+
+def card_key(template_name, obj):
+    return f'library:card:{template_name}:{obj.pk}:{obj.card_version}'
+
+
+def _timeout():
+    return getattr(settings, 'LIBRARY_FRAGMENT_CACHE_TIMEOUT', 86400)
+
+
+def _assemble(objects, keys, cached, template_name, context_name):
+    """Combine cached cards with freshly rendered misses, in object order"""
+    template = get_template(template_name)
+    cards, rendered = [], {}
+    for key, obj in zip(keys, objects):
+        html = cached.get(key)
+        if html is None:
+            html = rendered[key] = template.render({context_name: obj})
+        cards.append(mark_safe(html))
+    return cards, rendered
+
+
+def render_cards(objects, template_name, context_name):
+    """Return the rendered card of every object, rendering only cache misses"""
+    objects = list(objects)
+    if not objects:
+        return []
+    cache = _cache()
+    keys = [card_key(template_name, obj) for obj in objects]
+    cached = cache.get_many(keys, version=CARD_MARKUP_VERSION)
+    cards, rendered = _assemble(objects, keys, cached, template_name, context_name)
+    if rendered:
+        cache.set_many(rendered, timeout=_timeout(), version=CARD_MARKUP_VERSION)
+    return cards
+
+
+async def arender_cards(objects, template_name, context_name):
+    """Async version of render_cards()"""
+    objects = list(objects)
+    if not objects:
+        return []
+    cache = _cache()
+    keys = [card_key(template_name, obj) for obj in objects]
+    cached = await cache.aget_many(keys, version=CARD_MARKUP_VERSION)
+    cards, rendered = _assemble(objects, keys, cached, template_name, context_name)
+    if rendered:
+        await cache.aset_many(rendered, timeout=_timeout(), version=CARD_MARKUP_VERSION)
+    return cards
+
+
+def render_book_cards(books):
+    return render_cards(books, BOOK_CARD, 'book')
+
+
+def render_author_cards(authors):
+    return render_cards(authors, AUTHOR_CARD, 'author')
+
+
+async def arender_book_cards(books):
+    return await arender_cards(books, BOOK_CARD, 'book')
+
+
+async def arender_author_cards(authors):
+    return await arender_cards(authors, AUTHOR_CARD, 'author')
@@ -0,0 +1,133 @@
+"""Batching loaders for the JSON API, DataLoader-style 🧺
+
+A Loader collects the keys it is asked for and fetches every queued key with
+one `IN` query (per BATCH_SIZE keys) the first time any of them is needed,
+then answers repeated keys from its cache. Serializers queue the relations
+of a whole chunk of rows before reading any of them, so a chunk costs one
+query per relation however many rows it holds. CatalogLoaders groups the
+catalog's loaders for one request; its rows are plain dicts from values().
+"""
+from .models import Author, Book, Publication
+from .streaming import chunked
+
+# Keys per IN query; SQLite 3.32+ allows 32766 parameters per statement
+BATCH_SIZE = 1000
+
+BOOK_FIELDS = ('id', 'isbn', 'title', 'author_id', 'publication_date', 'summary')
+AUTHOR_FIELDS = ('id', 'name', 'birth_date', 'biography', 'book_count')
+# The author as embedded in each book
+BOOK_AUTHOR_FIELDS = ('id', 'name')
+
+
+class Pending:
+    """A value a Loader will fetch with the rest of its batch"""
+
+    __slots__ = ('loader', 'key')
+
+    def __init__(self, loader, key):
+        self.loader = loader
+        self.key = key
+
+    def get(self):
+        return self.loader.resolve(self.key)
+
+
+class Loader:
+    """Coalesces lookups by key into batched calls of batch_load(keys) -> {key: value}"""
+
+    def __init__(self, batch_load, default=None):
+        self.batch_load = batch_load
+        self.default = default
+        self.cache = {}
+        self.queue = {}
+
+    def load(self, key):
+        """Queue a key; the returned Pending's get() fetches the whole queue at once"""
+        if key not in self.cache:
+            self.queue[key] = None
+        return Pending(self, key)
+
+    def load_many(self, keys):
+        """Values of the given keys in order, fetched together"""
+        pending = [self.load(key) for key in keys]
+        return [item.get() for item in pending]
+
+    def resolve(self, key):
+        if key not in self.cache:
+            self.dispatch()
+        return self.cache.get(key, self.default)
+
+    def dispatch(self):
+        """Fetch every queued key not cached yet"""
+        keys = [key for key in self.queue if key not in self.cache]
+        self.queue.clear()
+        for batch in chunked(keys, BATCH_SIZE):
+            found = self.batch_load(batch)
+            for key in batch:
+                self.cache[key] = found.get(key, self.default)
+
+    def clear(self):
+        self.cache.clear()
+        self.queue.clear()
+
+
+def _rows_by(model, field, fields):
+    def batch_load(keys):
+        rows = model.objects.filter(**{f'{field}__in': keys}).values(*fields)
+        return {row[field]: row for row in rows}
+    return batch_load
+
+
+def _categories_by_book(book_ids):
+    result = {}
+    links = Book.categories.through.objects.filter(book_id__in=book_ids).order_by('category__name')
+    for book_id, pk, name, slug in links.values_list('book_id', 'category_id', 'category__name', 'category__slug'):
+        result.setdefault(book_id, []).append({'id': pk, 'name': name, 'slug': slug})
+    return result
+
+
+def _publications_by_book(book_ids):
+    result = {}
+    rows = Publication.objects.filter(book_id__in=book_ids).order_by('date_published', 'pk').values(
+        'book_id', 'publisher_id', 'publisher__name', 'country', 'date_published'
+    )
+    for row in rows:
+        result.setdefault(row['book_id'], []).append({
+            'publisher': {'id': row['publisher_id'], 'name': row['publisher__name']},
+            'country': row['country'],
+            'date_published': row['date_published'],
+        })
+    return result
+
+
+class CatalogLoaders:
+    """The loaders of one request (or one streamed chunk)"""
+
+    def __init__(self):
+        self.books_by_id = Loader(_rows_by(Book, 'id', BOOK_FIELDS))
+        self.books_by_isbn = Loader(_rows_by(Book, 'isbn', BOOK_FIELDS))
+        self.authors = Loader(_rows_by(Author, 'id', AUTHOR_FIELDS))
+        self.book_authors = Loader(_rows_by(Author, 'id', BOOK_AUTHOR_FIELDS))
+        self.book_categories = Loader(_categories_by_book, default=())
+        self.book_publications = Loader(_publications_by_book, default=())
+
+    def clear(self):
+        """Forget every cached row, keeping memory flat across streamed chunks"""
+        for loader in vars(self).values():
+            loader.clear()
+
+    def books(self, rows):
+        """Book rows with their author, categories and publications: one query per relation"""
+        pending = [
+            (row, self.book_authors.load(row['author_id']), self.book_categories.load(row['id']),
+             self.book_publications.load(row['id']))
+            for row in rows
+        ]
+        books = []
+        for row, author, categories, publications in pending:
+            book = {name: value for name, value in row.items() if name != 'author_id'}
+            book['author'] = author.get()
+            book['categories'] = list(categories.get())
+            book['publications'] = list(publications.get())
+            books.append(book)
+        return books
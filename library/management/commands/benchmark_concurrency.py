@@ -0,0 +1,166 @@
+import io
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F
+from django.test.utils import override_settings
+
+from analytics.models import BookView
+from library.models import Book
+
+# Django's stock SQLite connection: rollback journal, full sync, a new
+# connection per request
+BASELINE = {'pragmas': {'journal_mode': 'DELETE', 'synchronous': 'FULL'}, 'conn_max_age': 0}
+
+
+def _percentile(values, share):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks concurrent reads and writes on SQLite with the stock and the tuned connection settings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=2000, help='Books in the benchmark catalog')
+        parser.add_argument('--readers', type=int, default=4, help='Reader threads')
+        parser.add_argument('--writers', type=int, default=2, help='Writer threads')
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds each profile runs')
+        parser.add_argument('--output', help='Also write the JSON results to this file')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stderr.write('This benchmark measures SQLite connection settings only')
+            return
+        profiles = {
+            'baseline': BASELINE,
+            'tuned': {
+                'pragmas': getattr(settings, 'LIBRARY_SQLITE_PRAGMAS', {}),
+                'conn_max_age': connection.settings_dict.get('CONN_MAX_AGE', 0),
+            },
+        }
+        # WAL needs a real file: build the benchmark database next to the temp files 🧪
+        path = os.path.join(tempfile.gettempdir(), f'library-concurrency-{os.getpid()}.sqlite3')
+        no_migrations = {config.label: None for config in apps.get_app_configs()}
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        previous_test_name = test_settings.get('NAME')
+        test_settings['NAME'] = path
+        results = {}
+        try:
+            with override_settings(MIGRATION_MODULES=no_migrations, LIBRARY_READ_REPLICAS={'ALIASES': []}):
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                try:
+                    self.stdout.write(f"Seeding {options['scale']} books...")
+                    call_command('populate_db', scale=options['scale'], stdout=io.StringIO())
+                    for name, profile in profiles.items():
+                        self.stdout.write(f'Running {name} for {options["duration"]}s...')
+                        results[name] = self.run_profile(profile, options)
+                finally:
+                    connections.close_all()
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            test_settings['NAME'] = previous_test_name
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+
+    def run_profile(self, profile, options):
+        """Run reader and writer threads against the profile; returns their throughput"""
+        book_ids = list(Book.objects.values_list('pk', flat=True))
+        connections.close_all()
+        max_age = connection.settings_dict.get('CONN_MAX_AGE', 0)
+        connection.settings_dict['CONN_MAX_AGE'] = profile['conn_max_age']
+        stats = {'read': [], 'write': [], 'read_errors': 0, 'write_errors': 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['duration']
+        try:
+            with override_settings(LIBRARY_SQLITE_PRAGMAS=profile['pragmas']):
+                # journal_mode belongs to the file: set it before the workers start
+                connection.ensure_connection()
+                connection.close()
+                threads = [
+                    threading.Thread(target=self.worker, args=(kind, book_ids, deadline, stats, lock))
+                    for kind in ['read'] * options['readers'] + ['write'] * options['writers']
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            connection.settings_dict['CONN_MAX_AGE'] = max_age
+        duration = options['duration']
+        return {
+            kind: {
+                'ops_per_second': round(len(stats[kind]) / duration, 1),
+                'p50_ms': round(statistics.median(stats[kind]) * 1000, 2) if stats[kind] else 0.0,
+                'p95_ms': round(_percentile(stats[kind], 0.95) * 1000, 2),
+                'errors': stats[f'{kind}_errors'],
+            }
+            for kind in ('read', 'write')
+        }
+
+    def worker(self, kind, book_ids, deadline, stats, lock):
+        """One simulated client issuing requests until the deadline"""
+        operation = self.read if kind == 'read' else self.write
+        timings, errors = [], 0
+        rng = random.Random()
+        try:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    operation(book_ids, rng)
+                    timings.append(time.perf_counter() - started)
+                except OperationalError:
+                    # "database is locked"
+                    errors += 1
+                # What request_finished does: closes the connection unless it is persistent
+                connection.close_if_unusable_or_obsolete()
+        finally:
+            connection.close()
+        with lock:
+            stats[kind].extend(timings)
+            stats[f'{kind}_errors'] += errors
+
+    def read(self, book_ids, rng):
+        """A book page: the book with its relations and a page of the list"""
+        book = Book.objects.for_detail().get(pk=rng.choice(book_ids))
+        list(book.categories.all())
+        list(Book.objects.for_card().order_by('title', 'id')[:20])
+
+    def write(self, book_ids, rng):
+        """A batch of tracked views and an edited book, as the writer thread and admin do"""
+        with transaction.atomic():
+            BookView.objects.bulk_create([BookView(book_id=rng.choice(book_ids)) for _ in range(10)])
+            Book.objects.filter(pk=rng.choice(book_ids)).update(card_version=F('card_version') + 1)
+
+    def report(self, results):
+        self.stdout.write(f"{'profile':<10} {'kind':<6} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+        for name, kinds in results.items():
+            for kind, row in kinds.items():
+                self.stdout.write(
+                    f"{name:<10} {kind:<6} {row['ops_per_second']:>9.1f} {row['p50_ms']:>8.2f} "
+                    f"{row['p95_ms']:>8.2f} {row['errors']:>7}"
+                )
+        if {'baseline', 'tuned'} <= set(results):
+            for kind in ('read', 'write'):
+                before = results['baseline'][kind]['ops_per_second']
+                after = results['tuned'][kind]['ops_per_second']
+                ratio = after / before if before else float('inf')
+                self.stdout.write(self.style.SUCCESS(f'{kind} throughput: {ratio:.2f}x with the tuned profile ⚙️'))
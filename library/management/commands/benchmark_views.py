@@ -0,0 +1,230 @@
+import json
+import statistics
+import time
+import tracemalloc
+from collections import Counter
+from io import StringIO
+
+from django.apps import apps
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+from django.urls import reverse
+from library import api_urls, urls as library_urls
+from library.models import Author, Book, Category
+
+# Maximum queries each view may run once caches are warm 🎯
+# (detail pages include the updated_at lookup of their conditional GET 🏷️)
+QUERY_BUDGETS = {
+    'home': 0,
+    'author_list': 1,
+    'author_detail': 3,
+    'book_list': 1,
+    'book_detail': 4,
+    'category_list': 1,
+    'category_detail': 3,
+    'category_top_rated': 3,
+    'search': 2,
+    # JSON API: one query for the books and one per relation 🔌
+    'api_books': 4,
+    'api_book': 5,
+    'api_authors': 1,
+    'api_author': 3,
+    'api_categories': 1,
+}
+
+
+def _first_book():
+    return Book.objects.order_by('pk').first()
+
+
+# How to build the URL arguments of every named route in library/urls.py 🔗
+URL_KWARGS = {
+    'author_detail': lambda: {'pk': Author.objects.order_by('pk').values_list('pk', flat=True).first()},
+    'book_detail': lambda: {'pk': _first_book().pk},
+    'category_detail': lambda: {'slug': Category.objects.order_by('pk').values_list('slug', flat=True).first()},
+    'category_top_rated': lambda: {'slug': Category.objects.order_by('pk').values_list('slug', flat=True).first()},
+    'api_book': lambda: {'pk': _first_book().pk},
+    'api_author': lambda: {'pk': Author.objects.order_by('pk').values_list('pk', flat=True).first()},
+}
+URL_QUERIES = {
+    'search': lambda: f'q={_first_book().title.split()[0]}',
+    'api_books': lambda: 'isbn=' + ','.join(Book.objects.order_by('pk').values_list('isbn', flat=True)[:50]),
+    'api_authors': lambda: 'id=' + ','.join(map(str, Author.objects.order_by('pk').values_list('pk', flat=True)[:50])),
+}
+
+
+def _consume(response):
+    return b''.join(response.streaming_content) if response.streaming else response.content
+
+
+def _tables(queries):
+    """Count how many queries touched each table, by the first FROM clause"""
+    tables = Counter()
+    for query in queries:
+        sql = query['sql']
+        marker = sql.find(' FROM "')
+        if marker != -1:
+            tables[sql[marker + 7:sql.index('"', marker + 7)]] += 1
+    return dict(tables)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks query count, latency and peak memory of every library view'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', type=int, nargs='+', default=[100, 1000],
+                            help='Catalog sizes (in books) to seed and benchmark')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed requests per view')
+        parser.add_argument('--seed', type=int, default=42, help='Seed for the synthetic catalog')
+        parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+        parser.add_argument('--baseline', help='JSON results of a previous run to compare against')
+        parser.add_argument('--query-tolerance', type=int, default=0,
+                            help='Extra queries per view allowed over the baseline')
+        parser.add_argument('--max-slowdown', type=float,
+                            help='Fail when a view is this many times slower than the baseline')
+
+    def handle(self, *args, **options):
+        scales = sorted(options['scales'])
+        setup_test_environment()
+        # The benchmark database is built straight from the models 🧪
+        no_migrations = {config.label: None for config in apps.get_app_configs()}
+        try:
+            with override_settings(MIGRATION_MODULES=no_migrations):
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                # Keep the profiling middleware's own overhead out of the timings
+                # and read the test database only, never a configured replica
+                with override_settings(REQUEST_PROFILING={'SAMPLE_RATE': 0},
+                                       ANALYTICS_VIEW_TRACKING={'ENABLED': False},
+                                       LIBRARY_READ_REPLICAS={'ALIASES': []}):
+                    results = self.run_benchmarks(scales, options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            teardown_test_environment()
+
+        results['failures'] = self.evaluate(results, scales, options)
+        self.report(results, scales)
+        payload = json.dumps(results, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(payload + '\n')
+        else:
+            self.stdout.write(payload)
+        if results['failures']:
+            raise CommandError(f"{len(results['failures'])} benchmark check(s) failed")
+
+    def url_for(self, name):
+        if name in URL_KWARGS:
+            url = reverse(name, kwargs=URL_KWARGS[name]())
+        else:
+            url = reverse(name)
+        if name in URL_QUERIES:
+            url += '?' + URL_QUERIES[name]()
+        return url
+
+    def run_benchmarks(self, scales, options):
+        names = [pattern.name for pattern in [*library_urls.urlpatterns, *api_urls.urlpatterns]]
+        missing = [name for name in names if name not in QUERY_BUDGETS]
+        if missing:
+            raise CommandError(f"No query budget for: {', '.join(missing)}")
+        results = {'scales': scales, 'views': {name: {'budget': QUERY_BUDGETS[name], 'runs': {}} for name in names}}
+        client = Client()
+        for scale in scales:
+            self.stderr.write(f'Seeding a catalog of {scale} books...')
+            call_command('populate_db', scale=scale, seed=options['seed'], stdout=StringIO())
+            for cache in caches.all():
+                cache.clear()
+            for name in names:
+                url = self.url_for(name)
+                results['views'][name]['url'] = url
+                results['views'][name]['runs'][str(scale)] = self.measure(client, url, options['repeat'])
+        return results
+
+    def measure(self, client, url, repeat):
+        """Request url once cold, then `repeat` times warm, then once under tracemalloc"""
+        # The query log is a bounded deque; empty it so captures are not truncated
+        reset_queries()
+        with CaptureQueriesContext(connection) as cold:
+            _consume(client.get(url))
+        timings = []
+        for _ in range(repeat):
+            reset_queries()
+            with CaptureQueriesContext(connection) as warm:
+                started = time.perf_counter()
+                response = client.get(url)
+                body = _consume(response)
+                timings.append((time.perf_counter() - started) * 1000)
+        tracemalloc.start()
+        try:
+            _consume(client.get(url))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        sql = Counter(query['sql'] for query in warm.captured_queries)
+        return {
+            'status': response.status_code,
+            'bytes': len(body),
+            'cold_queries': len(cold.captured_queries),
+            'queries': len(warm.captured_queries),
+            'duplicate_queries': sum(count - 1 for count in sql.values()),
+            'queries_by_table': _tables(warm.captured_queries),
+            'median_ms': round(statistics.median(timings), 3),
+            'max_ms': round(max(timings), 3),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    def evaluate(self, results, scales, options):
+        """Return a list of human readable failures"""
+        failures = []
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)['views']
+        for name, view in results['views'].items():
+            runs = view['runs']
+            smallest, largest = runs[str(scales[0])], runs[str(scales[-1])]
+            for scale, run in runs.items():
+                if run['status'] != 200:
+                    failures.append(f'{name}: status {run["status"]} at scale {scale}')
+                if run['queries'] > view['budget']:
+                    failures.append(f'{name}: {run["queries"]} queries over budget of {view["budget"]} at scale {scale}')
+            if largest['queries'] > smallest['queries']:
+                # Query count must not depend on the amount of data: an N+1 pattern 🐌
+                failures.append(
+                    f'{name}: queries grow with catalog size '
+                    f'({smallest["queries"]} at {scales[0]} -> {largest["queries"]} at {scales[-1]})'
+                )
+            if baseline is None or name not in baseline:
+                continue
+            for scale, run in runs.items():
+                before = baseline[name]['runs'].get(scale)
+                if before is None:
+                    continue
+                if run['queries'] > before['queries'] + options['query_tolerance']:
+                    failures.append(f'{name}: {before["queries"]} -> {run["queries"]} queries at scale {scale}')
+                slowdown = options['max_slowdown']
+                if slowdown and run['median_ms'] > before['median_ms'] * slowdown:
+                    failures.append(
+                        f'{name}: {before["median_ms"]}ms -> {run["median_ms"]}ms median at scale {scale}'
+                    )
+        return failures
+
+    def report(self, results, scales):
+        """Print a summary table to stderr so stdout stays valid JSON"""
+        self.stderr.write(f'{"view":<18}{"scale":>8}{"queries":>9}{"cold":>6}{"dup":>5}{"median ms":>11}{"peak KB":>10}')
+        for name, view in results['views'].items():
+            for scale in scales:
+                run = view['runs'][str(scale)]
+                self.stderr.write(
+                    f'{name:<18}{scale:>8}{run["queries"]:>9}{run["cold_queries"]:>6}{run["duplicate_queries"]:>5}'
+                    f'{run["median_ms"]:>11.2f}{run["peak_memory_kb"]:>10.1f}'
+                )
+        for failure in results['failures']:
+            self.stderr.write(self.style.ERROR(f'FAIL {failure}'))
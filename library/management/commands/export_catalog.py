@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library import catalog
+
+
+class Command(BaseCommand):
+    help = 'Exports every book with its author, categories and publications to a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Output file (.csv, .jsonl or .ndjson, optionally .gz)')
+        parser.add_argument('--format', choices=catalog.FORMATS,
+                            help='File format (guessed from the file name by default)')
+        parser.add_argument('--chunk-size', type=int, default=catalog.EXPORT_CHUNK_SIZE,
+                            help='Books read per query')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or catalog.detect_format(path)
+        started = time.perf_counter()
+        try:
+            stream = catalog.open_text(path, 'w')
+        except OSError as error:
+            raise CommandError(f'Cannot open {path}: {error}')
+
+        self.stdout.write(f'Exporting the catalog to {path} as {fmt}...')
+        written = 0
+        with stream:
+            writer = catalog.RecordWriter(stream, fmt)
+            for record in catalog.export_rows(chunk_size=options['chunk_size']):
+                writer.write(record)
+                written += 1
+                if written % (options['chunk_size'] * 10) == 0:
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(f'  books: {written:,} ({written / elapsed:,.0f} rows/s)')
+        elapsed = time.perf_counter() - started
+        rate = written / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {written:,} books in {elapsed:.2f}s ({rate:,.0f} rows/s) 📦'
+        ))
@@ -0,0 +1,52 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from library import thumbnails
+from library.models import AuthorProfile
+
+
+class Command(BaseCommand):
+    help = 'Renders the missing thumbnails of every author photo and profile image'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Render in this many worker processes (default: LIBRARY_THUMBNAILS['WORKERS'])")
+
+    def handle(self, *args, **options):
+        config = thumbnails.thumbnail_settings()
+        workers = config['WORKERS'] if options['workers'] is None else options['workers']
+        names = set(AuthorProfile.objects.exclude(photo='').values_list('photo', flat=True))
+        names.update(get_user_model().objects.exclude(profile_image='').values_list('profile_image', flat=True))
+        self.stdout.write(f'Checking the thumbnails of {len(names)} images...')
+
+        work, missing = [], 0
+        for name in sorted(names):
+            try:
+                source_path, jobs = thumbnails.file_jobs(name, config)
+            except NotImplementedError:
+                self.stderr.write('The storage has no local paths: thumbnails render on first request')
+                return
+            except OSError as error:
+                missing += 1
+                self.stderr.write(f'Skipping {name}: {error}')
+                continue
+            work.append((name, source_path, jobs))
+
+        rendered = 0
+        if workers:
+            # spawn, like thumbnails.schedule(): no forked copy of this process's threads and connections
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = [(name, pool.submit(thumbnails.render_files, path, jobs)) for name, path, jobs in work if jobs]
+                for name, future in futures:
+                    rendered += future.result()
+        else:
+            for name, path, jobs in work:
+                rendered += thumbnails.render_files(path, jobs)
+        for name, _, _ in work:
+            thumbnails.mark_ready(name, config)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {rendered} thumbnails, {missing} images missing 🖼️'
+        ))
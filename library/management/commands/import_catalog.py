@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library import catalog
+from library.derived import rebuild_derived_data
+from library.streaming import chunked
+
+
+class Command(BaseCommand):
+    help = 'Imports books from a CSV or JSONL feed, updating the books whose ISBN already exists'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Catalog file (.csv, .jsonl or .ndjson, optionally .gz)')
+        parser.add_argument('--format', choices=catalog.FORMATS,
+                            help='File format (guessed from the file name by default)')
+        parser.add_argument('--batch-size', type=int, default=catalog.IMPORT_BATCH_SIZE,
+                            help='Books written per transaction')
+        parser.add_argument('--skip-derived', action='store_true',
+                            help='Do not rebuild the search index, counters and statistics afterwards')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or catalog.detect_format(path)
+        importer = catalog.CatalogImporter()
+        skipped = 0
+        started = time.perf_counter()
+        try:
+            stream = catalog.open_text(path, 'r')
+        except OSError as error:
+            raise CommandError(f'Cannot open {path}: {error}')
+
+        def records():
+            nonlocal skipped
+            for line, record in catalog.read_records(stream, fmt):
+                try:
+                    yield catalog.clean_record(record)
+                except catalog.CatalogError as error:
+                    skipped += 1
+                    self.stderr.write(f'  line {line}: {error}')
+
+        # Import books 📚
+        self.stdout.write(f'Importing {path} as {fmt}...')
+        with stream:
+            for batch in chunked(records(), options['batch_size']):
+                importer.import_batch(batch)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'  books: {importer.books:,} ({importer.books / elapsed:,.0f} rows/s)')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Imported {importer.books:,} books in {elapsed:.2f}s, skipped {skipped:,} invalid rows; created '
+            f'{importer.authors.created:,} authors, {importer.publishers.created:,} publishers '
+            f'and {importer.categories.created:,} categories'
+        )
+
+        # Bulk writes skip the model signals, so rebuild what they maintain 🔁
+        if not options['skip_derived']:
+            self.stdout.write('Rebuilding search index and statistics...')
+            rebuild_derived_data()
+        self.stdout.write(self.style.SUCCESS('Catalog imported! 📦'))
@@ -1,113 +1,214 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from functools import partial
+
 from django.core.management.base import BaseCommand
-from django.utils import timezone
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from library import synthetic
+from library.derived import rebuild_derived_data
 from library.models import Author, AuthorProfile, Category, Publisher, Book, Publication
-from datetime import date, timedelta
+
+CATALOG_MODELS = [Publication, Book.categories.through, Book, Category, AuthorProfile, Author, Publisher]
+
+
+def _generate(func, ranges, workers):
+    """Yield func(start, stop) for each range in order, optionally from worker processes"""
+    if not workers:
+        for start, stop in ranges:
+            yield func(start, stop)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for start, stop in ranges:
+            pending.append(pool.submit(func, start, stop))
+            # Keep a bounded number of batches in flight so memory stays flat
+            if len(pending) >= workers * 2:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
 
 class Command(BaseCommand):
     help = 'Populates the database with sample data'
-    
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=0,
+                            help='Generate a synthetic catalog with this many books instead of the sample data')
+        parser.add_argument('--seed', type=int, default=42, help='Seed for the synthetic generator')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows written per bulk insert')
+        parser.add_argument('--workers', type=int, default=0,
+                            help='Generate synthetic batches in this many worker processes')
+
     def handle(self, *args, **options):
         # Clear existing data 🧹
         self.stdout.write('Clearing existing data...')
-        Publication.objects.all().delete()
-        Book.objects.all().delete()
-        Category.objects.all().delete()
-        AuthorProfile.objects.all().delete()
-        Author.objects.all().delete()
-        Publisher.objects.all().delete()
-        
+        self.clear_catalog()
+
+        if options['scale']:
+            self.create_synthetic(options['scale'], options['seed'], options['batch_size'], options['workers'])
+        else:
+            self.create_sample()
+
+        # Bulk writes skip the model signals, so rebuild what they maintain 🔁
+        self.stdout.write('Rebuilding search index and statistics...')
+        rebuild_derived_data()
+
+        self.stdout.write(self.style.SUCCESS('Successfully populated the database! 🎉'))
+
+    def clear_catalog(self):
+        """Empty the catalog tables (and rows referencing them) in a few statements"""
+        tables = [model._meta.db_table for model in CATALOG_MODELS]
+        sql_list = connection.ops.sql_flush(no_style(), tables, reset_sequences=True, allow_cascade=True)
+        connection.ops.execute_sql_flush(sql_list)
+
+    def reset_sequences(self):
+        """Move id sequences past explicitly assigned ids (a no-op on SQLite)"""
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), CATALOG_MODELS):
+                cursor.execute(sql)
+
+    def progress(self, label, done, total, started):
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(f'  {label}: {done}/{total} ({rate:,.0f} rows/s)')
+
+    def create_synthetic(self, scale, seed, batch_size, workers):
+        """Bulk load a deterministic synthetic catalog of `scale` books"""
+        counts = synthetic.plan(scale)
+        self.stdout.write(
+            f"Generating {counts['books']} books, {counts['authors']} authors, "
+            f"{counts['categories']} categories and {counts['publishers']} publishers..."
+        )
+        with transaction.atomic():
+            Category.objects.bulk_create(
+                Category(id=pk, name=name, slug=slug, description=description)
+                for pk, name, slug, description in synthetic.category_rows(counts['categories'])
+            )
+            Publisher.objects.bulk_create(
+                Publisher(id=pk, name=name, website=website, email=email)
+                for pk, name, website, email in synthetic.publisher_rows(counts['publishers'])
+            )
+
+        # Create authors 👨‍🎨
+        self.stdout.write('Creating authors...')
+        started = time.perf_counter()
+        ranges = [(start, min(start + batch_size, counts['authors'] + 1))
+                  for start in range(1, counts['authors'] + 1, batch_size)]
+        for rows in _generate(partial(synthetic.author_rows, seed), ranges, workers):
+            with transaction.atomic():
+                Author.objects.bulk_create(
+                    Author(id=pk, name=name, birth_date=born, biography=biography)
+                    for pk, name, born, biography in rows
+                )
+                AuthorProfile.objects.bulk_create(AuthorProfile(author_id=row[0]) for row in rows)
+            self.progress('authors', rows[-1][0], counts['authors'], started)
+
+        # Create books with their categories and publications 📚
+        self.stdout.write('Creating books...')
+        started = time.perf_counter()
+        ranges = [(start, min(start + batch_size, counts['books'] + 1))
+                  for start in range(1, counts['books'] + 1, batch_size)]
+        BookCategory = Book.categories.through
+        for rows in _generate(partial(synthetic.book_rows, seed, counts=counts), ranges, workers):
+            with transaction.atomic():
+                Book.objects.bulk_create(
+                    Book(id=pk, title=title, author_id=author_id, isbn=isbn,
+                         publication_date=published, summary=summary)
+                    for pk, title, author_id, isbn, published, summary, _, _ in rows
+                )
+                BookCategory.objects.bulk_create(
+                    BookCategory(book_id=row[0], category_id=category_id)
+                    for row in rows for category_id in row[6]
+                )
+                Publication.objects.bulk_create(
+                    Publication(book_id=row[0], publisher_id=publisher_id,
+                                country=country, date_published=date_published)
+                    for row in rows for publisher_id, country, date_published in row[7]
+                )
+            self.progress('books', rows[-1][0], counts['books'], started)
+
+        self.reset_sequences()
+
+    @transaction.atomic
+    def create_sample(self):
+        """Create the small hand-written sample catalog"""
         # Create categories 🏷️
         self.stdout.write('Creating categories...')
-        categories = [
-            Category(name="Science Fiction", description="Imaginative fiction that explores advanced science and technology"),
-            Category(name="Fantasy", description="Fiction with magical or supernatural elements"),
-            Category(name="Mystery", description="Fiction dealing with the solution of a crime or puzzle"),
-            Category(name="Romance", description="Fiction that focuses on romantic relationships"),
-            Category(name="Non-fiction", description="Information based on facts and reality"),
-            Category(name="Biography", description="An account of someone's life written by someone else"),
-        ]
-        
-        for category in categories:
-            category.save()
-        
+        categories = Category.objects.bulk_create([
+            Category(name="Science Fiction", slug="science-fiction", description="Imaginative fiction that explores advanced science and technology"),
+            Category(name="Fantasy", slug="fantasy", description="Fiction with magical or supernatural elements"),
+            Category(name="Mystery", slug="mystery", description="Fiction dealing with the solution of a crime or puzzle"),
+            Category(name="Romance", slug="romance", description="Fiction that focuses on romantic relationships"),
+            Category(name="Non-fiction", slug="non-fiction", description="Information based on facts and reality"),
+            Category(name="Biography", slug="biography", description="An account of someone's life written by someone else"),
+        ])
+
         # Create authors 👨‍🎨
         self.stdout.write('Creating authors...')
-        authors = [
-            Author(name="J.K. Rowling", birth_date=date(1965, 7, 31), 
+        authors = Author.objects.bulk_create([
+            Author(name="J.K. Rowling", birth_date=date(1965, 7, 31),
                   biography="British author best known for the Harry Potter series."),
-            Author(name="George Orwell", birth_date=date(1903, 6, 25), 
+            Author(name="George Orwell", birth_date=date(1903, 6, 25),
                   biography="English novelist, essayist, and critic known for works like '1984' and 'Animal Farm'."),
-            Author(name="Jane Austen", birth_date=date(1775, 12, 16), 
+            Author(name="Jane Austen", birth_date=date(1775, 12, 16),
                   biography="English novelist known for works such as 'Pride and Prejudice' and 'Sense and Sensibility'."),
-        ]
-        
-        for author in authors:
-            author.save()
-        
+        ])
+
         # Create author profiles 👤
         self.stdout.write('Creating author profiles...')
-        profiles = [
+        AuthorProfile.objects.bulk_create([
             AuthorProfile(author=authors[0], website="https://www.jkrowling.com", twitter_handle="@jk_rowling"),
             AuthorProfile(author=authors[1], website="", twitter_handle=""),
             AuthorProfile(author=authors[2], website="", twitter_handle=""),
-        ]
-        
-        for profile in profiles:
-            profile.save()
-        
+        ])
+
         # Create publishers 🏢
         self.stdout.write('Creating publishers...')
-        publishers = [
+        publishers = Publisher.objects.bulk_create([
             Publisher(name="Penguin Books", website="https://www.penguin.com", email="info@penguin.com"),
             Publisher(name="HarperCollins", website="https://www.harpercollins.com", email="info@harpercollins.com"),
             Publisher(name="Bloomsbury", website="https://www.bloomsbury.com", email="info@bloomsbury.com"),
-        ]
-        
-        for publisher in publishers:
-            publisher.save()
-        
+        ])
+
         # Create books 📚
         self.stdout.write('Creating books...')
-        books = [
+        books = Book.objects.bulk_create([
             Book(title="Harry Potter and the Philosopher's Stone", author=authors[0],
                  isbn="9780747532743", publication_date=date(1997, 6, 26),
                  summary="The first book in the Harry Potter series."),
-                 
+
             Book(title="1984", author=authors[1],
                  isbn="9780451524935", publication_date=date(1949, 6, 8),
                  summary="A dystopian novel set in a totalitarian society."),
-                 
+
             Book(title="Pride and Prejudice", author=authors[2],
                  isbn="9780141439518", publication_date=date(1813, 1, 28),
                  summary="A romantic novel that follows the character development of Elizabeth Bennet."),
-                 
+
             Book(title="Harry Potter and the Chamber of Secrets", author=authors[0],
                  isbn="9780747538486", publication_date=date(1998, 7, 2),
                  summary="The second book in the Harry Potter series."),
-        ]
-        
-        for book in books:
-            book.save()
-        
+        ])
+
         # Add categories to books 🔗
         self.stdout.write('Adding categories to books...')
-        books[0].categories.add(categories[1])  # Harry Potter - Fantasy
-        books[1].categories.add(categories[0])  # 1984 - Science Fiction
-        books[1].categories.add(categories[4])  # 1984 - Non-fiction
-        books[2].categories.add(categories[3])  # Pride and Prejudice - Romance
-        books[3].categories.add(categories[1])  # Harry Potter 2 - Fantasy
-        
+        BookCategory = Book.categories.through
+        BookCategory.objects.bulk_create([
+            BookCategory(book=books[0], category=categories[1]),  # Harry Potter - Fantasy
+            BookCategory(book=books[1], category=categories[0]),  # 1984 - Science Fiction
+            BookCategory(book=books[1], category=categories[4]),  # 1984 - Non-fiction
+            BookCategory(book=books[2], category=categories[3]),  # Pride and Prejudice - Romance
+            BookCategory(book=books[3], category=categories[1]),  # Harry Potter 2 - Fantasy
+        ])
+
         # Create publications 📰
         self.stdout.write('Creating publications...')
-        publications = [
+        Publication.objects.bulk_create([
             Publication(book=books[0], publisher=publishers[2], date_published=date(1997, 6, 26), country="United Kingdom"),
             Publication(book=books[0], publisher=publishers[0], date_published=date(1998, 9, 1), country="United States"),
             Publication(book=books[1], publisher=publishers[0], date_published=date(1949, 6, 8), country="United Kingdom"),
             Publication(book=books[2], publisher=publishers[1], date_published=date(1813, 1, 28), country="United Kingdom"),
             Publication(book=books[3], publisher=publishers[2], date_published=date(1998, 7, 2), country="United Kingdom"),
-        ]
-        
-        for publication in publications:
-            publication.save()
-        
-        self.stdout.write(self.style.SUCCESS('Successfully populated the database! 🎉'))
\ No newline at end of file
+        ])
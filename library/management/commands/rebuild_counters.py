@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from library import counters
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the denormalized category and author book counts'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding book counters...')
+        counters.rebuild()
+        self.stdout.write(self.style.SUCCESS('Book counters rebuilt! 🔢'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from library import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text catalog search index'
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        self.stdout.write(f'Rebuilding search index with {type(backend).__name__}...')
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt! 🔍'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from library import stats
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the cached home page statistics from the database'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Reconciling home page statistics...')
+        stats.reconcile()
+        self.stdout.write(self.style.SUCCESS('Statistics reconciled! 📊'))
@@ -0,0 +1,52 @@
+import os
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from library import routers
+
+
+def sqlite_path(name):
+    """File path of an SQLite database NAME, which may be a file: URI"""
+    name = str(name)
+    if name.startswith('file:'):
+        name = name[len('file:'):].split('?', 1)[0]
+    return name
+
+
+class Command(BaseCommand):
+    help = 'Copies the SQLite primary database over the local SQLite read replicas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('aliases', nargs='*', help='Replicas to refresh (all configured ones by default)')
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or routers.replica_settings()['ALIASES']
+        if not aliases:
+            raise CommandError('No read replicas configured in LIBRARY_READ_REPLICAS')
+        primary = connections[routers.PRIMARY]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Only SQLite replicas can be copied; use the database\'s own replication')
+        primary.ensure_connection()
+        for alias in aliases:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f'{alias} is not an SQLite database')
+            path = sqlite_path(connections[alias].settings_dict['NAME'])
+            started = time.perf_counter()
+            # Copy next to the replica and swap it in: readers never see a half-written file
+            partial = f'{path}.partial'
+            target = sqlite3.connect(partial)
+            try:
+                primary.connection.backup(target)
+                # Read-only copies need no WAL, and a rollback journal leaves
+                # no -wal file behind to be paired with the next copy
+                target.execute('PRAGMA journal_mode = DELETE')
+            finally:
+                target.close()
+            os.replace(partial, path)
+            connections[alias].close()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'  {alias}: {path} ({elapsed:.2f}s)')
+        self.stdout.write(self.style.SUCCESS('Read replicas refreshed! 🪞'))
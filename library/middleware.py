@@ -0,0 +1,184 @@
+import json
+import logging
+import random
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from . import routers
+from .profiling import RequestProfile
+
+logger = logging.getLogger('library.profiling')
+
+
+class RequestProfilingMiddleware:
+    """Measure query count, DB, template and total time of sampled requests.
+
+    Sampled responses get a Server-Timing header and one JSON log line on the
+    'library.profiling' logger; requests repeating the same statement at least
+    N_PLUS_ONE_THRESHOLD times are logged as warnings. Unsampled requests only
+    pay for one random() call. A streaming response is measured while its body
+    is iterated and logged once the stream ends; its headers are sent before
+    that, so it gets no Server-Timing.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        config = getattr(settings, 'REQUEST_PROFILING', {})
+        self.sample_rate = config.get('SAMPLE_RATE', 0.01)
+        self.n_plus_one_threshold = config.get('N_PLUS_ONE_THRESHOLD', 5)
+        self.server_timing = config.get('SERVER_TIMING', True)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        return self.profile(request, self.get_response)
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+        # The execute wrappers belong to the connections of one thread: run
+        # sampled requests there, the view's ORM calls are routed to it too
+        return await sync_to_async(self.profile)(request, async_to_sync(self.get_response))
+
+    def profile(self, request, get_response):
+        profile = RequestProfile()
+        with measuring(profile):
+            response = get_response(request)
+        if response.streaming:
+            # The body runs its queries after this returns: measure it as it is sent
+            stream = self.profile_async_stream if response.is_async else self.profile_stream
+            response.streaming_content = stream(request, response, profile, response.streaming_content)
+            return response
+        self.report(request, response, profile)
+        return response
+
+    def profile_stream(self, request, response, profile, content):
+        chunks = iter(content)
+        try:
+            while True:
+                with measuring(profile):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            self.report(request, response, profile)
+
+    async def profile_async_stream(self, request, response, profile, content):
+        chunks = aiter(content)
+        try:
+            while True:
+                # The ORM calls of the body run in the thread-sensitive thread: wrap its connections
+                wrappers = await sync_to_async(wrap_connections)(profile)
+                token = profile.activate()
+                try:
+                    chunk = await anext(chunks, None)
+                finally:
+                    RequestProfile.deactivate(token)
+                    await sync_to_async(wrappers.close)()
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            self.report(request, response, profile)
+
+    def report(self, request, response, profile):
+        total_ms = profile.total_time * 1000
+        db_ms = profile.db_time * 1000
+        template_ms = profile.template_time * 1000
+        if self.server_timing and not response.streaming:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={db_ms:.1f};desc="{profile.query_count} queries"',
+                f'tpl;dur={template_ms:.1f}',
+                f'total;dur={total_ms:.1f}',
+            ])
+        repeated = profile.repeated_statements(self.n_plus_one_threshold)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': profile.query_count,
+            'duplicate_queries': profile.duplicate_queries(),
+            'db_ms': round(db_ms, 2),
+            'template_ms': round(template_ms, 2),
+            'total_ms': round(total_ms, 2),
+        }
+        if repeated:
+            # The same statement in a loop: most likely an N+1 query 🐌
+            record['n_plus_one'] = [{'sql': sql, 'count': count} for sql, count in repeated.items()]
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
+
+
+def wrap_connections(profile):
+    """Time the queries of this thread's connections in `profile` until the returned stack closes"""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(profile))
+    return stack
+
+
+@contextmanager
+def measuring(profile):
+    """Record the queries and templates of this thread in `profile`"""
+    token = profile.activate()
+    try:
+        with wrap_connections(profile):
+            yield
+    finally:
+        RequestProfile.deactivate(token)
+
+
+class ReplicaPinningMiddleware:
+    """Give each request its own routing state for library.routers.ReplicaRouter.
+
+    Requests that may write (anything but GET/HEAD/OPTIONS) and browsers that
+    wrote in the last STICKY_SECONDS read from the primary; a request that
+    wrote sets the cookie that keeps its browser there.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = routers.begin(self.must_pin(request))
+        try:
+            response = self.get_response(request)
+            return self.stick(response)
+        finally:
+            routers.end(token)
+
+    async def __acall__(self, request):
+        token = routers.begin(self.must_pin(request))
+        try:
+            response = await self.get_response(request)
+            return self.stick(response)
+        finally:
+            routers.end(token)
+
+    def must_pin(self, request):
+        return request.method not in ('GET', 'HEAD', 'OPTIONS') or routers.STICKY_COOKIE in request.COOKIES
+
+    def stick(self, response):
+        if routers.current_state().wrote:
+            response.set_cookie(
+                routers.STICKY_COOKIE, '1', max_age=routers.replica_settings()['STICKY_SECONDS'],
+                httponly=True, samesite='Lax',
+            )
+        return response
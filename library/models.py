@@ -1,11 +1,77 @@
 from django.db import models
+from django.db.models import F, Prefetch
+from django.db.models.functions import Substr
 from django.utils.text import slugify
 
+# Characters of summary/biography a card shows (truncatechars:100 in the card templates)
+CARD_EXCERPT_LENGTH = 100
+
+
+def _excerpt(field):
+    # One extra character so truncatechars still knows to add the ellipsis
+    return Substr(field, 1, CARD_EXCERPT_LENGTH + 1)
+
+
+class AuthorQuerySet(models.QuerySet):
+    """Querysets shaped for the pages that show authors"""
+
+    def for_card(self):
+        """Columns of the author card, with an excerpt instead of the whole biography"""
+        return self.only('id', 'name', 'birth_date', 'book_count', 'card_version').annotate(
+            biography_excerpt=_excerpt('biography')
+        )
+
+    def for_detail(self):
+        """The author with its profile and book cards, in two queries"""
+        return self.select_related('profile').prefetch_related(
+            Prefetch('books', queryset=Book.objects.for_card())
+        )
+
+
+class BookQuerySet(models.QuerySet):
+    """Querysets shaped for the pages that show books"""
+
+    def for_card(self):
+        """Columns of the book card, with an excerpt instead of the whole summary"""
+        return self.select_related('author').only(
+            'id', 'title', 'isbn', 'publication_date', 'card_version', 'author__id', 'author__name'
+        ).annotate(summary_excerpt=_excerpt('summary'))
+
+    def for_detail(self):
+        """The book with its author, categories and publications, in three queries"""
+        return self.select_related('author').defer('author__biography').prefetch_related(
+            Prefetch('categories', queryset=Category.objects.only('id', 'name', 'slug')),
+            Prefetch('publication_set', queryset=Publication.objects.select_related('publisher').only(
+                'id', 'book_id', 'date_published', 'country', 'publisher__id', 'publisher__name'
+            )),
+        )
+
+    def top_rated(self):
+        """Rated books with their Bayesian average as `rating`, from the indexed rating summaries ⭐"""
+        return self.filter(rating_summary__count__gt=0).annotate(rating=F('rating_summary__bayesian_average'))
+
+
 class Author(models.Model):
     """Model representing an author of books"""
     name = models.CharField(max_length=100)
     birth_date = models.DateField(null=True, blank=True)
     biography = models.TextField(blank=True)
+    # Bumped on every change; keys the cached author card 🃏
+    card_version = models.PositiveIntegerField(default=0, editable=False)
+    # Denormalized number of books, kept exact by library.signals 🔢
+    book_count = models.PositiveIntegerField(default=0, editable=False)
+    # Last-Modified/ETag of the author page 🏷️
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = AuthorQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Backs keyset pagination of the author list 📄
+            models.Index(fields=['name', 'id'], name='author_name_id_idx'),
+            # Backs the "most books first" ordering 🔝
+            models.Index(fields=['-book_count', 'name', 'id'], name='author_popularity_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -30,9 +96,17 @@ class Category(models.Model):
     name = models.CharField(max_length=50)
     description = models.TextField(blank=True)
     slug = models.SlugField(unique=True)
+    # Denormalized number of books, kept exact by library.signals 🔢
+    book_count = models.PositiveIntegerField(default=0, editable=False)
+    # Last-Modified/ETag of the category page 🏷️
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name_plural = "categories"
+        indexes = [
+            # Backs the "most books first" ordering 🔝
+            models.Index(fields=['-book_count', 'name'], name='category_popularity_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -74,6 +148,18 @@ class Book(models.Model):
         through_fields=('book', 'publisher'),
         related_name='books'
     )
+    # Bumped whenever the book or its author changes; keys the cached book card 🃏
+    card_version = models.PositiveIntegerField(default=0, editable=False)
+    # Last-Modified/ETag of the book page, also moved by author edits 🏷️
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BookQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Backs keyset pagination of the book list 📄
+            models.Index(fields=['title', 'id'], name='book_title_id_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -88,6 +174,10 @@ class Publication(models.Model):
     
     class Meta:
         unique_together = ('book', 'publisher', 'country')
+        indexes = [
+            # Backs the admin's country filter and its list of countries 📋
+            models.Index(fields=['country', 'id'], name='publication_country_idx'),
+        ]
     
     def __str__(self):
         return f"{self.book.title} published by {self.publisher.name} in {self.country}"
\ No newline at end of file
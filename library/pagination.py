@@ -0,0 +1,175 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(values):
+    """Encode the ordering values of a row into an opaque URL-safe cursor"""
+    raw = json.dumps(list(values), separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Decode a cursor produced by encode_cursor back into its values"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor(cursor) from exc
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(cursor)
+    return values
+
+
+class KeysetPage:
+    """A single page of results with cursors to its neighbours"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        # Other query parameters (filters, sorting) the page links must keep
+        self.base_query = ''
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Cursor (keyset) paginator over a unique ordering such as ('title', 'id').
+
+    Instead of OFFSET, each page is fetched with a WHERE clause that seeks past
+    the last row of the previous page, so every page costs the same no matter
+    how deep into the table it is. The ordering must end with a unique column
+    and should be backed by a composite index.
+    """
+
+    def __init__(self, queryset, ordering, per_page=30):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.fields = tuple(field.lstrip('-') for field in self.ordering)
+        self.per_page = per_page
+
+    def _seek(self, values, forward):
+        """Build the row-comparison filter for rows after (or before) values"""
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            descending = field.startswith('-')
+            name = self.fields[i]
+            lookup = 'lt' if descending == forward else 'gt'
+            clause = Q(**{f'{name}__{lookup}': values[i]})
+            for prev_name, prev_value in zip(self.fields[:i], values[:i]):
+                clause &= Q(**{prev_name: prev_value})
+            condition |= clause
+        return condition
+
+    def _reverse_ordering(self):
+        return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering)
+
+    def _cursor_for(self, obj):
+        return encode_cursor(getattr(obj, name) for name in self.fields)
+
+    def _fetch(self, queryset):
+        """Fetch one page plus one sentinel row to learn if more rows exist"""
+        rows = list(queryset[:self.per_page + 1])
+        return rows[:self.per_page], len(rows) > self.per_page
+
+    def _build_page(self, rows, more, after, before):
+        if before is not None:
+            rows.reverse()
+            next_cursor = self._cursor_for(rows[-1]) if rows else before
+            previous_cursor = self._cursor_for(rows[0]) if more and rows else None
+        else:
+            next_cursor = self._cursor_for(rows[-1]) if more else None
+            previous_cursor = self._cursor_for(rows[0]) if after is not None and rows else None
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def _model_field(self, name):
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        opts = self.queryset.model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    def _decode(self, cursor):
+        """Decode a cursor into values of the ordering fields' types; raises InvalidCursor"""
+        values = decode_cursor(cursor, len(self.fields))
+        # encode_cursor only writes scalars
+        if any(isinstance(value, (list, dict)) for value in values):
+            raise InvalidCursor(cursor)
+        try:
+            values = [self._model_field(name).to_python(value) for name, value in zip(self.fields, values)]
+        except (ValueError, TypeError, ValidationError) as exc:
+            raise InvalidCursor(cursor) from exc
+        if None in values:
+            raise InvalidCursor(cursor)
+        return values
+
+    def _page_queryset(self, after, before):
+        """Return the seek-filtered queryset for the requested page"""
+        queryset = self.queryset
+        if before is not None:
+            values = self._decode(before)
+            return queryset.filter(self._seek(values, forward=False)).order_by(*self._reverse_ordering())
+        if after is not None:
+            values = self._decode(after)
+            queryset = queryset.filter(self._seek(values, forward=True))
+        return queryset.order_by(*self.ordering)
+
+    def page(self, after=None, before=None):
+        """Return the page that follows the `after` cursor or precedes `before`"""
+        rows, more = self._fetch(self._page_queryset(after, before))
+        return self._build_page(rows, more, after, before)
+
+    async def apage(self, after=None, before=None):
+        """Async version of page()"""
+        queryset = self._page_queryset(after, before)
+        rows = [row async for row in queryset[:self.per_page + 1]]
+        return self._build_page(rows[:self.per_page], len(rows) > self.per_page, after, before)
+
+
+def _keep_query(page, request):
+    params = request.GET.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+    page.base_query = params.urlencode()
+    return page
+
+
+def paginate_keyset(request, queryset, ordering, per_page=30):
+    """Return the KeysetPage requested by the `after`/`before` query parameters"""
+    paginator = KeysetPaginator(queryset, ordering, per_page=per_page)
+    try:
+        page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        raise Http404('Invalid page cursor')
+    return _keep_query(page, request)
+
+
+async def apaginate_keyset(request, queryset, ordering, per_page=30):
+    """Async version of paginate_keyset()"""
+    paginator = KeysetPaginator(queryset, ordering, per_page=per_page)
+    try:
+        page = await paginator.apage(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        raise Http404('Invalid page cursor')
+    return _keep_query(page, request)
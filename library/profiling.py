@@ -0,0 +1,95 @@
+"""Per-request cost accounting shared by the profiling middleware 🩺
+
+A RequestProfile is installed in a context variable for each sampled request.
+Database time and query patterns are recorded through
+connection.execute_wrapper, and template rendering time through the
+ProfilingDjangoTemplates backend, which wraps every template it loads.
+"""
+import contextvars
+import time
+from collections import Counter
+
+from django.template.backends.django import DjangoTemplates
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+def current_profile():
+    """Return the profile of the request being handled, if it is sampled"""
+    return _current.get()
+
+
+class RequestProfile:
+    """Accumulates the database and template cost of one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.query_count = 0
+        self.statements = Counter()  # SQL text -> executions
+        self.executions = Counter()  # (SQL text, params) -> executions
+
+    def activate(self):
+        return _current.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _current.reset(token)
+
+    def __call__(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook timing and fingerprinting each query"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.query_count += 1
+            self.statements[sql] += 1
+            self.executions[(sql, repr(params))] += 1
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+    def duplicate_queries(self):
+        """Number of executions repeating an identical query and parameters"""
+        return sum(count - 1 for count in self.executions.values())
+
+    def repeated_statements(self, threshold):
+        """SQL statements run at least `threshold` times: likely N+1 loops"""
+        return {sql: count for sql, count in self.statements.items() if count >= threshold}
+
+
+class ProfiledTemplate:
+    """Wraps a backend template to add its render time to the active profile"""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return self.template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            profile.template_time += time.perf_counter() - started
+
+
+class ProfilingDjangoTemplates(DjangoTemplates):
+    """Django template backend that reports render time to the request profile.
+
+    The time includes any queries the template triggers lazily while
+    rendering, which are also counted in the database time.
+    """
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return ProfiledTemplate(super().get_template(template_name))
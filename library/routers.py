@@ -0,0 +1,132 @@
+"""Read-replica routing for the catalog 🪞
+
+ReplicaRouter sends reads of the LIBRARY_READ_REPLICAS['APPS'] models to one
+of the healthy replica aliases and every write to 'default'. Replicas lag
+behind the primary, so a context that has written reads from the primary
+for the rest of its life: ReplicaPinningMiddleware gives each request its
+own context, and a short-lived cookie keeps the browser that wrote on the
+primary for STICKY_SECONDS more, long enough to read its own writes. Reads
+inside a transaction stay on the primary too.
+
+A replica is checked with one cheap query at most every CHECK_SECONDS per
+process; a failing one is skipped until the next check, and with no healthy
+replica left reads fall back to the primary.
+"""
+import contextvars
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger('library.routers')
+
+PRIMARY = 'default'
+# Set on the responses of requests that wrote; its presence pins reads to the primary
+STICKY_COOKIE = 'library_primary'
+
+_state = contextvars.ContextVar('library_db_state', default=None)
+# alias -> (healthy, checked at); shared by the threads of a process
+_health = {}
+
+
+def replica_settings():
+    """LIBRARY_READ_REPLICAS with its defaults filled in"""
+    config = getattr(settings, 'LIBRARY_READ_REPLICAS', {})
+    return {
+        'ALIASES': config.get('ALIASES', []),
+        'APPS': config.get('APPS', ['library']),
+        'STICKY_SECONDS': config.get('STICKY_SECONDS', 5),
+        'CHECK_SECONDS': config.get('CHECK_SECONDS', 10),
+    }
+
+
+class DatabaseState:
+    """Routing state of one request (or command): whether it must use the primary"""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def begin(pinned=False):
+    """Give the current context fresh routing state; returns a token for end()"""
+    return _state.set(DatabaseState(pinned))
+
+
+def end(token):
+    _state.reset(token)
+
+
+def current_state():
+    state = _state.get()
+    if state is None:
+        state = DatabaseState()
+        _state.set(state)
+    return state
+
+
+def _check(alias):
+    from .models import Book
+
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        # Proves the copy holds the catalog, not just that the file opens
+        cursor.execute('SELECT 1 FROM %s LIMIT 1' % connection.ops.quote_name(Book._meta.db_table))
+        cursor.fetchall()
+
+
+def is_healthy(alias, check_seconds=None):
+    """Whether a replica answered its last check, re-checking it when that is too old"""
+    check_seconds = replica_settings()['CHECK_SECONDS'] if check_seconds is None else check_seconds
+    healthy, checked = _health.get(alias, (False, None))
+    now = time.monotonic()
+    if checked is not None and now - checked < check_seconds:
+        return healthy
+    try:
+        _check(alias)
+        healthy = True
+    except DatabaseError as error:
+        if _health.get(alias, (True, None))[0]:
+            logger.warning('Read replica %s is unavailable: %s', alias, error)
+        healthy = False
+        connections[alias].close()
+    _health[alias] = (healthy, now)
+    return healthy
+
+
+def healthy_replicas():
+    config = replica_settings()
+    return [alias for alias in config['ALIASES'] if is_healthy(alias, config['CHECK_SECONDS'])]
+
+
+class ReplicaRouter:
+    """Catalog reads on a healthy replica, everything else on the primary"""
+
+    def db_for_read(self, model, **hints):
+        config = replica_settings()
+        if not config['ALIASES'] or model._meta.app_label not in config['APPS']:
+            return PRIMARY
+        if current_state().pinned or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        replicas = healthy_replicas()
+        return random.choice(replicas) if replicas else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        state = current_state()
+        # Later reads of this context must see the write
+        state.pinned = state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *replica_settings()['ALIASES']}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas are copies of the primary and get its schema with the data
+        if db in replica_settings()['ALIASES']:
+            return False
+        return None
@@ -0,0 +1,331 @@
+"""Full-text catalog search over an inverted index 🔍
+
+Books are indexed on their title, summary, ISBN, author name and category
+names. On SQLite builds with FTS5 the index is a virtual table maintained in
+the same database (and transaction) as the catalog; elsewhere an in-process
+tokenized index is used. Both rank with BM25 and treat the last query term
+as a prefix so type-ahead queries match.
+"""
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.db.utils import DatabaseError
+
+from .models import Book
+
+# Indexed fields and their BM25 weights, in index column order 🏋️
+FIELD_WEIGHTS = {
+    'title': 10.0,
+    'author': 5.0,
+    'categories': 3.0,
+    'isbn': 3.0,
+    'summary': 1.0,
+}
+FIELDS = tuple(FIELD_WEIGHTS)
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Split text into lower-cased, accent-folded search terms"""
+    folded = unicodedata.normalize('NFKD', text.lower())
+    folded = ''.join(ch for ch in folded if not unicodedata.combining(ch))
+    return TOKEN_RE.findall(folded)
+
+
+def _documents(rows):
+    """Attach category names to a chunk of book rows"""
+    categories = defaultdict(list)
+    links = Book.categories.through.objects.filter(book_id__in=[row[0] for row in rows])
+    for book_id, name in links.values_list('book_id', 'category__name'):
+        categories[book_id].append(name)
+    for pk, title, author, isbn, summary in rows:
+        yield pk, {
+            'title': title,
+            'author': author,
+            'categories': ' '.join(categories[pk]),
+            'isbn': isbn,
+            'summary': summary,
+        }
+
+
+def iter_documents(book_ids=None, chunk_size=2000):
+    """Yield (book_id, {field: text}) for the given books, or for every book"""
+    books = Book.objects.order_by('pk').values_list('pk', 'title', 'author__name', 'isbn', 'summary')
+    if book_ids is not None:
+        book_ids = list(book_ids)
+        for start in range(0, len(book_ids), chunk_size):
+            yield from _documents(list(books.filter(pk__in=book_ids[start:start + chunk_size])))
+        return
+    last_pk = 0
+    while True:
+        rows = list(books.filter(pk__gt=last_pk)[:chunk_size])
+        if not rows:
+            return
+        yield from _documents(rows)
+        last_pk = rows[-1][0]
+
+
+class FTS5Backend:
+    """Search backend on an SQLite FTS5 virtual table keyed by book id"""
+    table = 'library_book_fts'
+
+    def __init__(self):
+        self._ready = set()
+
+    @staticmethod
+    def is_supported():
+        if connection.vendor != 'sqlite':
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('CREATE VIRTUAL TABLE IF NOT EXISTS temp.fts5_probe USING fts5(x)')
+                cursor.execute('DROP TABLE temp.fts5_probe')
+        except DatabaseError:
+            return False
+        return True
+
+    def _ensure_table(self):
+        """Create the virtual table on first use, filling it if it is new"""
+        name = connection.settings_dict['NAME']
+        if name in self._ready:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [self.table])
+            exists = cursor.fetchone() is not None
+        if exists:
+            self._ready.add(name)
+        else:
+            self.rebuild()
+
+    def _create_table(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {self.table} USING fts5("
+            f"{', '.join(FIELDS)}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+
+    def _insert(self, cursor, documents):
+        placeholders = ', '.join(['%s'] * (len(FIELDS) + 1))
+        cursor.executemany(
+            f"INSERT INTO {self.table} (rowid, {', '.join(FIELDS)}) VALUES ({placeholders})",
+            [[pk] + [doc[field] for field in FIELDS] for pk, doc in documents],
+        )
+
+    def index_books(self, book_ids):
+        """(Re)index the given books"""
+        book_ids = list(book_ids)
+        if not book_ids:
+            return
+        self._ensure_table()
+        with transaction.atomic(), connection.cursor() as cursor:
+            self._delete(cursor, book_ids)
+            self._insert(cursor, iter_documents(book_ids))
+
+    def _delete(self, cursor, book_ids):
+        for start in range(0, len(book_ids), 500):
+            chunk = book_ids[start:start + 500]
+            cursor.execute(
+                f"DELETE FROM {self.table} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk
+            )
+
+    def remove_books(self, book_ids):
+        """Drop the given books from the index"""
+        book_ids = list(book_ids)
+        if not book_ids:
+            return
+        self._ensure_table()
+        with connection.cursor() as cursor:
+            self._delete(cursor, book_ids)
+
+    def rebuild(self):
+        """Recreate the whole index from the catalog tables"""
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+            self._create_table(cursor)
+            self._insert(cursor, iter_documents())
+        # A rolled back transaction takes the new table with it
+        transaction.on_commit(partial(self._ready.add, connection.settings_dict['NAME']))
+
+    @staticmethod
+    def _match_expression(terms):
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def search(self, query, limit=50):
+        """Return the ids of the best matching books, best first"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        self._ensure_table()
+        weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in FIELDS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s '
+                f'ORDER BY bm25({self.table}, {weights}) LIMIT %s',
+                [self._match_expression(terms), limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class MemoryBackend:
+    """In-process inverted index with BM25 ranking, for databases without FTS5.
+
+    The index is built from the database on first use and then kept current
+    by the model signals of this process, applied once the writing
+    transaction commits.
+    """
+    k1 = 1.2
+    b = 0.75
+    max_prefix_expansions = 50
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._postings = defaultdict(dict)  # term -> {book_id: weighted term frequency}
+        self._doc_terms = {}                # book_id -> {term: weighted term frequency}
+        self._doc_lengths = {}
+        self._total_length = 0.0
+        self._sorted_terms = None
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.rebuild()
+
+    def _add(self, pk, document):
+        frequencies = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(document[field]):
+                frequencies[term] += weight
+        self._remove(pk)
+        self._doc_terms[pk] = frequencies
+        length = sum(frequencies.values())
+        self._doc_lengths[pk] = length
+        self._total_length += length
+        for term, frequency in frequencies.items():
+            if term not in self._postings:
+                self._sorted_terms = None
+            self._postings[term][pk] = frequency
+
+    def _remove(self, pk):
+        frequencies = self._doc_terms.pop(pk, None)
+        if frequencies is None:
+            return
+        self._total_length -= self._doc_lengths.pop(pk)
+        for term in frequencies:
+            postings = self._postings[term]
+            postings.pop(pk, None)
+            if not postings:
+                del self._postings[term]
+                self._sorted_terms = None
+
+    def _apply(self, book_ids):
+        with self._lock:
+            if not self._loaded:
+                return
+            found = set()
+            for pk, document in iter_documents(book_ids):
+                self._add(pk, document)
+                found.add(pk)
+            for pk in set(book_ids) - found:
+                self._remove(pk)
+
+    def index_books(self, book_ids):
+        """(Re)index the given books once the current transaction commits"""
+        book_ids = list(book_ids)
+        if book_ids:
+            transaction.on_commit(lambda: self._apply(book_ids))
+
+    def remove_books(self, book_ids):
+        """Drop the given books once the current transaction commits"""
+        self.index_books(book_ids)
+
+    def rebuild(self):
+        """Rebuild the whole index from the catalog tables"""
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_lengths.clear()
+            self._total_length = 0.0
+            self._sorted_terms = None
+            for pk, document in iter_documents():
+                self._add(pk, document)
+            self._loaded = True
+
+    def _expand(self, prefix):
+        """Return the indexed terms starting with prefix"""
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+        terms = []
+        i = bisect_left(self._sorted_terms, prefix)
+        while i < len(self._sorted_terms) and self._sorted_terms[i].startswith(prefix):
+            terms.append(self._sorted_terms[i])
+            if len(terms) >= self.max_prefix_expansions:
+                break
+            i += 1
+        return terms
+
+    def _term_scores(self, terms):
+        """BM25 score of every book containing any of the terms"""
+        total_docs = len(self._doc_lengths)
+        average_length = self._total_length / total_docs if total_docs else 0.0
+        scores = defaultdict(float)
+        for term in terms:
+            postings = self._postings.get(term, {})
+            idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for pk, frequency in postings.items():
+                norm = 1 - self.b + self.b * self._doc_lengths[pk] / average_length
+                scores[pk] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+        return scores
+
+    def search(self, query, limit=50):
+        """Return the ids of the best matching books, best first"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            self._ensure_loaded()
+            totals = None
+            for i, term in enumerate(terms):
+                expanded = self._expand(term) if i == len(terms) - 1 else [term]
+                scores = self._term_scores(expanded)
+                if totals is None:
+                    totals = scores
+                else:
+                    totals = {pk: score + scores[pk] for pk, score in totals.items() if pk in scores}
+                if not totals:
+                    return []
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+        return [pk for pk, score in ranked[:limit]]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the configured search backend, choosing FTS5 when available"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = getattr(settings, 'LIBRARY_SEARCH_BACKEND', 'auto')
+                if name == 'fts5' or (name == 'auto' and FTS5Backend.is_supported()):
+                    _backend = FTS5Backend()
+                else:
+                    _backend = MemoryBackend()
+    return _backend
+
+
+def create_index(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate receiver: create the FTS5 table along with the catalog tables"""
+    backend = get_backend()
+    if using == DEFAULT_DB_ALIAS and isinstance(backend, FTS5Backend):
+        backend._ensure_table()
@@ -0,0 +1,183 @@
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import counters, search, stats, thumbnails, versions
+from .models import Author, AuthorProfile, Book, Category, Publication, Publisher
+
+
+def bump_card_version(sender, instance, update_fields=None, **kwargs):
+    """Give an edited book or author a new card version, invalidating its cached card 🃏"""
+    instance.card_version = (instance.card_version or 0) + 1
+    if update_fields is not None and 'card_version' not in update_fields:
+        # A partial save would not write the new version; persist it directly
+        sender.objects.filter(pk=instance.pk).update(card_version=F('card_version') + 1, updated_at=timezone.now())
+
+
+pre_save.connect(bump_card_version, sender=Book)
+pre_save.connect(bump_card_version, sender=Author)
+
+
+@receiver(pre_save, sender=Book)
+def book_saving(sender, instance, **kwargs):
+    """Remember the stored author so a change of author can be recounted"""
+    if not instance._state.adding:
+        instance._previous_author_id = (
+            Book.objects.filter(pk=instance.pk).values_list('author_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, created, **kwargs):
+    """Keep the search index, counters and home statistics in step with book edits 🔍"""
+    search.get_backend().index_books([instance.pk])
+    previous_author_id = getattr(instance, '_previous_author_id', None)
+    if created:
+        stats.adjust_total('books', 1)
+        counters.adjust_author_count(instance.author_id, 1)
+    elif previous_author_id is not None and previous_author_id != instance.author_id:
+        counters.adjust_author_count(previous_author_id, -1)
+        counters.adjust_author_count(instance.author_id, 1)
+    stats.book_saved(instance)
+    versions.touch(versions.BOOK)
+
+
+@receiver(pre_delete, sender=Book)
+def book_deleting(sender, instance, **kwargs):
+    """Remember a book's categories before its links are cascaded away"""
+    instance._deleted_category_ids = list(instance.categories.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    """Drop deleted books from the search index, counters and statistics"""
+    search.get_backend().remove_books([instance.pk])
+    category_deltas = {pk: -1 for pk in getattr(instance, '_deleted_category_ids', [])}
+    counters.adjust_author_count(instance.author_id, -1)
+    counters.adjust_category_counts(category_deltas)
+    stats.adjust_total('books', -1)
+    stats.adjust_category_counts(category_deltas)
+    stats.book_deleted(instance.pk)
+    versions.touch(versions.BOOK)
+
+
+@receiver(m2m_changed, sender=Book.categories.through)
+def book_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Reindex books and recount categories whose links changed"""
+    if action in ('pre_clear', 'pre_remove'):
+        # The links are about to vanish; remember what they pointed at (remove() ignores unlinked pks)
+        related = instance.books if reverse else instance.categories
+        if action == 'pre_remove':
+            related = related.filter(pk__in=pk_set)
+        instance._unlinked_pks = set(related.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action != 'post_add':
+        pk_set = getattr(instance, '_unlinked_pks', set())
+    if not pk_set:
+        return
+    delta = 1 if action == 'post_add' else -1
+    if reverse:
+        book_ids = pk_set
+        category_deltas = {instance.pk: delta * len(pk_set)}
+    else:
+        book_ids = [instance.pk]
+        category_deltas = {pk: delta for pk in pk_set}
+    search.get_backend().index_books(book_ids)
+    counters.adjust_category_counts(category_deltas)
+    stats.adjust_category_counts(category_deltas)
+    versions.touch(versions.BOOK, versions.CATEGORY)
+
+
+@receiver(post_save, sender=Author)
+def author_saved(sender, instance, created, **kwargs):
+    """Count new authors; reindex and re-card an author's books when edited"""
+    versions.touch(versions.AUTHOR)
+    if created:
+        stats.adjust_total('authors', 1)
+        return
+    # Book cards and pages show the author's name 🃏
+    Book.objects.filter(author=instance).update(card_version=F('card_version') + 1, updated_at=timezone.now())
+    versions.touch(versions.BOOK)
+    search.get_backend().index_books(instance.books.values_list('pk', flat=True))
+    stats.author_saved(instance)
+
+
+@receiver(post_delete, sender=Author)
+def author_deleted(sender, instance, **kwargs):
+    """Count deleted authors"""
+    stats.adjust_total('authors', -1)
+    versions.touch(versions.AUTHOR)
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    """Count new categories and reindex a category's books when renamed"""
+    if created:
+        stats.adjust_total('categories', 1)
+    else:
+        search.get_backend().index_books(instance.books.values_list('pk', flat=True))
+    stats.category_saved(instance)
+    versions.touch(versions.CATEGORY)
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleting(sender, instance, **kwargs):
+    """Remember a category's books before its links are cascaded away"""
+    instance._deleted_book_ids = list(instance.books.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    """Reindex the books that lost a category"""
+    search.get_backend().index_books(getattr(instance, '_deleted_book_ids', []))
+    stats.adjust_total('categories', -1)
+    stats.category_deleted(instance.pk)
+    versions.touch(versions.CATEGORY)
+
+
+@receiver(post_save, sender=Publisher)
+def publisher_saved(sender, instance, created, **kwargs):
+    """Count new publishers"""
+    if created:
+        stats.adjust_total('publishers', 1)
+    versions.touch(versions.PUBLISHER)
+
+
+@receiver(post_delete, sender=Publisher)
+def publisher_deleted(sender, instance, **kwargs):
+    """Count deleted publishers"""
+    stats.adjust_total('publishers', -1)
+    versions.touch(versions.PUBLISHER)
+
+
+@receiver(post_save, sender=Publication)
+@receiver(post_delete, sender=Publication)
+def publication_changed(sender, instance, **kwargs):
+    """Book pages list their publications 🏷️"""
+    versions.touch(versions.PUBLICATION)
+
+
+@receiver(post_save, sender=AuthorProfile)
+@receiver(post_delete, sender=AuthorProfile)
+def author_profile_changed(sender, instance, **kwargs):
+    """Author pages show the profile 🏷️"""
+    versions.touch(versions.AUTHOR)
+
+
+@receiver(pre_save, sender=AuthorProfile)
+def author_profile_saving(sender, instance, update_fields=None, **kwargs):
+    """Remember the stored photo so that only a new one is rendered"""
+    if update_fields is not None and 'photo' not in update_fields:
+        instance._previous_photo = instance.photo.name
+    elif not instance._state.adding:
+        instance._previous_photo = AuthorProfile.objects.filter(pk=instance.pk).values_list('photo', flat=True).first()
+
+
+@receiver(post_save, sender=AuthorProfile)
+def author_photo_saved(sender, instance, **kwargs):
+    """Render the thumbnails of a new photo in the background 🖼️"""
+    if instance.photo.name != getattr(instance, '_previous_photo', None):
+        thumbnails.schedule(instance.photo)
@@ -0,0 +1,42 @@
+"""Per-connection SQLite tuning ⚙️
+
+configure_connection() runs the LIBRARY_SQLITE_PRAGMAS on every new SQLite
+connection (it is connected to connection_created in LibraryConfig.ready).
+With WAL readers no longer block the writer nor the writer the readers,
+synchronous=NORMAL only syncs at checkpoints (still safe in WAL mode), and
+busy_timeout makes a writer wait for the lock instead of failing with
+"database is locked". Since every pragma runs per connection, persistent
+connections (CONN_MAX_AGE) pay for them once instead of once per request.
+"""
+import re
+
+from django.conf import settings
+
+_VALUE = re.compile(r'^-?\w+$')
+
+
+def pragma_statements(pragmas):
+    """The PRAGMA statements setting each name to its value, in order"""
+    statements = []
+    for name, value in pragmas.items():
+        value = str(value)
+        if not _VALUE.match(name) or not _VALUE.match(value):
+            raise ValueError(f'Invalid SQLite pragma: {name} = {value}')
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+def configure_connection(sender, connection, **kwargs):
+    """connection_created receiver applying LIBRARY_SQLITE_PRAGMAS to SQLite connections"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'LIBRARY_SQLITE_PRAGMAS', {})
+    if connection.is_in_memory_db():
+        # Neither WAL nor memory mapping apply to an in-memory database
+        pragmas = {name: value for name, value in pragmas.items() if name not in ('journal_mode', 'mmap_size')}
+    elif 'mode=ro' in str(connection.settings_dict['NAME']):
+        # A read-only connection (a replica) cannot change the file's journal mode
+        pragmas = {name: value for name, value in pragmas.items() if name != 'journal_mode'}
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(pragmas):
+            cursor.execute(statement)
@@ -0,0 +1,264 @@
+"""Cached home page statistics 📊
+
+The totals, per-category book counts and the most recent books are kept in
+a cache and adjusted incrementally by model signals, so the home page costs
+no aggregate queries in steady state. The whole state is recomputed from the
+database when it is missing or older than LIBRARY_STATS_RECONCILE_SECONDS,
+which also repairs any drift (for example from writes in other processes
+when a per-process cache is used, or from bulk writes that bypass signals).
+"""
+import asyncio
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Author, Book, Category, Publisher
+
+TOP_CATEGORIES = 5
+RECENT_BOOKS = 5
+
+KEY_PREFIX = 'library:stats:'
+TOTAL_KEYS = {
+    'books': KEY_PREFIX + 'total-books',
+    'authors': KEY_PREFIX + 'total-authors',
+    'categories': KEY_PREFIX + 'total-categories',
+    'publishers': KEY_PREFIX + 'total-publishers',
+}
+CATEGORY_COUNTS_KEY = KEY_PREFIX + 'category-counts'
+RECENT_BOOKS_KEY = KEY_PREFIX + 'recent-books'
+RECONCILED_AT_KEY = KEY_PREFIX + 'reconciled-at'
+
+# Serializes read-modify-write updates of the structured keys in this process
+_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, 'LIBRARY_STATS_CACHE', 'default')]
+
+
+def _reconcile_interval():
+    return getattr(settings, 'LIBRARY_STATS_RECONCILE_SECONDS', 3600)
+
+
+def _book_entry(pk, title, publication_date, author_id, author_name):
+    return {
+        'id': pk,
+        'title': title,
+        'publication_date': publication_date,
+        'author': {'id': author_id, 'name': author_name},
+    }
+
+
+def _recency(entry):
+    """Sort key matching ORDER BY publication_date DESC, id DESC (NULL dates last)"""
+    date = entry['publication_date']
+    return (date is not None, date.toordinal() if date else 0, entry['id'])
+
+
+def _recent_books_rows():
+    return Book.objects.order_by('-publication_date', '-pk').values_list(
+        'pk', 'title', 'publication_date', 'author_id', 'author__name'
+    )[:RECENT_BOOKS]
+
+
+def _load_recent_books():
+    return [_book_entry(*row) for row in _recent_books_rows()]
+
+
+def _store(values):
+    with _lock:
+        _cache().set_many(values, timeout=None)
+    return values
+
+
+def reconcile():
+    """Recompute every statistic from the database and store it in the cache"""
+    category_counts = {
+        pk: {'name': name, 'slug': slug, 'book_count': book_count}
+        for pk, name, slug, book_count in Category.objects.values_list('pk', 'name', 'slug', 'book_count')
+    }
+    return _store({
+        TOTAL_KEYS['books']: Book.objects.count(),
+        TOTAL_KEYS['authors']: Author.objects.count(),
+        TOTAL_KEYS['categories']: len(category_counts),
+        TOTAL_KEYS['publishers']: Publisher.objects.count(),
+        CATEGORY_COUNTS_KEY: category_counts,
+        RECENT_BOOKS_KEY: _load_recent_books(),
+        RECONCILED_AT_KEY: time.time(),
+    })
+
+
+async def _aload_recent_books():
+    return [_book_entry(*row) async for row in _recent_books_rows()]
+
+
+async def _acategory_counts():
+    rows = Category.objects.values_list('pk', 'name', 'slug', 'book_count')
+    return {
+        pk: {'name': name, 'slug': slug, 'book_count': book_count}
+        async for pk, name, slug, book_count in rows
+    }
+
+
+async def areconcile():
+    """Async version of reconcile() issuing its independent queries concurrently"""
+    books, authors, publishers, category_counts, recent_books = await asyncio.gather(
+        Book.objects.acount(),
+        Author.objects.acount(),
+        Publisher.objects.acount(),
+        _acategory_counts(),
+        _aload_recent_books(),
+    )
+    return await sync_to_async(_store)({
+        TOTAL_KEYS['books']: books,
+        TOTAL_KEYS['authors']: authors,
+        TOTAL_KEYS['categories']: len(category_counts),
+        TOTAL_KEYS['publishers']: publishers,
+        CATEGORY_COUNTS_KEY: category_counts,
+        RECENT_BOOKS_KEY: recent_books,
+        RECONCILED_AT_KEY: time.time(),
+    })
+
+
+def _context(values):
+    categories = sorted(
+        values[CATEGORY_COUNTS_KEY].values(), key=lambda category: (-category['book_count'], category['name'])
+    )
+    return {
+        'total_books': values[TOTAL_KEYS['books']],
+        'total_authors': values[TOTAL_KEYS['authors']],
+        'total_categories': values[TOTAL_KEYS['categories']],
+        'total_publishers': values[TOTAL_KEYS['publishers']],
+        'categories': categories[:TOP_CATEGORIES],
+        'recent_books': values[RECENT_BOOKS_KEY],
+    }
+
+
+STATS_KEYS = [*TOTAL_KEYS.values(), CATEGORY_COUNTS_KEY, RECENT_BOOKS_KEY, RECONCILED_AT_KEY]
+
+
+def _needs_reconcile(values):
+    reconciled_at = values.get(RECONCILED_AT_KEY)
+    if reconciled_at is None or time.time() - reconciled_at > _reconcile_interval():
+        return True
+    return any(key not in values for key in STATS_KEYS if key != RECENT_BOOKS_KEY)
+
+
+def get_home_stats():
+    """Return the home page context, served from the cache"""
+    cache = _cache()
+    values = cache.get_many(STATS_KEYS)
+    if _needs_reconcile(values):
+        values = reconcile()
+    elif values.get(RECENT_BOOKS_KEY) is None:
+        # A recent book was removed; refill the short list with one small query
+        values[RECENT_BOOKS_KEY] = _load_recent_books()
+        cache.set(RECENT_BOOKS_KEY, values[RECENT_BOOKS_KEY], timeout=None)
+    return _context(values)
+
+
+async def aget_home_stats():
+    """Async version of get_home_stats()"""
+    cache = _cache()
+    values = await cache.aget_many(STATS_KEYS)
+    if _needs_reconcile(values):
+        values = await areconcile()
+    elif values.get(RECENT_BOOKS_KEY) is None:
+        values[RECENT_BOOKS_KEY] = await _aload_recent_books()
+        await cache.aset(RECENT_BOOKS_KEY, values[RECENT_BOOKS_KEY], timeout=None)
+    return _context(values)
+
+
+def _after_commit(func):
+    """Run a cache update only once the surrounding transaction commits"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        transaction.on_commit(lambda: func(*args, **kwargs))
+    return wrapper
+
+
+def _update(key, func):
+    """Apply func to a structured cache value if it is present"""
+    cache = _cache()
+    with _lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.set(key, func(value), timeout=None)
+
+
+@_after_commit
+def adjust_total(kind, delta):
+    """Add delta to one of the total counters"""
+    try:
+        _cache().incr(TOTAL_KEYS[kind], delta)
+    except ValueError:
+        pass  # Not cached yet; the next read reconciles
+
+
+@_after_commit
+def adjust_category_counts(deltas):
+    """Apply {category_id: delta} to the per-category book counts"""
+    def apply(counts):
+        for pk, delta in deltas.items():
+            if pk in counts:
+                counts[pk]['book_count'] += delta
+        return counts
+    _update(CATEGORY_COUNTS_KEY, apply)
+
+
+@_after_commit
+def category_saved(category):
+    """Track a new or renamed category"""
+    def apply(counts):
+        entry = counts.setdefault(category.pk, {'book_count': 0})
+        entry.update(name=category.name, slug=category.slug)
+        return counts
+    _update(CATEGORY_COUNTS_KEY, apply)
+
+
+@_after_commit
+def category_deleted(pk):
+    """Forget a deleted category"""
+    def apply(counts):
+        counts.pop(pk, None)
+        return counts
+    _update(CATEGORY_COUNTS_KEY, apply)
+
+
+@_after_commit
+def book_saved(book):
+    """Merge a new or edited book into the recent books list"""
+    def apply(recent):
+        previous = next((item for item in recent if item['id'] == book.pk), None)
+        entry = _book_entry(book.pk, book.title, book.publication_date, book.author_id, None)
+        if previous is not None and _recency(entry) < _recency(previous):
+            # It may have dropped below a book we are not tracking; refill on read
+            return None
+        if previous is None and len(recent) >= RECENT_BOOKS and _recency(entry) < _recency(recent[-1]):
+            return recent
+        entry['author']['name'] = book.author.name
+        merged = [item for item in recent if item['id'] != book.pk] + [entry]
+        return sorted(merged, key=_recency, reverse=True)[:RECENT_BOOKS]
+    _update(RECENT_BOOKS_KEY, apply)
+
+
+@_after_commit
+def book_deleted(pk):
+    """Drop a deleted book from the recent books list"""
+    _update(RECENT_BOOKS_KEY, lambda recent: None if any(item['id'] == pk for item in recent) else recent)
+
+
+@_after_commit
+def author_saved(author):
+    """Refresh the author name shown next to recent books"""
+    def apply(recent):
+        for item in recent:
+            if item['author']['id'] == author.pk:
+                item['author']['name'] = author.name
+        return recent
+    _update(RECENT_BOOKS_KEY, apply)
@@ -0,0 +1,87 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+# Placeholder rendered by list templates where the streamed rows belong 🚰
+STREAM_MARKER = '<!-- stream-rows -->'
+
+
+def chunked(iterable, size):
+    """Yield lists of at most `size` items from an iterable"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_rows(request, template_name, queryset, render_chunk, context=None, chunk_size=500):
+    """Stream a list page, rendering its rows in chunks over queryset.iterator().
+
+    The page template is rendered once with a marker where the rows go; the
+    head is sent immediately, rows follow chunk by chunk through
+    render_chunk(objects) -> list of HTML strings, then the tail. Only one
+    chunk of model instances is alive at a time, so memory stays flat
+    whatever the size of the table.
+    """
+    page_context = dict(context or {}, stream_marker=mark_safe(STREAM_MARKER))
+    head, tail = render_to_string(template_name, page_context, request).split(STREAM_MARKER, 1)
+
+    def generate():
+        yield head
+        for chunk in chunked(queryset.iterator(chunk_size=chunk_size), chunk_size):
+            yield ''.join(render_chunk(chunk))
+        yield tail
+
+    return StreamingHttpResponse(generate(), content_type='text/html; charset=utf-8')
+
+
+def astream_rows(request, template_name, queryset, render_chunk, context=None, chunk_size=500):
+    """Async version of stream_rows() reading rows with queryset.aiterator().
+
+    render_chunk must be a coroutine function; the response body is an async
+    generator, so under ASGI no worker thread is held while the client reads.
+    """
+    page_context = dict(context or {}, stream_marker=mark_safe(STREAM_MARKER))
+    head, tail = render_to_string(template_name, page_context, request).split(STREAM_MARKER, 1)
+
+    async def generate():
+        yield head
+        chunk = []
+        async for obj in queryset.aiterator(chunk_size=chunk_size):
+            chunk.append(obj)
+            if len(chunk) >= chunk_size:
+                yield ''.join(await render_chunk(chunk))
+                chunk = []
+        if chunk:
+            yield ''.join(await render_chunk(chunk))
+        yield tail
+
+    return StreamingHttpResponse(generate(), content_type='text/html; charset=utf-8')
+
+
+def stream_json(key, chunks, trailer=None):
+    """Stream {key: [items...], **trailer()} as JSON, encoding each chunk of items as it comes.
+
+    `chunks` yields lists of items; `trailer`, if given, is called after the
+    last chunk for members only known at the end (such as keys not found).
+    """
+    encoder = DjangoJSONEncoder()
+
+    def generate():
+        yield '{%s: [' % encoder.encode(key)
+        separator = ''
+        for chunk in chunks:
+            if chunk:
+                yield separator + ', '.join(encoder.encode(item) for item in chunk)
+                separator = ', '
+        yield ']'
+        for name, value in (trailer() if trailer else {}).items():
+            yield ', %s: %s' % (encoder.encode(name), encoder.encode(value))
+        yield '}'
+
+    return StreamingHttpResponse(generate(), content_type='application/json')
@@ -0,0 +1,133 @@
+"""Deterministic synthetic catalog generator 🧪
+
+Rows are produced as plain tuples from pure functions of (seed, id), so
+batches of any size can be generated in any order, in worker processes, and
+always come out identical for the same seed. Ids are assigned explicitly, which lets the
+loader link books to authors, categories and publishers without reading
+anything back from the database.
+"""
+import random
+from datetime import date, timedelta
+
+TITLE_WORDS = [
+    'Shadow', 'River', 'Garden', 'Empire', 'Winter', 'Silent', 'Golden', 'Last', 'Hidden', 'Broken',
+    'Night', 'Ocean', 'Forest', 'Stone', 'Glass', 'Iron', 'Crown', 'Storm', 'Mirror', 'Secret',
+    'Journey', 'House', 'City', 'Letters', 'Dream', 'Fire', 'Star', 'Road', 'Island', 'Memory',
+    'Machine', 'Song', 'Harbor', 'Frontier', 'Tide', 'Lantern', 'Orchard', 'Kingdom', 'Echo', 'Voyage',
+]
+FIRST_NAMES = [
+    'Ana', 'Luis', 'Maria', 'John', 'Elena', 'Carlos', 'Sofia', 'David', 'Lucia', 'Peter',
+    'Isabel', 'Hugo', 'Clara', 'Omar', 'Julia', 'Marco', 'Nora', 'Pablo', 'Irene', 'Samuel',
+]
+LAST_NAMES = [
+    'Garcia', 'Smith', 'Rossi', 'Silva', 'Novak', 'Kim', 'Muller', 'Lopez', 'Dubois', 'Tanaka',
+    'Costa', 'Jensen', 'Okafor', 'Ivanova', 'Brennan', 'Herrera', 'Sato', 'Fischer', 'Moreau', 'Quispe',
+]
+GENRES = [
+    'Science Fiction', 'Fantasy', 'Mystery', 'Romance', 'Non-fiction', 'Biography', 'History', 'Poetry',
+    'Thriller', 'Horror', 'Travel', 'Philosophy', 'Science', 'Cooking', 'Art', 'Children', 'Drama',
+    'Humor', 'Religion', 'Economics', 'Politics', 'Health', 'Sports', 'Music', 'Technology',
+]
+COUNTRIES = [
+    'United Kingdom', 'United States', 'Spain', 'Peru', 'Mexico', 'France', 'Germany', 'Japan',
+    'Italy', 'Brazil', 'Canada', 'Argentina',
+]
+SUMMARY_SENTENCES = [
+    'A sweeping story of loss and renewal.',
+    'An unlikely friendship changes everything.',
+    'Secrets buried for generations come to light.',
+    'A detective races against time.',
+    'Told across three continents and a century.',
+    'A quiet meditation on memory and home.',
+    'Ambition and betrayal in a divided city.',
+    'An expedition into the unknown goes wrong.',
+]
+
+EPOCH = date(1850, 1, 1)
+DATE_SPAN_DAYS = (date(2024, 12, 31) - EPOCH).days
+
+
+def plan(scale):
+    """Return how many rows of each kind a catalog of `scale` books gets"""
+    return {
+        'books': scale,
+        'authors': max(1, scale // 10),
+        'categories': max(6, min(500, int(scale ** 0.5) // 2)),
+        'publishers': max(3, min(5000, scale // 1000)),
+    }
+
+
+KINDS = {'authors': 1, 'books': 2}
+
+
+def _rng(seed, kind, pk):
+    """Random generator private to one row, so rows do not depend on batching"""
+    return random.Random((seed * 10 + KINDS[kind]) * 10 ** 12 + pk)
+
+
+def _random_date(rng):
+    return EPOCH + timedelta(days=rng.randrange(DATE_SPAN_DAYS))
+
+
+def isbn13(number):
+    """Build a valid ISBN-13 from a sequence number"""
+    digits = f'978{number:09d}'
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(digits))
+    return digits + str((10 - total % 10) % 10)
+
+
+def category_rows(count):
+    """(id, name, slug, description) for every category"""
+    rows = []
+    for pk in range(1, count + 1):
+        genre = GENRES[(pk - 1) % len(GENRES)]
+        cycle = (pk - 1) // len(GENRES)
+        name = genre if cycle == 0 else f'{genre} {cycle + 1}'
+        slug = name.lower().replace(' ', '-')
+        rows.append((pk, name, slug, f'Books about {name.lower()}'))
+    return rows
+
+
+def publisher_rows(count):
+    """(id, name, website, email) for every publisher"""
+    rows = []
+    for pk in range(1, count + 1):
+        handle = f'press{pk}'
+        rows.append((pk, f'{LAST_NAMES[pk % len(LAST_NAMES)]} Press {pk}',
+                     f'https://www.{handle}.example', f'info@{handle}.example'))
+    return rows
+
+
+def author_rows(seed, start, stop):
+    """(id, name, birth_date, biography) for authors with ids in [start, stop)"""
+    rows = []
+    for pk in range(start, stop):
+        rng = _rng(seed, 'authors', pk)
+        name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+        born = _random_date(rng) - timedelta(days=30 * 365)
+        rows.append((pk, name, born, f'{name} writes {rng.choice(GENRES).lower()}.'))
+    return rows
+
+
+def book_rows(seed, start, stop, counts):
+    """Book tuples for ids in [start, stop).
+
+    Each tuple is (id, title, author_id, isbn, publication_date, summary,
+    category_ids, publications) where publications is a list of
+    (publisher_id, country, date_published) with distinct publishers.
+    """
+    rows = []
+    for pk in range(start, stop):
+        rng = _rng(seed, 'books', pk)
+        title = ' '.join(rng.choice(TITLE_WORDS) for _ in range(rng.randint(2, 4)))
+        published = _random_date(rng)
+        summary = ' '.join(rng.sample(SUMMARY_SENTENCES, rng.randint(1, 3)))
+        category_ids = rng.sample(range(1, counts['categories'] + 1), rng.randint(1, min(3, counts['categories'])))
+        publisher_ids = rng.sample(range(1, counts['publishers'] + 1), rng.randint(1, min(2, counts['publishers'])))
+        publications = [
+            (publisher_id, rng.choice(COUNTRIES), published + timedelta(days=rng.randrange(365)))
+            for publisher_id in publisher_ids
+        ]
+        rows.append((pk, title, rng.randint(1, counts['authors']), isbn13(pk),
+                     published, summary, category_ids, publications))
+    return rows
@@ -0,0 +1,11 @@
+from django import template
+
+from .. import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail_url(image, size='medium', fmt='webp'):
+    """URL of a thumbnail of an image field: {% thumbnail_url author.profile.photo 'small' 'jpeg' %}"""
+    return thumbnails.thumbnail_url(image, size, fmt)
@@ -1,3 +1,397 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.http import Http404
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from PIL import Image
+
+from . import async_views, search, thumbnails
+from .catalog import CatalogError, clean_record
+from .middleware import RequestProfilingMiddleware
+from .management.commands.benchmark_views import QUERY_BUDGETS, Command as BenchmarkCommand
+from .models import Author, Book, Category
+from .pagination import KeysetPaginator, encode_cursor
+
+# Books in the synthetic catalog the tests run against
+FIXTURE_SCALE = 60
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+# Like benchmark_views: no profiling output, no view tracking thread, no replicas
+@override_settings(REQUEST_PROFILING={'SAMPLE_RATE': 0}, ANALYTICS_VIEW_TRACKING={'ENABLED': False},
+                   LIBRARY_READ_REPLICAS={'ALIASES': []})
+class CatalogTestCase(TestCase):
+    """Runs against a small synthetic catalog, with empty caches for every test"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_db', scale=FIXTURE_SCALE, stdout=StringIO())
+
+    def setUp(self):
+        # Cards, versions and statistics would otherwise carry over between tests
+        clear_caches()
+        self.addCleanup(clear_caches)
+
+
+def get(client, url):
+    """Response and full body of a GET, streamed or not"""
+    response = client.get(url)
+    return response, b''.join(response.streaming_content) if response.streaming else response.content
+
+
+class QueryBudgetTests(CatalogTestCase):
+    """Every view runs the number of queries budgeted in benchmark_views 📏"""
+
+    def assertWithinBudget(self, name):
+        url = BenchmarkCommand().url_for(name)
+        with self.assertNumQueries(QUERY_BUDGETS[name]):
+            response, body = get(self.client, url)
+        self.assertEqual(response.status_code, 200, url)
+        return body
+
+    # The views below hold their budget with cold caches too
+
+    def test_book_list(self):
+        self.assertWithinBudget('book_list')
+
+    def test_book_detail(self):
+        self.assertWithinBudget('book_detail')
+
+    def test_author_list(self):
+        self.assertWithinBudget('author_list')
+
+    def test_author_detail(self):
+        self.assertWithinBudget('author_detail')
+
+    def test_category_detail(self):
+        self.assertWithinBudget('category_detail')
+
+    def test_search(self):
+        body = self.assertWithinBudget('search')
+        self.assertIn(b'/books/', body)
+
+    def test_every_budgeted_view(self):
+        # Measured like benchmark_views: once the caches a first request fills are warm
+        for name in QUERY_BUDGETS:
+            with self.subTest(view=name):
+                get(self.client, BenchmarkCommand().url_for(name))
+                self.assertWithinBudget(name)
+
+
+class KeysetPaginationTests(CatalogTestCase):
+    ordering = ('title', 'id')
+
+    def test_pages_cover_every_row_once(self):
+        paginator = KeysetPaginator(Book.objects.all(), self.ordering, per_page=7)
+        seen = []
+        page = paginator.page()
+        while True:
+            seen.extend(book.pk for book in page)
+            if not page.has_next():
+                break
+            page = paginator.page(after=page.next_cursor)
+        self.assertEqual(seen, list(Book.objects.order_by(*self.ordering).values_list('pk', flat=True)))
+
+    def test_previous_cursor_goes_back(self):
+        paginator = KeysetPaginator(Book.objects.all(), self.ordering, per_page=7)
+        first = paginator.page()
+        second = paginator.page(after=first.next_cursor)
+        back = paginator.page(before=second.previous_cursor)
+        self.assertEqual([book.pk for book in back], [book.pk for book in first])
+
+    def test_invalid_cursors_are_not_found(self):
+        cursors = ['not a cursor', encode_cursor(['one value']), encode_cursor(['A title', 'x']),
+                   encode_cursor(['A title', None]), encode_cursor([['a list'], 1])]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(reverse('book_list'), {'after': cursor}).status_code, 404)
+                self.assertEqual(self.client.get(reverse('author_list'), {'before': cursor}).status_code, 404)
+
+    async def test_invalid_cursor_is_not_found_in_async_views(self):
+        request = AsyncRequestFactory().get('/books/', {'after': encode_cursor(['A title', 'x'])})
+        with self.assertRaises(Http404):
+            await async_views.book_list(request)
+
+
+class ConditionalGetTests(CatalogTestCase):
+    def test_unchanged_page_is_not_modified(self):
+        url = reverse('book_list')
+        etag = self.client.get(url).headers['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_each_url_has_its_own_etag(self):
+        url = reverse('book_list')
+        etag = self.client.get(url).headers['ETag']
+        cursor = self.client.get(url).context['page'].next_cursor
+        for query in ({'after': cursor}, {'sort': 'popular'}):
+            with self.subTest(query=query):
+                response = self.client.get(url, query, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response.headers['ETag'], etag)
+        etag = self.client.get(url + '?sort=popular&after=' + cursor).headers['ETag']
+        self.assertEqual(self.client.get(url + '?after=' + cursor + '&sort=popular').headers['ETag'], etag)
+
+    def test_edit_changes_the_etag(self):
+        book = Book.objects.first()
+        url = reverse('book_detail', args=[book.pk])
+        etag = self.client.get(url).headers['ETag']
+        book.title = 'A new title'
+        with self.captureOnCommitCallbacks(execute=True):
+            book.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertContains(response, 'A new title')
+
+    def test_page_read_before_the_commit_is_not_current(self):
+        book = Book.objects.first()
+        url = reverse('book_list')
+        etag = self.client.get(url).headers['ETag']
+        book.title = 'A new title'
+        with self.captureOnCommitCallbacks(execute=True):
+            book.save()
+            # Served while the edit is still uncommitted: the version has not moved yet
+            self.assertEqual(self.client.get(url).headers['ETag'], etag)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+
+@override_settings(REQUEST_PROFILING={'SAMPLE_RATE': 1})
+class ProfilingTests(CatalogTestCase):
+    def record(self, logs):
+        self.assertEqual(len(logs.records), 1)
+        return json.loads(logs.records[0].getMessage())
+
+    def test_streamed_body_is_measured_once_sent(self):
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertNoLogs('library.profiling'):
+                response = self.client.get(reverse('book_list'), {'stream': 1})
+            with self.assertLogs('library.profiling') as logs:
+                b''.join(response.streaming_content)
+        self.assertNotIn('Server-Timing', response.headers)
+        self.assertEqual(self.record(logs)['queries'], len(queries))
+
+    def test_async_streamed_body_is_measured_once_sent(self):
+        middleware = RequestProfilingMiddleware(async_views.book_list)
+
+        async def read(response):
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        # Driven from here, the thread-sensitive ORM calls share this test's connection
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertNoLogs('library.profiling'):
+                response = async_to_sync(middleware)(AsyncRequestFactory().get('/books/', {'stream': 1}))
+            with self.assertLogs('library.profiling') as logs:
+                body = async_to_sync(read)(response)
+        self.assertIn(b'/books/', body)
+        self.assertEqual(self.record(logs)['queries'], len(queries))
+
+
+class SearchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.book = Book.objects.order_by('pk').first()
+        self.word = self.book.title.split()[0]
+
+    def test_finds_books_by_title(self):
+        response = self.client.get(reverse('search'), {'q': self.word})
+        self.assertContains(response, reverse('book_detail', args=[self.book.pk]))
+
+    async def test_async_search(self):
+        # The backend lookup must stay off the event loop
+        response = await async_views.search(AsyncRequestFactory().get('/search/', {'q': self.word}))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(reverse('book_detail', args=[self.book.pk]).encode(), response.content)
+
+
+class CounterTests(CatalogTestCase):
+    def test_new_book_is_counted(self):
+        author = Author.objects.first()
+        category = Category.objects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            book = Book.objects.create(title='Counted', author=author, isbn='9990000000001')
+            book.categories.add(category)
+        self.assertEqual(Author.objects.get(pk=author.pk).book_count, author.book_count + 1)
+        self.assertEqual(Category.objects.get(pk=category.pk).book_count, category.book_count + 1)
+
+    def test_removing_unlinked_categories_changes_nothing(self):
+        book = Book.objects.filter(categories__isnull=False).first()
+        linked = book.categories.first()
+        unlinked = Category.objects.exclude(books=book).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            book.categories.remove(linked, unlinked)
+            unlinked.books.remove(book)
+        self.assertEqual(Category.objects.get(pk=linked.pk).book_count, linked.book_count - 1)
+        self.assertEqual(Category.objects.get(pk=unlinked.pk).book_count, unlinked.book_count)
+
+    def test_rebuilt_counts_match_the_links(self):
+        call_command('rebuild_counters', stdout=StringIO())
+        for category in Category.objects.all():
+            self.assertEqual(category.book_count, category.books.count())
+
+
+class AdminSearchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'x'))
+        self.word = Book.objects.order_by('pk').first().title.split()[0]
+
+    def test_capped_search_says_so(self):
+        url = reverse('admin:library_book_changelist')
+        matches = len(search.get_backend().search(self.word, limit=FIXTURE_SCALE))
+        with mock.patch('library.admin.ADMIN_SEARCH_LIMIT', matches - 1):
+            self.assertContains(self.client.get(url, {'q': self.word}), f'Showing the first {matches - 1} matches')
+        with mock.patch('library.admin.ADMIN_SEARCH_LIMIT', matches):
+            self.assertNotContains(self.client.get(url, {'q': self.word}), 'Showing the first')
+
+    def test_search_by_autocomplete_adds_no_message(self):
+        with mock.patch('library.admin.ADMIN_SEARCH_LIMIT', 1):
+            self.client.get(reverse('admin:autocomplete'), {
+                'term': self.word, 'app_label': 'library', 'model_name': 'publication', 'field_name': 'book',
+            })
+            response = self.client.get(reverse('admin:library_book_changelist'))
+        self.assertNotContains(response, 'Showing the first')
+
+class CatalogImportTests(TestCase):
+    record = {'isbn': '978-0-00-000001-1', 'title': 'A Book', 'author': 'An Author',
+              'publication_date': '2001-02-03', 'categories': ['Fiction'],
+              'publications': [['A Publisher', 'Spain', '2001-02-03']]}
+
+    def import_lines(self, *records):
+        handle, path = tempfile.mkstemp(suffix='.jsonl')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(handle, 'w') as output:
+            for record in records:
+                output.write((record if isinstance(record, str) else json.dumps(record)) + '\n')
+        stderr = StringIO()
+        call_command('import_catalog', path, skip_derived=True, stdout=StringIO(), stderr=stderr)
+        return stderr.getvalue()
+
+    def test_clean_record_normalizes(self):
+        cleaned = clean_record(self.record)
+        self.assertEqual(cleaned['isbn'], '9780000000011')
+        self.assertEqual(cleaned['categories'], ['Fiction'])
+        self.assertEqual(cleaned['publications'][0][:2], ('A Publisher', 'Spain'))
+
+    def test_clean_record_rejects_malformed_records(self):
+        malformed = [
+            {'title': 12}, {'author': ['An Author']}, {'summary': 5}, {'publication_date': '2001-13-45'},
+            {'categories': 'Fiction'}, {'categories': [7]}, {'publications': [['A Publisher', 'Spain']]},
+            {'publications': ['A Publisher']}, {'isbn': ''},
+        ]
+        for change in malformed:
+            with self.subTest(change=change):
+                with self.assertRaises(CatalogError):
+                    clean_record({**self.record, **change})
+
+    def test_bad_rows_are_skipped_and_reported(self):
+        errors = self.import_lines(
+            self.record, '{not json', [1, 2], {**self.record, 'isbn': '1', 'title': 12},
+            {**self.record, 'isbn': '2', 'publications': {'publisher': 'x'}},
+        )
+        self.assertEqual(Book.objects.count(), 1)
+        self.assertEqual(len(errors.strip().splitlines()), 4)
+
+    def test_names_sharing_a_slug_share_a_category(self):
+        names = ['Sci Fi', 'Sci-Fi', 'sci fi']
+        self.import_lines(*({**self.record, 'isbn': str(n), 'categories': [name]} for n, name in enumerate(names)))
+        category = Category.objects.get(slug='sci-fi')
+        self.assertEqual(Category.objects.count(), 1)
+        self.assertEqual(category.books.count(), len(names))
+
+    def test_reimport_updates_by_isbn(self):
+        self.import_lines(self.record)
+        self.import_lines({**self.record, 'title': 'A Better Title'})
+        self.assertEqual(list(Book.objects.values_list('title', flat=True)), ['A Better Title'])
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root, LIBRARY_THUMBNAILS={
+            'SIZES': {'small': (16, 16), 'medium': (32, 32)}, 'FORMATS': ('webp', 'jpeg'), 'WORKERS': 0,
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        clear_caches()
+        self.addCleanup(clear_caches)
+
+    def upload(self, name='photo.png', data=None):
+        if data is None:
+            output = io.BytesIO()
+            Image.new('RGB', (80, 60), 'red').save(output, format='PNG')
+            data = output.getvalue()
+        return default_storage.open(default_storage.save(name, ContentFile(data)))
+
+    def test_missing_variant_is_rendered_on_demand(self):
+        image = self.upload()
+        url = thumbnails.thumbnail_url(image, 'small', 'jpeg')
+        target = thumbnails.variant_name(thumbnails.digest(image.name), 'small', 'jpeg')
+        self.assertEqual(url, default_storage.url(target))
+        with Image.open(default_storage.path(target)) as thumbnail:
+            self.assertEqual((thumbnail.format, thumbnail.size), ('JPEG', (16, 16)))
+
+    def test_rendered_variants_are_served_from_the_cache(self):
+        image = self.upload()
+        source_path, jobs = thumbnails.file_jobs(image.name)
+        self.assertEqual(len(jobs), 4)
+        thumbnails.render_files(source_path, jobs)
+        thumbnails.mark_ready(image.name)
+        self.assertEqual(thumbnails.file_jobs(image.name)[1], [])
+        for target in thumbnails.variant_names(thumbnails.digest(image.name)):
+            os.remove(default_storage.path(target))
+        # Ready variants are trusted without touching the storage
+        self.assertTrue(thumbnails.thumbnail_url(image, 'medium', 'webp'))
+        self.assertFalse(default_storage.exists(thumbnails.variant_name(thumbnails.digest(image.name), 'medium', 'webp')))
+
+    def test_broken_images_have_no_thumbnail(self):
+        self.assertEqual(thumbnails.thumbnail_url(self.upload('broken.png', b'not an image')), '')
+        missing = self.upload('missing.png')
+        default_storage.delete(missing.name)
+        self.assertEqual(thumbnails.thumbnail_url(missing), '')
+
+
+class ApiTests(CatalogTestCase):
+    too_large = '99999999999999999999'
+
+    def test_ids_beyond_a_database_integer_are_rejected(self):
+        for name in ('api_books', 'api_authors'):
+            with self.subTest(view=name):
+                response = self.client.get(reverse(name), {'id': f'1,{self.too_large}'})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_details_beyond_a_database_integer_are_not_found(self):
+        for url in ('/api/books/', '/api/authors/', '/books/', '/authors/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(f'{url}{self.too_large}/').status_code, 404)
+
+    def test_lookup_lists_the_missing_ids(self):
+        book = Book.objects.order_by('pk').last()
+        response, body = get(self.client, reverse('api_books') + f'?id={book.pk},{book.pk + 1}')
+        data = json.loads(body)
+        self.assertEqual([row['id'] for row in data['books']], [book.pk])
+        self.assertEqual(data['missing'], {'isbn': [], 'id': [book.pk + 1]})
@@ -0,0 +1,226 @@
+"""Fixed-size thumbnails of uploaded images 🖼️
+
+Every variant (a named size of LIBRARY_THUMBNAILS['SIZES'] in one of the
+FORMATS) is stored under a name derived from the SHA-256 of the source
+image and the variant spec, so identical uploads share their thumbnails, a
+new upload never collides with an old thumbnail, and the URL of a variant
+is known before the file exists. schedule() renders every variant of a new
+upload in a background process pool once its transaction commits;
+thumbnail_url() renders a missing variant in the request as a fallback.
+Both remember finished variants in the cache: a variant marked ready costs
+two cache lookups (the source digest and the ready flag), while a cold one
+costs a storage check, plus a render when the file is missing.
+"""
+import atexit
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+DEFAULTS = {
+    'SIZES': {'small': (64, 64), 'medium': (256, 256), 'large': (512, 512)},
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': 80,
+    'WORKERS': 2,
+    'PREFIX': 'thumbnails',
+    'CACHE': 'default',
+}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+# Bump when the rendering changes so new thumbnails get new names
+SPEC_VERSION = 1
+
+DIGEST_KEY = 'library:thumbnail:digest:{}'
+READY_KEY = 'library:thumbnail:ready:{}'
+
+_executor = None
+_lock = threading.Lock()
+# Source names whose variants are being rendered by the pool
+_pending = set()
+
+
+def thumbnail_settings():
+    """LIBRARY_THUMBNAILS with its defaults filled in"""
+    return {**DEFAULTS, **getattr(settings, 'LIBRARY_THUMBNAILS', {})}
+
+
+def _cache():
+    return caches[thumbnail_settings()['CACHE']]
+
+
+def render(source, size, fmt, quality):
+    """Bytes of `source` (a path or file) cropped to `size` and encoded as `fmt`"""
+    with Image.open(source) as image:
+        # Decode JPEGs at a reduced scale when the thumbnail is much smaller
+        image.draft('RGB', (size[0] * 2, size[1] * 2))
+        image = ImageOps.exif_transpose(image)
+        if fmt == 'jpeg' and image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+        thumbnail = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    thumbnail.save(output, format=fmt.upper(), quality=quality, **({'method': 4} if fmt == 'webp' else {'optimize': True}))
+    return output.getvalue()
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handle, partial_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.partial')
+    with os.fdopen(handle, 'wb') as output:
+        output.write(data)
+    os.replace(partial_path, path)
+
+
+def render_files(source_path, jobs):
+    """Process pool entry point: render (target path, size, format, quality) jobs of one source"""
+    for target_path, size, fmt, quality in jobs:
+        _write_atomic(target_path, render(source_path, size, fmt, quality))
+    return len(jobs)
+
+
+def _store(name, data):
+    try:
+        _write_atomic(default_storage.path(name), data)
+    except NotImplementedError:
+        # Remote storage: names are content-addressed, an existing file is already right
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(data))
+
+
+def digest(name):
+    """SHA-256 of a stored file, cached under its name"""
+    key = DIGEST_KEY.format(name)
+    value = _cache().get(key)
+    if value is None:
+        sha = hashlib.sha256()
+        with default_storage.open(name, 'rb') as source:
+            for chunk in iter(partial(source.read, 1 << 16), b''):
+                sha.update(chunk)
+        value = sha.hexdigest()
+        _cache().set(key, value, timeout=None)
+    return value
+
+
+def variant_name(source_digest, size_name, fmt, config=None):
+    """Storage name of a variant of the image with the given digest"""
+    config = config or thumbnail_settings()
+    width, height = config['SIZES'][size_name]
+    spec = f"{source_digest}:{width}x{height}:{fmt}:{config['QUALITY']}:{SPEC_VERSION}"
+    key = hashlib.sha256(spec.encode()).hexdigest()[:40]
+    return f"{config['PREFIX']}/{key[:2]}/{key}.{EXTENSIONS[fmt]}"
+
+
+def variant_names(source_digest, config=None):
+    """Storage names of every variant of the image with the given digest"""
+    config = config or thumbnail_settings()
+    return [variant_name(source_digest, size_name, fmt, config)
+            for size_name in config['SIZES'] for fmt in config['FORMATS']]
+
+
+def file_jobs(name, config=None):
+    """(source path, [(target path, size, format, quality)]) of the variants of an image not on disk yet.
+
+    Raises NotImplementedError for storages without local paths.
+    """
+    config = config or thumbnail_settings()
+    source_digest = digest(name)
+    jobs = []
+    for size_name, size in config['SIZES'].items():
+        for fmt in config['FORMATS']:
+            target = variant_name(source_digest, size_name, fmt, config)
+            if not default_storage.exists(target):
+                jobs.append((default_storage.path(target), tuple(size), fmt, config['QUALITY']))
+    return default_storage.path(name), jobs
+
+
+def mark_ready(name, config=None):
+    """Remember that every variant of an image exists, for schedule() and thumbnail_url()"""
+    targets = variant_names(digest(name), config)
+    _cache().set_many({READY_KEY.format(key): True for key in [name, *targets]}, timeout=None)
+
+
+def _executor_for(config):
+    global _executor
+    with _lock:
+        if _executor is None:
+            # spawn: the workers only need Pillow, not a copy of this process's threads
+            _executor = ProcessPoolExecutor(max_workers=config['WORKERS'],
+                                            mp_context=multiprocessing.get_context('spawn'))
+            atexit.register(_executor.shutdown)
+        return _executor
+
+
+def _finished(name, future):
+    with _lock:
+        _pending.discard(name)
+    if future.exception() is None:
+        try:
+            mark_ready(name)
+        except OSError:
+            # The source was removed meanwhile
+            pass
+
+
+def _submit(name):
+    config = thumbnail_settings()
+    if _cache().get(READY_KEY.format(name)):
+        return
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    try:
+        source_path, jobs = file_jobs(name, config)
+        if not jobs:
+            mark_ready(name, config)
+            with _lock:
+                _pending.discard(name)
+            return
+        future = _executor_for(config).submit(render_files, source_path, jobs)
+    except (NotImplementedError, OSError, RuntimeError):
+        # Remote storage, unreadable source or a broken pool: thumbnail_url() renders on demand
+        with _lock:
+            _pending.discard(name)
+        return
+    future.add_done_callback(partial(_finished, name))
+
+
+def schedule(image_file):
+    """Render every variant of an uploaded image in the background once the transaction commits"""
+    if not image_file or not thumbnail_settings()['WORKERS']:
+        return
+    transaction.on_commit(partial(_submit, image_file.name))
+
+
+def thumbnail_url(image_file, size_name='medium', fmt='webp'):
+    """URL of a variant of an image, rendering it first if needed; '' without an image"""
+    if not image_file:
+        return ''
+    config = thumbnail_settings()
+    try:
+        target = variant_name(digest(image_file.name), size_name, fmt, config)
+        ready_key = READY_KEY.format(target)
+        if not _cache().get(ready_key):
+            if not default_storage.exists(target):
+                size = config['SIZES'][size_name]
+                with default_storage.open(image_file.name, 'rb') as source:
+                    _store(target, render(source, size, fmt, config['QUALITY']))
+            _cache().set(ready_key, True, timeout=None)
+    except (OSError, Image.DecompressionBombError):
+        # The source is gone, unreadable or not an image (UnidentifiedImageError is an OSError)
+        return ''
+    return default_storage.url(target)
@@ -1,12 +1,20 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+from . import converters  # noqa: F401
+
+# Native async views for ASGI deployments ⚡
+if getattr(settings, 'LIBRARY_ASYNC_VIEWS', False):
+    views = async_views
 
 urlpatterns = [
     path('', views.home, name='home'),  # 🏠 Home page
     path('authors/', views.author_list, name='author_list'),  # 👨‍🎨 Authors list
-    path('authors/<int:pk>/', views.author_detail, name='author_detail'),  # 👨‍🎨 Author detail
+    path('authors/<id:pk>/', views.author_detail, name='author_detail'),  # 👨‍🎨 Author detail
     path('books/', views.book_list, name='book_list'),  # 📚 Books list
-    path('books/<int:pk>/', views.book_detail, name='book_detail'),  # 📖 Book detail
+    path('books/<id:pk>/', views.book_detail, name='book_detail'),  # 📖 Book detail
     path('categories/', views.category_list, name='category_list'),  # 🏷️ Categories list
     path('categories/<slug:slug>/', views.category_detail, name='category_detail'),  # 🏷️ Category detail
+    path('categories/<slug:slug>/top-rated/', views.category_top_rated, name='category_top_rated'),  # 🏆 Top rated in a category
+    path('search/', views.search, name='search'),  # 🔍 Catalog search
 ]
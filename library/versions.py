@@ -0,0 +1,66 @@
+"""Per-table change versions of the catalog 🏷️
+
+Every write to a catalog table touches that table's version: the time of the
+change in nanoseconds, kept in the LIBRARY_VERSION_CACHE cache and never
+moving backwards. HTTP validators for pages built from many rows (lists,
+search, the cards of a detail page) are derived from the versions of the
+tables they read, so checking whether a page changed costs one get_many and
+no query. A version missing from the cache (evicted, or a fresh cache) is
+reset to now, which only ever makes pages look newer. A touch waits for the
+surrounding transaction to commit: a request served in between must not
+store the old rows under the new version.
+
+The receivers in signals.py touch the versions of single-object writes;
+bulk writers call rebuild_derived_data(), which touches them all. Like the
+home statistics, the versions must live in a shared cache when several
+processes serve the site.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+BOOK = 'book'
+AUTHOR = 'author'
+CATEGORY = 'category'
+PUBLICATION = 'publication'
+PUBLISHER = 'publisher'
+RATING = 'rating'
+TABLES = (BOOK, AUTHOR, CATEGORY, PUBLICATION, PUBLISHER, RATING)
+
+KEY = 'library:version:{}'
+
+
+def _cache():
+    return caches[getattr(settings, 'LIBRARY_VERSION_CACHE', 'default')]
+
+
+def touch(*tables):
+    """Record that the given tables changed, once the surrounding transaction commits"""
+    transaction.on_commit(lambda: _touch(tables))
+
+
+def _touch(tables):
+    keys = [KEY.format(table) for table in tables or TABLES]
+    cache = _cache()
+    current = cache.get_many(keys)
+    now = time.time_ns()
+    cache.set_many({key: max(now, current.get(key, 0) + 1) for key in keys}, timeout=None)
+
+
+def get(*tables):
+    """Versions of the given tables, in order"""
+    keys = [KEY.format(table) for table in tables]
+    cache = _cache()
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = time.time_ns()
+        fresh = {key: now for key in missing}
+        # add() keeps a version another process set meanwhile
+        for key, version in fresh.items():
+            if not cache.add(key, version, timeout=None):
+                fresh[key] = cache.get(key, version)
+        versions.update(fresh)
+    return [versions[key] for key in keys]
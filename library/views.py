@@ -1,47 +1,62 @@
 from django.shortcuts import render, get_object_or_404
-from django.db.models import Count
+from analytics.tracking import track_book_views
+from . import search as catalog_search, stats
+from .conditional import conditional_page
+from .fragments import render_author_cards, render_book_cards
 from .models import Author, Book, Category, Publisher
+from .pagination import paginate_keyset
+from .streaming import stream_rows
+from .versions import AUTHOR, BOOK, CATEGORY, PUBLICATION, PUBLISHER, RATING
 
+# Page size for the keyset-paginated list views 📄
+LIST_PAGE_SIZE = 30
+# Maximum number of ranked search hits shown 🔍
+SEARCH_RESULTS_LIMIT = 60
+
+@conditional_page((BOOK, AUTHOR, CATEGORY, PUBLISHER))
 def home(request):
     """View for home page with library statistics"""
-    context = {
-        'total_books': Book.objects.count(),
-        'total_authors': Author.objects.count(),
-        'total_categories': Category.objects.count(),
-        'total_publishers': Publisher.objects.count(),
-        # Get categories with book counts 📊
-        'categories': Category.objects.annotate(
-            book_count=Count('books')
-        ).order_by('-book_count')[:5],
-        # Get recent books 📚
-        'recent_books': Book.objects.select_related('author').order_by('-publication_date')[:5],
-    }
-    return render(request, 'library/home.html', context)
+    # Counters and top lists come from the incrementally maintained cache 📊
+    return render(request, 'library/home.html', stats.get_home_stats())
 
+@conditional_page((AUTHOR, BOOK))
 def author_list(request):
-    """View for listing all authors"""
-    authors = Author.objects.all().order_by('name')
-    return render(request, 'library/author_list.html', {'authors': authors})
+    """View for listing authors a page at a time, or streaming all of them"""
+    authors = Author.objects.for_card()
+    if request.GET.get('stream'):
+        # Full export: rows are rendered in chunks as they come off the cursor 🚰
+        return stream_rows(request, 'library/author_list.html', authors.order_by('name', 'id'),
+                           render_author_cards)
+    ordering = ('-book_count', 'name', 'id') if request.GET.get('sort') == 'popular' else ('name', 'id')
+    page = paginate_keyset(request, authors, ordering, per_page=LIST_PAGE_SIZE)
+    return render(request, 'library/author_list.html', {'cards': render_author_cards(page), 'page': page})
 
+@conditional_page((AUTHOR, BOOK), model=Author)
 def author_detail(request, pk):
     """View for author details with books"""
-    author = get_object_or_404(Author, pk=pk)
-    # Get all books by this author 📚
-    books = author.books.all()
-    return render(request, 'library/author_detail.html', {'author': author, 'books': books})
+    # Profile joined in, book cards prefetched: two queries 📚
+    author = get_object_or_404(Author.objects.for_detail(), pk=pk)
+    return render(request, 'library/author_detail.html', {'author': author, 'cards': render_book_cards(author.books.all())})
 
+@conditional_page((BOOK, AUTHOR))
 def book_list(request):
-    """View for listing all books"""
-    books = Book.objects.all().select_related('author').order_by('title')
-    return render(request, 'library/book_list.html', {'books': books})
+    """View for listing books a page at a time, or streaming all of them"""
+    books = Book.objects.for_card()
+    if request.GET.get('stream'):
+        # Full export: rows are rendered in chunks as they come off the cursor 🚰
+        return stream_rows(request, 'library/book_list.html', books.order_by('title', 'id'),
+                           render_book_cards)
+    page = paginate_keyset(request, books, ('title', 'id'), per_page=LIST_PAGE_SIZE)
+    return render(request, 'library/book_list.html', {'cards': render_book_cards(page), 'page': page})
 
+@track_book_views
+@conditional_page((CATEGORY, PUBLICATION, PUBLISHER), model=Book)
 def book_detail(request, pk):
     """View for book details"""
-    book = get_object_or_404(Book, pk=pk)
-    # Get all categories for this book 🏷️
+    # Author joined in, categories and publishers prefetched: three queries 🏷️🏢
+    book = get_object_or_404(Book.objects.for_detail(), pk=pk)
     categories = book.categories.all()
-    # Get all publishers for this book with publication details 🏢
-    publications = book.publication_set.select_related('publisher').all()
+    publications = book.publication_set.all()
     
     context = {
         'book': book, 
@@ -50,14 +65,40 @@ def book_detail(request, pk):
     }
     return render(request, 'library/book_detail.html', context)
 
+@conditional_page((CATEGORY, BOOK))
 def category_list(request):
-    """View for listing all categories"""
-    categories = Category.objects.annotate(book_count=Count('books')).order_by('name')
+    """View for listing all categories, alphabetically or by number of books"""
+    # book_count is a denormalized, indexed column: no GROUP BY needed 🔢
+    ordering = ('-book_count', 'name') if request.GET.get('sort') == 'popular' else ('name',)
+    categories = Category.objects.order_by(*ordering)
     return render(request, 'library/category_list.html', {'categories': categories})
 
+@conditional_page((BOOK, AUTHOR), model=Category, lookup='slug')
 def category_detail(request, slug):
     """View for category details with books"""
     category = get_object_or_404(Category, slug=slug)
     # Get all books in this category 📚
-    books = category.books.all().select_related('author')
-    return render(request, 'library/category_detail.html', {'category': category, 'books': books})
\ No newline at end of file
+    books = Book.objects.for_card().filter(categories=category)
+    return render(request, 'library/category_detail.html', {'category': category, 'cards': render_book_cards(books)})
+
+@conditional_page((BOOK, AUTHOR, RATING), model=Category, lookup='slug')
+def category_top_rated(request, slug):
+    """View for the best rated books of a category, a page at a time"""
+    category = get_object_or_404(Category, slug=slug)
+    # Ordered on the materialized ratings: no AVG over the reviews ⭐
+    books = Book.objects.for_card().top_rated().filter(categories=category)
+    page = paginate_keyset(request, books, ('-rating', 'id'), per_page=LIST_PAGE_SIZE)
+    context = {'category': category, 'cards': render_book_cards(page), 'page': page}
+    return render(request, 'library/category_top_rated.html', context)
+
+@conditional_page((BOOK, AUTHOR, CATEGORY))
+def search(request):
+    """View for full-text catalog search ranked by relevance"""
+    query = request.GET.get('q', '').strip()
+    books = []
+    if query:
+        book_ids = catalog_search.get_backend().search(query, limit=SEARCH_RESULTS_LIMIT)
+        found = Book.objects.for_card().in_bulk(book_ids)
+        # Keep the ranking order of the index 🏅
+        books = [found[pk] for pk in book_ids if pk in found]
+    return render(request, 'library/search.html', {'query': query, 'cards': render_book_cards(books)})
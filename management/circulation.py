@@ -0,0 +1,181 @@
+"""Checkout, return and renewal of book copies 🔄
+
+Every operation is one short transaction. A checkout picks an available copy
+with SELECT ... FOR UPDATE SKIP LOCKED where the database supports it, so
+concurrent checkouts of the same book spread over different copies instead
+of queueing on one, and then claims it with a conditional UPDATE that only
+succeeds while the copy is still available. The one_open_loan_per_copy
+constraint backs this up in the database. The BranchAvailability counts
+move in the same transactions, so "which branches have book X" is a lookup
+in that small table instead of a scan of the inventory.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .models import BookCopy, BookLoan, BranchAvailability, Reservation
+
+LOAN_DAYS = 21
+RENEWAL_DAYS = 14
+# Copies tried before a checkout gives up when others keep claiming them first
+CHECKOUT_ATTEMPTS = 5
+
+OPEN_STATUSES = ('active', 'overdue')
+# Loans flagged per transaction by the overdue sweep
+SWEEP_CHUNK_SIZE = 5000
+
+
+class CirculationError(Exception):
+    """Base class of the errors raised by circulation operations"""
+
+
+class NoCopyAvailable(CirculationError):
+    """Raised when a branch has no available copy of the book"""
+
+
+class LoanNotOpen(CirculationError):
+    """Raised when returning or renewing a loan that is not active or overdue"""
+
+
+class RenewalRefused(CirculationError):
+    """Raised when other readers are waiting for the book"""
+
+
+def adjust_availability(book_id, branch_id, available=0, total=0):
+    """Add the deltas to the (book, branch) counts, creating the row if needed.
+
+    Call it after writing the copies, in the same transaction: a missing row
+    is counted from the copies, which then already include the change.
+    """
+    counts = BranchAvailability.objects.filter(book_id=book_id, branch_id=branch_id)
+    if counts.update(available=F('available') + available, total=F('total') + total):
+        return
+    copies = BookCopy.objects.filter(book_id=book_id, branch_id=branch_id).aggregate(
+        total=Count('pk'), available=Count('pk', filter=Q(is_available=True))
+    )
+    try:
+        with transaction.atomic():
+            BranchAvailability.objects.create(book_id=book_id, branch_id=branch_id, **copies)
+    except IntegrityError:
+        # Created meanwhile by another transaction, from copies without this change
+        counts.update(available=F('available') + available, total=F('total') + total)
+
+
+def claim_copy(book_id, branch_id):
+    """Mark one available copy as lent and return it"""
+    copies = BookCopy.objects.filter(book_id=book_id, branch_id=branch_id, is_available=True)
+    for _ in range(CHECKOUT_ATTEMPTS):
+        copy = copies.select_for_update(skip_locked=True).order_by('pk').only('pk', 'book_id', 'branch_id').first()
+        if copy is None:
+            break
+        # Conditional update: loses cleanly if another checkout claimed it first
+        if BookCopy.objects.filter(pk=copy.pk, is_available=True).update(is_available=False):
+            copy.is_available = False
+            return copy
+    raise NoCopyAvailable(f'No copy of book {book_id} available at branch {branch_id}')
+
+
+def checkout(borrower_id, book_id, branch_id, today=None, days=LOAN_DAYS):
+    """Lend an available copy of a book at a branch; returns the new BookLoan"""
+    today = today or timezone.localdate()
+    with transaction.atomic():
+        copy = claim_copy(book_id, branch_id)
+        try:
+            loan = BookLoan.objects.create(
+                copy=copy, borrower_id=borrower_id, checkout_date=today, due_date=today + timedelta(days=days)
+            )
+        except IntegrityError:
+            # one_open_loan_per_copy: only reachable if the copy was lent outside this service
+            raise NoCopyAvailable(f'Copy of book {book_id} at branch {branch_id} is already lent')
+        adjust_availability(book_id, branch_id, available=-1)
+    return loan
+
+
+def _open_loan(loan_id):
+    loan = (BookLoan.objects.select_for_update().select_related('copy')
+            .only('pk', 'status', 'due_date', 'copy__book_id', 'copy__branch_id').filter(pk=loan_id).first())
+    if loan is None or loan.status not in OPEN_STATUSES:
+        raise LoanNotOpen(f'Loan {loan_id} is not open')
+    return loan
+
+
+def return_copy(loan_id, today=None):
+    """Close a loan and hold its copy for the next reservation, or shelve it; returns the copy"""
+    today = today or timezone.localdate()
+    with transaction.atomic():
+        loan = _open_loan(loan_id)
+        # Conditional update: a concurrent return of the same loan finds nothing to do
+        if not BookLoan.objects.filter(pk=loan_id, status__in=OPEN_STATUSES).update(status='returned', return_date=today):
+            raise LoanNotOpen(f'Loan {loan_id} is not open')
+        from .reservations import release
+        copy = loan.copy
+        release(copy)
+    return copy
+
+
+def renew(loan_id, today=None, days=RENEWAL_DAYS):
+    """Extend an open loan unless someone reserved the book at its branch; returns the new due date"""
+    today = today or timezone.localdate()
+    with transaction.atomic():
+        loan = _open_loan(loan_id)
+        waiting = Reservation.objects.filter(
+            book_id=loan.copy.book_id, branch_id=loan.copy.branch_id, status='pending'
+        ).exists()
+        if waiting:
+            raise RenewalRefused(f'Book {loan.copy.book_id} is reserved at branch {loan.copy.branch_id}')
+        due_date = max(loan.due_date, today) + timedelta(days=days)
+        BookLoan.objects.filter(pk=loan_id).update(due_date=due_date, status='active')
+    return due_date
+
+
+def flag_overdue(today=None, chunk_size=SWEEP_CHUNK_SIZE):
+    """Move active loans past their due date to 'overdue'; returns {branch_id: loans flagged}.
+
+    Works in chunks of set-based UPDATEs, each in its own short transaction,
+    so the write lock is never held for long. The (status, due_date) index
+    makes every chunk a range scan over the loans still to flag.
+    """
+    today = today or timezone.localdate()
+    flagged = Counter()
+    due = BookLoan.objects.filter(status='active', due_date__lt=today)
+    while True:
+        with transaction.atomic():
+            ids = list(due.order_by('due_date').values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                break
+            BookLoan.objects.filter(pk__in=ids, status='active').update(status='overdue')
+            by_branch = BookLoan.objects.filter(pk__in=ids).values_list('copy__branch_id').annotate(n=Count('pk'))
+            flagged.update(dict(by_branch.order_by()))
+        if len(ids) < chunk_size:
+            break
+    return dict(flagged)
+
+
+def overdue_summary():
+    """{branch_id: (overdue loans, oldest due date)} over every overdue loan"""
+    rows = (BookLoan.objects.filter(status='overdue').values_list('copy__branch_id')
+            .annotate(n=Count('pk'), oldest=Min('due_date')).order_by())
+    return {branch_id: (n, oldest) for branch_id, n, oldest in rows}
+
+
+def availability(book_ids):
+    """{book_id: {branch_id: available copies}} for branches with a copy on the shelf, in one query"""
+    result = defaultdict(dict)
+    rows = BranchAvailability.objects.filter(book_id__in=book_ids, available__gt=0)
+    for book_id, branch_id, available in rows.values_list('book_id', 'branch_id', 'available'):
+        result[book_id][branch_id] = available
+    return dict(result)
+
+
+def rebuild_availability():
+    """Recompute every BranchAvailability row from the copies"""
+    counts = (BookCopy.objects.values('book_id', 'branch_id')
+              .annotate(total=Count('pk'), available=Count('pk', filter=Q(is_available=True))).order_by())
+    with transaction.atomic():
+        BranchAvailability.objects.all().delete()
+        BranchAvailability.objects.bulk_create(
+            [BranchAvailability(**row) for row in counts.iterator(chunk_size=10000)], batch_size=1000
+        )
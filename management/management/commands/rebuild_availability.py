@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from management import circulation
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the per-branch copy availability counts from the inventory'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding branch availability...')
+        circulation.rebuild_availability()
+        self.stdout.write(self.style.SUCCESS('Branch availability rebuilt! 🔢'))
@@ -31,6 +31,12 @@ class BookCopy(models.Model):
     is_available = models.BooleanField(default=True)
     notes = models.TextField(blank=True)
     
+    class Meta:
+        indexes = [
+            # Finds an available copy of a book at a branch for checkout 📚
+            models.Index(fields=['book', 'branch', 'is_available'], name='copy_book_branch_avail_idx'),
+        ]
+    
     def __str__(self):
         return f"Copy {self.inventory_number} of {self.book.title}"
 
@@ -50,6 +56,20 @@ class BookLoan(models.Model):
     ]
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
     
+    class Meta:
+        indexes = [
+            # Drives the overdue sweep: active loans past their due date ⏰
+            models.Index(fields=['status', 'due_date'], name='loan_status_due_idx'),
+        ]
+        constraints = [
+            # A copy can only be lent once at a time, whatever the application does 🔒
+            models.UniqueConstraint(
+                fields=['copy'],
+                condition=models.Q(status__in=['active', 'overdue']),
+                name='one_open_loan_per_copy',
+            ),
+        ]
+    
     def __str__(self):
         return f"{self.copy.book.title} borrowed by {self.borrower.username}"
 
@@ -65,6 +85,32 @@ class Reservation(models.Model):
         ('fulfilled', 'Fulfilled 📚'),
         ('cancelled', 'Cancelled ❌'),
     ], default='pending')
+    # Copy held for the reader while the reservation is ready for pickup 📌
+    copy = models.ForeignKey(BookCopy, on_delete=models.SET_NULL, null=True, blank=True, related_name='holds')
+    
+    class Meta:
+        indexes = [
+            # FIFO queue of a book at a branch: the oldest pending request is one index seek ⏳
+            models.Index(fields=['book', 'branch', 'status', 'request_date'], name='reservation_queue_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['copy'], condition=models.Q(status='ready'), name='one_hold_per_copy'),
+        ]
+    
+    def __str__(self):
+        return f"Reservation of {self.book.title} by {self.user.username}"
+
+class BranchAvailability(models.Model):
+    """Number of copies of a book held, and available, at a branch"""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='availability')
+    branch = models.ForeignKey(LibraryBranch, on_delete=models.CASCADE, related_name='availability')
+    # Kept exact by management.signals and management.circulation 🔢
+    total = models.PositiveIntegerField(default=0)
+    available = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name_plural = "branch availability"
+        unique_together = ('book', 'branch')
     
     def __str__(self):
-        return f"Reservation of {self.book.title} by {self.user.username}"
\ No newline at end of file
+        return f"{self.available}/{self.total} copies of {self.book.title} at {self.branch.name}"
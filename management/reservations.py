@@ -0,0 +1,136 @@
+"""FIFO reservation queue per book and branch 📌
+
+When a copy comes back (or a hold is cancelled) release() gives it to the
+oldest pending reservation for its book at its branch: one seek on the
+(book, branch, status, request_date) index finds it, SKIP LOCKED lets
+parallel workers pass over a reservation another one is claiming, and a
+conditional UPDATE on the pending status makes the claim itself atomic,
+so a reservation never receives two copies. The one_hold_per_copy
+constraint guarantees the other direction. rematch() pairs pending
+reservations with copies already on the shelf in bulk, after a restock.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import circulation
+from .models import BookCopy, BookLoan, BranchAvailability, Reservation
+
+# Pending reservations tried before release() puts the copy on the shelf
+CLAIM_ATTEMPTS = 5
+REMATCH_CHUNK_SIZE = 1000
+
+
+class ReservationNotOpen(circulation.CirculationError):
+    """Raised when fulfilling or cancelling a reservation in the wrong state"""
+
+
+def _queue(book_id, branch_id):
+    return Reservation.objects.filter(book_id=book_id, branch_id=branch_id, status='pending').order_by('request_date', 'pk')
+
+
+def _hold(copy):
+    """Assign the copy to the oldest pending reservation; returns it, or None"""
+    queue = _queue(copy.book_id, copy.branch_id)
+    for _ in range(CLAIM_ATTEMPTS):
+        reservation = queue.select_for_update(skip_locked=True).only('pk').first()
+        if reservation is None:
+            return None
+        if Reservation.objects.filter(pk=reservation.pk, status='pending').update(status='ready', copy=copy):
+            return reservation
+    return None
+
+
+def release(copy):
+    """Hold a copy that is free again for the next reader, or put it back on the shelf.
+
+    Runs inside the caller's transaction; the copy must be marked unavailable.
+    """
+    reservation = _hold(copy)
+    if reservation is None:
+        BookCopy.objects.filter(pk=copy.pk).update(is_available=True)
+        copy.is_available = True
+        circulation.adjust_availability(copy.book_id, copy.branch_id, available=1)
+    return reservation
+
+
+def reserve(user_id, book_id, branch_id):
+    """Queue a reservation, holding a shelf copy for it right away when there is one"""
+    with transaction.atomic():
+        reservation = Reservation.objects.create(user_id=user_id, book_id=book_id, branch_id=branch_id)
+        if not _queue(book_id, branch_id).exclude(pk=reservation.pk).exists():
+            try:
+                copy = circulation.claim_copy(book_id, branch_id)
+            except circulation.NoCopyAvailable:
+                return reservation
+            Reservation.objects.filter(pk=reservation.pk).update(status='ready', copy=copy)
+            circulation.adjust_availability(book_id, branch_id, available=-1)
+            reservation.status, reservation.copy = 'ready', copy
+    return reservation
+
+
+def _locked(reservation_id, statuses):
+    reservation = Reservation.objects.select_for_update().select_related('copy').filter(pk=reservation_id).first()
+    if reservation is None or reservation.status not in statuses:
+        raise ReservationNotOpen(f'Reservation {reservation_id} is not {" or ".join(statuses)}')
+    return reservation
+
+
+def fulfil(reservation_id, today=None, days=circulation.LOAN_DAYS):
+    """Lend the held copy to the reader who reserved it; returns the new BookLoan"""
+    today = today or timezone.localdate()
+    with transaction.atomic():
+        reservation = _locked(reservation_id, ('ready',))
+        if not Reservation.objects.filter(pk=reservation_id, status='ready').update(status='fulfilled'):
+            raise ReservationNotOpen(f'Reservation {reservation_id} is not ready')
+        return BookLoan.objects.create(
+            copy_id=reservation.copy_id, borrower_id=reservation.user_id, checkout_date=today,
+            due_date=today + timedelta(days=days),
+        )
+
+
+def cancel(reservation_id):
+    """Cancel a reservation, passing a held copy on to the next reader"""
+    with transaction.atomic():
+        reservation = _locked(reservation_id, ('pending', 'ready'))
+        if not Reservation.objects.filter(pk=reservation_id, status=reservation.status).update(status='cancelled', copy=None):
+            raise ReservationNotOpen(f'Reservation {reservation_id} changed meanwhile')
+        if reservation.status == 'ready' and reservation.copy is not None:
+            release(reservation.copy)
+
+
+def _rematch_group(book_id, branch_id, limit):
+    with transaction.atomic():
+        waiting = list(_queue(book_id, branch_id).select_for_update(skip_locked=True)
+                       .values_list('pk', flat=True)[:limit])
+        copies = list(BookCopy.objects.filter(book_id=book_id, branch_id=branch_id, is_available=True)
+                      .select_for_update(skip_locked=True).order_by('pk').values_list('pk', flat=True)[:len(waiting)])
+        pairs = list(zip(waiting, copies))
+        if not pairs:
+            return 0
+        BookCopy.objects.filter(pk__in=[copy_id for _, copy_id in pairs]).update(is_available=False)
+        Reservation.objects.bulk_update(
+            [Reservation(pk=pk, status='ready', copy_id=copy_id) for pk, copy_id in pairs], ['status', 'copy']
+        )
+        circulation.adjust_availability(book_id, branch_id, available=-len(pairs))
+    return len(pairs)
+
+
+def rematch(book_ids=None):
+    """Hold shelf copies for pending reservations, oldest first; returns how many were matched"""
+    waiting = Reservation.objects.filter(status='pending')
+    if book_ids is not None:
+        waiting = waiting.filter(book_id__in=book_ids)
+    groups = list(waiting.values_list('book_id', 'branch_id').annotate(n=Count('pk')).order_by())
+    matched = 0
+    for start in range(0, len(groups), REMATCH_CHUNK_SIZE):
+        chunk = dict(((book_id, branch_id), n) for book_id, branch_id, n in groups[start:start + REMATCH_CHUNK_SIZE])
+        on_shelf = BranchAvailability.objects.filter(
+            book_id__in={book_id for book_id, _ in chunk}, available__gt=0
+        ).values_list('book_id', 'branch_id', 'available')
+        for book_id, branch_id, available in on_shelf:
+            if (book_id, branch_id) in chunk:
+                matched += _rematch_group(book_id, branch_id, min(available, chunk[book_id, branch_id]))
+    return matched
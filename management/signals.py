@@ -0,0 +1,40 @@
+from collections import defaultdict
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .circulation import adjust_availability
+from .models import BookCopy
+
+
+@receiver(pre_save, sender=BookCopy)
+def copy_saving(sender, instance, **kwargs):
+    """Remember where the stored copy was counted before an edit"""
+    if not instance._state.adding:
+        instance._previous_counts = (
+            BookCopy.objects.filter(pk=instance.pk).values_list('book_id', 'branch_id', 'is_available').first()
+        )
+
+
+@receiver(post_save, sender=BookCopy)
+def copy_saved(sender, instance, created, **kwargs):
+    """Keep BranchAvailability in step with copies added or edited outside circulation 🔢"""
+    previous = getattr(instance, '_previous_counts', None)
+    if not created and previous is None:
+        return
+    # One net change per (book, branch): a missing row is counted once, from the saved copies
+    deltas = defaultdict(lambda: [0, 0])
+    if previous is not None:
+        book_id, branch_id, was_available = previous
+        deltas[book_id, branch_id][0] -= int(was_available)
+        deltas[book_id, branch_id][1] -= 1
+    deltas[instance.book_id, instance.branch_id][0] += int(instance.is_available)
+    deltas[instance.book_id, instance.branch_id][1] += 1
+    for (book_id, branch_id), (available, total) in deltas.items():
+        if available or total:
+            adjust_availability(book_id, branch_id, available=available, total=total)
+
+
+@receiver(post_delete, sender=BookCopy)
+def copy_deleted(sender, instance, **kwargs):
+    adjust_availability(instance.book_id, instance.branch_id, available=-int(instance.is_available), total=-1)
@@ -1,3 +1,144 @@
+from datetime import date, timedelta
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from library.models import Author, Book
+from users.models import LibraryUser
+
+from . import circulation, reservations
+from .models import BookCopy, BookLoan, BranchAvailability, LibraryBranch, Reservation
+
+TODAY = date(2024, 5, 1)
+
+
+class CirculationTestCase(TestCase):
+    """A book with two copies at one branch and two readers"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='An Author')
+        cls.book = Book.objects.create(title='A Book', author=author, isbn='9780000000011')
+        cls.branch = LibraryBranch.objects.create(name='Central', address='Main St', phone='1', email='c@example.com',
+                                                  opening_hours='9-5')
+        cls.copies = [
+            BookCopy.objects.create(book=cls.book, branch=cls.branch, acquisition_date=TODAY,
+                                    inventory_number=f'C-{number}')
+            for number in range(2)
+        ]
+        cls.reader = LibraryUser.objects.create(username='reader')
+        cls.other = LibraryUser.objects.create(username='other')
+
+    def counts(self):
+        return BranchAvailability.objects.values_list('available', 'total').get(book=self.book, branch=self.branch)
+
+    def checkout(self, user=None):
+        return circulation.checkout((user or self.reader).pk, self.book.pk, self.branch.pk, today=TODAY)
+
+
+class CirculationTests(CirculationTestCase):
+    def test_copies_are_counted(self):
+        self.assertEqual(self.counts(), (2, 2))
+        self.assertEqual(circulation.availability([self.book.pk]), {self.book.pk: {self.branch.pk: 2}})
+
+    def test_checkout_lends_distinct_copies(self):
+        first, second = self.checkout(), self.checkout(self.other)
+        self.assertNotEqual(first.copy_id, second.copy_id)
+        self.assertEqual(first.due_date, TODAY + timedelta(days=circulation.LOAN_DAYS))
+        self.assertEqual(self.counts(), (0, 2))
+        self.assertEqual(circulation.availability([self.book.pk]), {})
+        with self.assertRaises(circulation.NoCopyAvailable):
+            self.checkout()
+
+    def test_missing_counts_are_taken_from_the_copies(self):
+        BranchAvailability.objects.all().delete()
+        self.checkout()
+        self.assertEqual(self.counts(), (1, 2))
+        BranchAvailability.objects.all().delete()
+        copy = BookCopy.objects.filter(is_available=True).get()
+        copy.is_available = False
+        copy.save()
+        self.assertEqual(self.counts(), (0, 2))
+
+    def test_return_shelves_the_copy(self):
+        loan = self.checkout()
+        circulation.return_copy(loan.pk, today=TODAY)
+        loan.refresh_from_db()
+        self.assertEqual((loan.status, loan.return_date), ('returned', TODAY))
+        self.assertTrue(BookCopy.objects.get(pk=loan.copy_id).is_available)
+        self.assertEqual(self.counts(), (2, 2))
+        with self.assertRaises(circulation.LoanNotOpen):
+            circulation.return_copy(loan.pk, today=TODAY)
+
+    def test_renew_extends_from_the_due_date(self):
+        loan = self.checkout()
+        due_date = circulation.renew(loan.pk, today=TODAY)
+        self.assertEqual(due_date, loan.due_date + timedelta(days=circulation.RENEWAL_DAYS))
+        self.assertEqual(BookLoan.objects.get(pk=loan.pk).due_date, due_date)
+
+    def test_rebuild_matches_the_counts(self):
+        self.checkout()
+        expected = self.counts()
+        BranchAvailability.objects.all().delete()
+        call_command('rebuild_availability', stdout=StringIO())
+        self.assertEqual(self.counts(), expected)
+
+
+class OverdueSweepTests(CirculationTestCase):
+    def test_sweep_flags_overdue_loans(self):
+        loan = self.checkout()
+        later = loan.due_date + timedelta(days=1)
+        self.assertEqual(circulation.flag_overdue(today=later, chunk_size=1), {self.branch.pk: 1})
+        self.assertEqual(circulation.overdue_summary(), {self.branch.pk: (1, loan.due_date)})
+        # A renewed overdue loan is active again
+        circulation.renew(loan.pk, today=later)
+        self.assertEqual(BookLoan.objects.get(pk=loan.pk).status, 'active')
+        self.assertEqual(circulation.flag_overdue(today=later), {})
+
+
+class ReservationTests(CirculationTestCase):
+    def test_shelf_copy_is_held_right_away(self):
+        reservation = reservations.reserve(self.reader.pk, self.book.pk, self.branch.pk)
+        self.assertEqual(reservation.status, 'ready')
+        self.assertEqual(self.counts(), (1, 2))
+        loan = reservations.fulfil(reservation.pk, today=TODAY)
+        self.assertEqual((loan.copy_id, loan.borrower_id), (reservation.copy.pk, self.reader.pk))
+
+    def test_returned_copy_goes_to_the_oldest_reservation(self):
+        loans = [self.checkout(), self.checkout()]
+        first = reservations.reserve(self.other.pk, self.book.pk, self.branch.pk)
+        second = reservations.reserve(self.reader.pk, self.book.pk, self.branch.pk)
+        self.assertEqual(first.status, 'pending')
+        circulation.return_copy(loans[0].pk, today=TODAY)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, first.copy_id), ('ready', loans[0].copy_id))
+        self.assertEqual(second.status, 'pending')
+        # The copy is held, not back on the shelf
+        self.assertEqual(self.counts(), (0, 2))
+
+    def test_cancelled_hold_passes_to_the_next_reader(self):
+        self.checkout()
+        held = reservations.reserve(self.reader.pk, self.book.pk, self.branch.pk)
+        waiting = reservations.reserve(self.other.pk, self.book.pk, self.branch.pk)
+        reservations.cancel(held.pk)
+        waiting.refresh_from_db()
+        self.assertEqual((waiting.status, waiting.copy_id), ('ready', held.copy.pk))
+        with self.assertRaises(reservations.ReservationNotOpen):
+            reservations.cancel(held.pk)
+
+    def test_rematch_holds_restocked_copies(self):
+        self.checkout()
+        self.checkout()
+        waiting = reservations.reserve(self.reader.pk, self.book.pk, self.branch.pk)
+        BookCopy.objects.create(book=self.book, branch=self.branch, acquisition_date=TODAY, inventory_number='C-2')
+        self.assertEqual(reservations.rematch(), 1)
+        self.assertEqual(Reservation.objects.get(pk=waiting.pk).status, 'ready')
+        self.assertEqual(self.counts(), (0, 3))
+
+    def test_renew_is_refused_while_others_wait(self):
+        loans = [self.checkout(), self.checkout(self.other)]
+        reservations.reserve(self.other.pk, self.book.pk, self.branch.pk)
+        with self.assertRaises(circulation.RenewalRefused):
+            circulation.renew(loans[0].pk, today=TODAY)
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from users import ratings
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the per-book rating summaries from the reviews'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding rating summaries...')
+        ratings.rebuild()
+        self.stdout.write(self.style.SUCCESS('Rating summaries rebuilt! ⭐'))
@@ -32,4 +32,36 @@ class BookReview(models.Model):
         unique_together = ('user', 'book')
     
     def __str__(self):
-        return f"Review of {self.book.title} by {self.user.username}"
\ No newline at end of file
+        return f"Review of {self.book.title} by {self.user.username}"
+
+class BookRatingSummary(models.Model):
+    """Materialized rating statistics of a book, kept current by users.signals ⭐"""
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    # Histogram: number of reviews giving each star level
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    # Average pulled towards the prior, so a single 5-star review does not top the charts
+    bayesian_average = models.FloatField(default=0.0)
+
+    class Meta:
+        indexes = [
+            # Backs the top-rated listings 🏆
+            models.Index(fields=['-bayesian_average', 'book'], name='rating_bayesian_idx'),
+        ]
+
+    @property
+    def average(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def histogram(self):
+        """{stars: reviews} for 1 to 5 stars"""
+        return {stars: getattr(self, f'stars_{stars}') for stars in range(1, 6)}
+
+    def __str__(self):
+        return f"Ratings of {self.book_id}: {self.count}"
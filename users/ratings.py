@@ -0,0 +1,63 @@
+"""Per-book rating summaries ⭐
+
+BookRatingSummary holds the count, sum and star histogram of a book's
+reviews plus its Bayesian average, (WEIGHT * MEAN + total) / (WEIGHT + count)
+with the USERS_RATING_PRIOR settings. The receivers in signals.py apply each
+review change as one atomic F() update, computing the new average in the
+same statement; rebuild() recomputes every row after bulk writes. Listings
+then sort on the indexed average instead of aggregating the reviews.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Value
+
+from library import versions
+
+from .models import BookRatingSummary, BookReview
+
+STARS = range(1, 6)
+
+
+def prior():
+    """(mean, weight) of the Bayesian prior"""
+    config = getattr(settings, 'USERS_RATING_PRIOR', {})
+    return float(config.get('MEAN', 3.0)), float(config.get('WEIGHT', 5))
+
+
+def bayesian_average(total, count):
+    mean, weight = prior()
+    return (weight * mean + total) / (weight + count)
+
+
+def adjust(book_id, rating, delta):
+    """Add (delta=1) or remove (delta=-1) one review of `rating` stars to a book's summary"""
+    mean, weight = prior()
+    changes = {
+        'count': F('count') + delta,
+        'total': F('total') + delta * rating,
+        f'stars_{rating}': F(f'stars_{rating}') + delta,
+        # Right-hand sides read the old values: apply the deltas here too
+        'bayesian_average': (Value(weight * mean) + F('total') + delta * rating) / (Value(weight) + F('count') + delta),
+    }
+    summary = BookRatingSummary.objects.filter(book_id=book_id)
+    # Removals never create a row: the book may be in the middle of being deleted
+    if not summary.update(**changes) and delta > 0:
+        BookRatingSummary.objects.bulk_create([BookRatingSummary(book_id=book_id)], ignore_conflicts=True)
+        summary.update(**changes)
+    versions.touch(versions.RATING)
+
+
+def rebuild():
+    """Recompute every BookRatingSummary row from the reviews"""
+    rows = (BookReview.objects.values('book_id')
+            .annotate(count=Count('pk'), total=Sum('rating'),
+                      **{f'stars_{stars}': Count('pk', filter=Q(rating=stars)) for stars in STARS})
+            .order_by())
+    with transaction.atomic():
+        BookRatingSummary.objects.all().delete()
+        BookRatingSummary.objects.bulk_create(
+            (BookRatingSummary(bayesian_average=bayesian_average(row['total'], row['count']), **row)
+             for row in rows.iterator(chunk_size=10000)),
+            batch_size=1000,
+        )
+    versions.touch(versions.RATING)
@@ -0,0 +1,51 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from library import thumbnails
+
+from . import ratings
+from .models import BookReview, LibraryUser
+
+
+@receiver(pre_save, sender=BookReview)
+def review_saving(sender, instance, **kwargs):
+    """Remember the stored book and rating so an edit can move the review between them"""
+    if not instance._state.adding:
+        instance._previous_rating = (
+            BookReview.objects.filter(pk=instance.pk).values_list('book_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=BookReview)
+def review_saved(sender, instance, created, **kwargs):
+    """Keep the book's rating summary in step with new and edited reviews ⭐"""
+    previous = None if created else getattr(instance, '_previous_rating', None)
+    if previous == (instance.book_id, instance.rating):
+        return
+    if previous is not None:
+        ratings.adjust(*previous, -1)
+    ratings.adjust(instance.book_id, instance.rating, 1)
+
+
+@receiver(post_delete, sender=BookReview)
+def review_deleted(sender, instance, **kwargs):
+    ratings.adjust(instance.book_id, instance.rating, -1)
+
+
+@receiver(pre_save, sender=LibraryUser)
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    """Remember the stored profile image so that only a new one is rendered"""
+    if update_fields is not None and 'profile_image' not in update_fields:
+        # Partial saves such as the last_login update leave the image alone
+        instance._previous_profile_image = instance.profile_image.name
+    elif not instance._state.adding:
+        instance._previous_profile_image = (
+            LibraryUser.objects.filter(pk=instance.pk).values_list('profile_image', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=LibraryUser)
+def user_saved(sender, instance, **kwargs):
+    """Render the thumbnails of a new profile image in the background 🖼️"""
+    if instance.profile_image.name != getattr(instance, '_previous_profile_image', None):
+        thumbnails.schedule(instance.profile_image)
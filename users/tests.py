@@ -1,3 +1,75 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.signals import user_logged_in
+from django.test import RequestFactory, TestCase
+
+from library.models import Author, Book
+
+from . import ratings
+from .models import BookRatingSummary, BookReview, LibraryUser
+
+
+class RatingSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='An Author')
+        cls.books = [
+            Book.objects.create(title=f'Book {number}', author=author, isbn=f'97800000000{number}')
+            for number in range(2)
+        ]
+        cls.readers = [LibraryUser.objects.create(username=f'reader{number}') for number in range(2)]
+
+    def review(self, reader, rating, book=None):
+        return BookReview.objects.create(user=reader, book=book or self.books[0], rating=rating, comment='')
+
+    def summary(self, book=None):
+        return BookRatingSummary.objects.get(book=book or self.books[0])
+
+    def test_reviews_are_summarized(self):
+        self.review(self.readers[0], 5)
+        self.review(self.readers[1], 2)
+        summary = self.summary()
+        self.assertEqual((summary.count, summary.total, summary.average), (2, 7, 3.5))
+        self.assertEqual(summary.histogram, {1: 0, 2: 1, 3: 0, 4: 0, 5: 1})
+        self.assertAlmostEqual(summary.bayesian_average, ratings.bayesian_average(7, 2))
+
+    def test_edits_and_deletes_move_the_counts(self):
+        review = self.review(self.readers[0], 5)
+        review.rating = 1
+        review.save()
+        self.assertEqual(self.summary().histogram, {1: 1, 2: 0, 3: 0, 4: 0, 5: 0})
+        review.book = self.books[1]
+        review.save()
+        self.assertEqual((self.summary().count, self.summary(self.books[1]).count), (0, 1))
+        review.delete()
+        summary = self.summary(self.books[1])
+        self.assertEqual((summary.count, summary.total), (0, 0))
+        self.assertAlmostEqual(summary.bayesian_average, ratings.prior()[0])
+
+    def test_rebuild_matches_the_incremental_summaries(self):
+        self.review(self.readers[0], 4)
+        self.review(self.readers[1], 3)
+        self.review(self.readers[0], 1, book=self.books[1])
+        expected = list(BookRatingSummary.objects.order_by('book').values())
+        ratings.rebuild()
+        self.assertEqual(list(BookRatingSummary.objects.order_by('book').values()), expected)
+
+
+@mock.patch('library.thumbnails.schedule')
+class ProfileImageTests(TestCase):
+    def test_only_a_new_image_is_scheduled(self, schedule):
+        user = LibraryUser.objects.create(username='reader')
+        user.profile_image = 'user_profiles/a.png'
+        user.save()
+        self.assertEqual(schedule.call_args.args[0].name, 'user_profiles/a.png')
+        schedule.reset_mock()
+        user.bio = 'Reads a lot'
+        user.save()
+        user_logged_in.send(LibraryUser, request=RequestFactory().get('/'), user=user)
+        schedule.assert_not_called()
+
+    def test_partial_save_of_a_new_image_is_scheduled(self, schedule):
+        user = LibraryUser.objects.create(username='reader', profile_image='user_profiles/a.png')
+        user.profile_image = 'user_profiles/b.png'
+        user.save(update_fields=['profile_image'])
+        self.assertEqual(schedule.call_args.args[0].name, 'user_profiles/b.png')